@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_brands", "0003_brands_app_brands__name_br_f70b8b_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="brands",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="brands",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="brands_search_vector_gin"
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.contenttypes.fields import GenericRelation
 
 from core.mixins import JSONFieldsMixin
@@ -17,6 +18,11 @@ class Brands(JSONFieldsMixin, models.Model):
         content_type_field="content_type",
         object_id_field="object_id",
     )
+    # Взвешенный tsvector для полнотекстового поиска (SearchVectorUpdater)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         indexes = [
@@ -26,6 +32,10 @@ class Brands(JSONFieldsMixin, models.Model):
                 name="trgm_idx_name_brand",
                 opclasses=["gin_trgm_ops"],
             ),
+            GinIndex(
+                fields=["search_vector"],
+                name="brands_search_vector_gin",
+            ),
         ]
         verbose_name = "Бренд"
         verbose_name_plural = "Бренды"
@@ -1,10 +1,10 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
 from app_brands.models import Brands
-from app_category.models import Category
+from app_category.CategoryTree import CategoryTree
 from app_brands.serializers import BrandSerializer
 
 
@@ -13,15 +13,13 @@ class BrandsViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = BrandSerializer
 
     def filter_brands_by_category(self, **category_filter):
-        # Получаем категорию по заданному фильтру (id или slug)
-        category = get_object_or_404(Category, **category_filter)
-        # Находим все подкатегории
-        descendant_categories = category.get_descendants(include_self=True).values_list(
-            "id", flat=True
-        )
+        # Категория и все её подкатегории — из дерева в памяти
+        category = CategoryTree.get().find(**category_filter)
+        if category is None:
+            raise Http404
         # Фильтруем бренды по этим категориям
         brands = (
-            Brands.objects.filter(products__category__id__in=descendant_categories)
+            Brands.objects.filter(products__category__id__in=category.descendant_ids)
             .distinct()
             .order_by("name_brand")
         )
@@ -0,0 +1,143 @@
+import threading
+
+from core.CacheTags import CacheTags
+
+from app_category.models import Category
+
+
+class CategoryNode:
+    """Категория в дереве CategoryTree (только то, что нужно для выборок)."""
+
+    __slots__ = ("id", "parent_id", "slug", "name", "ancestor_ids", "descendant_ids")
+
+    def __init__(self, id, parent_id, slug, name):
+        self.id = id
+        self.parent_id = parent_id
+        self.slug = slug
+        self.name = name
+        # предки от корня к родителю
+        self.ancestor_ids = ()
+        # сама категория и все её потомки в порядке обхода дерева
+        self.descendant_ids = ()
+
+    def __repr__(self):
+        return f"<CategoryNode {self.id} {self.slug}>"
+
+
+class CategoryTree:
+    """
+    Дерево категорий в памяти процесса: поиск по id и slug, потомки
+    и предки без запросов к MPTT.
+
+    Дерево загружается одним запросом и живёт, пока не изменилась версия
+    тега CacheTags.CATEGORY_TREE (её сдвигают сигналы Category), так что
+    все воркеры перечитывают дерево после первого же изменения.
+    Ответы, построенные по дереву, получают тот же тег.
+    """
+
+    _tree = None
+    _lock = threading.Lock()
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.nodes = {}
+        self.slugs = {}
+        children = {}
+        for pk, parent_id, slug, name in rows:
+            self.nodes[pk] = CategoryNode(pk, parent_id, slug, name)
+            self.slugs[slug] = pk
+            children.setdefault(parent_id, []).append(pk)
+
+        # обход от корней: у родителя предки уже известны
+        stack = [(pk, ()) for pk in reversed(children.get(None, []))]
+        order = []
+        while stack:
+            pk, ancestors = stack.pop()
+            node = self.nodes[pk]
+            node.ancestor_ids = ancestors
+            order.append(pk)
+            stack.extend(
+                (child, ancestors + (pk,)) for child in reversed(children.get(pk, []))
+            )
+
+        descendants = {pk: [pk] for pk in order}
+        for pk in order:
+            for ancestor_id in self.nodes[pk].ancestor_ids:
+                descendants[ancestor_id].append(pk)
+        for pk, ids in descendants.items():
+            self.nodes[pk].descendant_ids = tuple(ids)
+
+    @classmethod
+    def get(cls):
+        """Актуальное дерево (перечитывается после изменения категорий)."""
+        CacheTags.add(CacheTags.CATEGORY_TREE)
+        version = CacheTags.versions([CacheTags.CATEGORY_TREE])[CacheTags.CATEGORY_TREE]
+        tree = cls._tree
+        if tree is not None and tree.version == version:
+            return tree
+        with cls._lock:
+            tree = cls._tree
+            if tree is None or tree.version != version:
+                tree = cls._tree = cls.load(version)
+        return tree
+
+    @classmethod
+    def load(cls, version=None):
+        rows = Category.objects.order_by("tree_id", "lft").values_list(
+            "id", "parent_id", "slug", "name_category"
+        )
+        return cls(rows, version)
+
+    @staticmethod
+    def invalidate():
+        CacheTags.invalidate([CacheTags.CATEGORY_TREE])
+
+    # ------------------------------------------------------------------ #
+    # Выборки
+    # ------------------------------------------------------------------ #
+    def by_id(self, pk):
+        return self.nodes.get(pk)
+
+    def by_slug(self, slug):
+        pk = self.slugs.get(slug)
+        return None if pk is None else self.nodes[pk]
+
+    def find(self, id=None, slug=None):
+        """Категория по id или slug (как get_object_or_404(Category, ...))."""
+        if id is not None:
+            return self.by_id(int(id))
+        return self.by_slug(slug)
+
+    def descendant_ids(self, ids):
+        """Категории ids и все их потомки (неизвестные id пропускаются)."""
+        result = set()
+        for pk in ids:
+            node = self.nodes.get(pk)
+            if node is not None:
+                result.update(node.descendant_ids)
+        return result
+
+    def rollup(self, counts):
+        """
+        Счётчики по поддеревьям: {id категории: число} -> {id: сумма по
+        категории и всем её потомкам}. В ответе только категории с суммой > 0
+        (в порядке обхода дерева).
+        """
+        totals = dict.fromkeys(self.nodes, 0)
+        for pk, count in counts.items():
+            node = self.nodes.get(pk)
+            if node is None or not count:
+                continue
+            totals[pk] += count
+            for ancestor_id in node.ancestor_ids:
+                totals[ancestor_id] += count
+        return {pk: total for pk, total in totals.items() if total}
+
+    def ancestor_ids(self, ids):
+        """Все предки категорий ids (без самих категорий)."""
+        result = set()
+        for pk in ids:
+            node = self.nodes.get(pk)
+            if node is not None:
+                result.update(node.ancestor_ids)
+        return result
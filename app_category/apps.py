@@ -5,3 +5,6 @@ class AppCategoryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app_category"
     verbose_name = "Управление категориями"
+
+    def ready(self):
+        from app_category import signals
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_category", "0003_category_trgm_idx_name_category"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="category_search_vector_gin"
+            ),
+        ),
+    ]
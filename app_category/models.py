@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.contenttypes.fields import GenericRelation
 
 from mptt.models import MPTTModel, TreeForeignKey
@@ -29,6 +30,11 @@ class Category(MPTTModel, JSONFieldsMixin, SlugModelMixin):
         content_type_field="content_type",
         object_id_field="object_id",
     )
+    # Взвешенный tsvector для полнотекстового поиска (SearchVectorUpdater)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
 
     class MPTTMeta:
         order_insertion_by = ["name_category"]
@@ -43,6 +49,10 @@ class Category(MPTTModel, JSONFieldsMixin, SlugModelMixin):
                 name="trgm_idx_name_category",
                 opclasses=["gin_trgm_ops"],
             ),
+            GinIndex(
+                fields=["search_vector"],
+                name="category_search_vector_gin",
+            ),
             models.Index(fields=["slug"]),
             models.Index(fields=["name_category"]),
         ]
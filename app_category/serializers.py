@@ -7,6 +7,8 @@ from app_category.models import Category
 
 class CategorySerializer(serializers.ModelSerializer):
     visible_products_count = serializers.IntegerField(read_only=True)
+    # товары категории вместе с подкатегориями (список по городу)
+    subtree_products_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Category
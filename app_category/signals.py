@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mptt.signals import node_moved
+
+from app_category.models import Category, CategoryImage
+from app_category.CategoryTree import CategoryTree
+from app_manage_banners.models import BannerImage
+
+from core.CacheTags import CacheTags
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def category_tree_changed(sender, instance, **kwargs):
+    # Воркеры перечитают дерево при следующем обращении
+    CategoryTree.invalidate()
+
+
+@receiver(post_save, sender=CategoryImage)
+@receiver(post_delete, sender=CategoryImage)
+@receiver(post_save, sender=BannerImage)
+@receiver(post_delete, sender=BannerImage)
+def category_image_changed(sender, instance, **kwargs):
+    # Изображения и баннеры выводятся в дереве категорий
+    CacheTags.invalidate([CacheTags.category(instance.category_id)])
@@ -1,3 +1,54 @@
 from django.test import TestCase
 
-# Create your tests here.
+from app_category.models import Category
+from app_category.CategoryTree import CategoryTree
+
+
+class CategoryTreeTest(TestCase):
+    """Потомки и предки из дерева в памяти, перечитывание после изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(name_category="Мебель", slug="mebel")
+        cls.sofas = Category.objects.create(
+            name_category="Диваны", slug="divany", parent=cls.root
+        )
+        cls.corner = Category.objects.create(
+            name_category="Угловые", slug="uglovye", parent=cls.sofas
+        )
+        cls.other = Category.objects.create(name_category="Свет", slug="svet")
+
+    def setUp(self):
+        CategoryTree._tree = None
+
+    def test_lookups(self):
+        with self.assertNumQueries(1):
+            tree = CategoryTree.get()
+            CategoryTree.get()
+        self.assertEqual(
+            tree.by_slug("mebel").descendant_ids,
+            (self.root.pk, self.sofas.pk, self.corner.pk),
+        )
+        self.assertEqual(
+            tree.by_id(self.corner.pk).ancestor_ids, (self.root.pk, self.sofas.pk)
+        )
+        self.assertEqual(
+            tree.descendant_ids([self.sofas.pk, self.other.pk, 0]),
+            {self.sofas.pk, self.corner.pk, self.other.pk},
+        )
+        self.assertEqual(
+            tree.rollup({self.sofas.pk: 2, self.corner.pk: 1}),
+            {self.root.pk: 3, self.sofas.pk: 3, self.corner.pk: 1},
+        )
+        self.assertEqual(tree.find(id=str(self.sofas.pk)).slug, "divany")
+        self.assertIsNone(tree.find(slug="net"))
+
+    def test_reload_after_change(self):
+        CategoryTree.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.corner.move_to(self.other)
+        tree = CategoryTree.get()
+        self.assertEqual(
+            tree.by_slug("mebel").descendant_ids, (self.root.pk, self.sofas.pk)
+        )
+        self.assertEqual(tree.by_slug("uglovye").ancestor_ids, (self.other.pk,))
@@ -1,15 +1,16 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from rest_framework.urlpatterns import format_suffix_patterns
 
 from app_category.views import category_facets
 
+from core.CacheTags import cache_tagged
+
 
 urlpatterns = [
     path(
         "categories/facets/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             category_facets,
         ),
         name="category-facets",
@@ -1,5 +1,3 @@
-from collections import defaultdict
-
 from django.db.models import Q, Count
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
@@ -7,18 +5,20 @@ from rest_framework.response import Response
 from rest_framework.decorators import action, api_view
 
 from app_category.models import Category
+from app_category.CategoryTree import CategoryTree
 from app_category.serializers import CategorySerializer
 
 from app_products.models import Products
 from app_products.serializers_v2 import ProductSerializer
 from app_products.ProductsQueryFactory import ProductsQueryFactory
-from app_products.views_v2 import ProductsViewSet_v2
+from app_products.FacetIndex import FacetIndex
+from app_products.ProductsPagination import ProductsKeysetPagination
 
 
 from app_brands.models import Brands
 from app_brands.serializers import BrandSerializer
 
-from app_specifications.models import Specifications
+from core.CacheTags import CacheTags, cache_tagged
 
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -30,6 +30,15 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = "slug"
+    # Действия, ответы которых кешируются по тегам (дерево — отдельно на город)
+    cached_actions = {"list"}
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if actions and set(actions.values()) <= cls.cached_actions:
+            return cache_tagged()(view)
+        return view
 
     def list(self, request, *args, **kwargs):
         """
@@ -39,52 +48,61 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         """
         city_name = request.query_params.get("city")
         if city_name:
-            # 1) Собираем «видимые» для города товары
-            products_qs = ProductsQueryFactory.get_all_details()
-            products_qs = ProductsViewSet_v2.filter_by_city_and_edges(
-                self=None,  # Потому что метод filter_by_city_and_edges — статический по смыслу
-                queryset=products_qs,
-                city_name=city_name,
-            )
+            return self.list_visible_in_city(city_name)
 
-            # 2) Определяем список категорий, в которых есть «видимый» товар
-            category_ids_with_products = products_qs.values_list(
-                "category_id", flat=True
-            ).distinct()
-
-            # 3) Расширяем за счёт всех ancestor'ов:
-            #    если у подкатегории есть видимые товары, её родитель тоже нужен в дереве.
-            all_category_ids = set(category_ids_with_products)
-            for cat_id in category_ids_with_products:
-                ancestors = Category.objects.get(id=cat_id).get_ancestors()
-                all_category_ids.update(a.id for a in ancestors)
-
-            # 4) Достаём все нужные категории из базы
-            #    и АННОТИРУЕМ счётчик видимых продуктов (чтобы при сборке дерева знать, где 0)
-            categories_qs = Category.objects.filter(id__in=all_category_ids).annotate(
-                visible_products_count=Count(
-                    "products",
-                    filter=Q(products__in=products_qs),
-                    distinct=True,
-                )
-            )
-        else:
-            # Если город не задан, возвращаем всё как обычно (или оставьте пустой список — на ваше усмотрение)
-            categories_qs = self.filter_queryset(
-                self.get_queryset().annotate(visible_products_count=Count("products"))
-            )
+        # Если город не задан, возвращаем всё как обычно (или оставьте пустой список — на ваше усмотрение)
+        categories_qs = self.filter_queryset(
+            self.get_queryset().annotate(visible_products_count=Count("products"))
+        )
+        CacheTags.add(CacheTags.PRODUCTS, CacheTags.CATEGORY_TREE)
 
         # Превращаем в serializer.data
         serializer = self.get_serializer(categories_qs, many=True)
+        CacheTags.add(*(CacheTags.category(node["id"]) for node in serializer.data))
 
-        # 5) Собираем дерево
+        # Собираем дерево и «прореживаем» пустые категории
         tree = self.build_tree(serializer.data)
-
-        # 6) «Прореживаем» пустые категории
         pruned_tree = [node for node in tree if self.prune_empty(node)]
 
         return Response(pruned_tree)
 
+    def list_visible_in_city(self, city_name):
+        """
+        Дерево категорий, где в городе есть видимые товары (остаток или
+        ребро, индекс ProductCityVisibility). Число запросов не зависит
+        от числа категорий: счётчики по категориям — один GROUP BY,
+        предки и суммы по поддеревьям — из CategoryTree.
+        visible_products_count — товары самой категории,
+        subtree_products_count — вместе с подкатегориями.
+        """
+        products_qs = ProductsQueryFactory.only_visible_in_city(
+            ProductsQueryFactory.only_listed_cards(Products.objects.all()), city_name
+        )
+        counts = dict(
+            products_qs.order_by()
+            .values_list("category_id")
+            .annotate(count=Count("id"))
+        )
+        totals = CategoryTree.get().rollup(counts)
+
+        categories = list(
+            Category.objects.filter(id__in=totals).prefetch_related(
+                "categoryimage_set", "bannerimage_set"
+            )
+        )
+        for category in categories:
+            category.visible_products_count = counts.get(category.pk, 0)
+            category.subtree_products_count = totals[category.pk]
+        serializer = self.get_serializer(categories, many=True)
+
+        CacheTags.add(
+            CacheTags.PRODUCTS,
+            CacheTags.city(city_name),
+            *(CacheTags.category(pk) for pk in totals),
+        )
+        # пустых узлов нет: в дерево попали только категории с товарами
+        return Response(self.build_tree(serializer.data))
+
     def retrieve(self, request, slug=None, *args, **kwargs):
         instance = self.get_object_by_slug(slug)
         serializer = self.get_serializer(instance)
@@ -190,13 +208,16 @@ def _apply_filters(qs, brand_ids: list[int], spec_filters: dict[int, list[int]])
     if brand_ids:
         qs = qs.filter(brand_id__in=brand_ids)
 
-    for spec_id, value_ids in spec_filters.items():
-        qs = qs.filter(
-            specifications__name_specification_id=spec_id,
-            specifications__value_specification_id__in=value_ids,
+    if spec_filters:
+        qs = ProductsQueryFactory.only_with_spec_values(
+            qs,
+            [
+                [(spec_id, value_id) for value_id in value_ids]
+                for spec_id, value_ids in spec_filters.items()
+            ],
         )
 
-    return qs.distinct()
+    return qs
 
 
 # ------------ сам эндпоинт -------------------------------------------
@@ -216,6 +237,7 @@ def category_facets(request):
        &city=Актобе---------фильтруем по городу
        &spec_12=5,6---------фильтруем по названию характеристики с ID 12 и значениями с ID 5 и 6 (&spec_<ЦВЕТ>=<БЕЛЫЙ>,<ЧЕРНЫЙ>)
        &limit=20&offset=0---пагинация
+       &pagination=cursor&cursor=<next_cursor>---keyset-пагинация (без OFFSET)
        +++ сортировка +++
        по цене, по сред рейтингу, по кол отзывов, по бренду (алфавит).
        &ordering=price(-price) - дешевый сначала
@@ -228,13 +250,10 @@ def category_facets(request):
        spec_12 - это ключ. spec_<ID ключа> - ключ формируется из приставки 'spec_' + ID название характеристики.
        =5,6 - это ID значения характеристики.
     """
-    category_ids = _parse_int_list(request.GET.get("category"))
-    category = Category.objects.filter(pk__in=category_ids)
-    category_ids = category.get_descendants(include_self=True).values_list(
-        "id", flat=True
-    )
+    tree = CategoryTree.get()
+    category_ids = tree.descendant_ids(_parse_int_list(request.GET.get("category")))
     if not category_ids:
-        category_ids = Category.objects.all().values_list("id", flat=True)
+        category_ids = list(tree.nodes)
 
     # ---------- выбранные фильтры ------------------
     brand_ids = _parse_int_list(request.GET.get("brand"))
@@ -245,149 +264,69 @@ def category_facets(request):
             spec_id = int(key.split("_")[1])
             spec_filters[spec_id] = _parse_int_list(val)
 
-    # ---------- базовый узкий qs -------------------
-    base_qs = Products.objects.filter(show_it=True, category_id__in=category_ids)
-    base_qs = _apply_filters(base_qs, brand_ids, spec_filters)
-
-    # ---------- гидрация через фабрику qs -------------------
-    prod_qs = ProductsQueryFactory.enrich(base_qs)
-
-    # ---------- фильтрация по городу -------------------
     city_name = request.GET.get("city")
-    if city_name:
-        # Фильтрация товаров по остаткам в указанном городе
-        stocks_filter = Q(stocks__warehouse__city__name_city=city_name)
-
-        # Фильтрация товаров по рёбрам, ведущим в указанный город
-        edges_filter = Q(
-            Q(category__edges__city_to__name_city=city_name)
-            | Q(brand__edges__city_to__name_city=city_name)
-        )
-
-        # Применяем фильтры и удаляем дубли
-        prod_qs = prod_qs.filter(stocks_filter | edges_filter)
-    # ---------- сортировка -----------------------------
-    ordering = request.GET.get("ordering")  # пример: ?ordering=price,-rating
-    if ordering:
-        # Разрешаем только перечисленные поля,
-        # поддерживаем знак «-» для обратного порядка
-        allowed = {
-            "price": "stocks__price",
-            "-price": "-stocks__price",
-            "rating": "avg_rating",
-            "-rating": "-avg_rating",
-            "reviews": "reviews_count",
-            "-reviews": "-reviews_count",
-            "brand": "brand__name_brand",
-            "-brand": "-brand__name_brand",
-        }
-        order_fields = [allowed[o] for o in ordering.split(",") if o in allowed]
-        if order_fields:
-            prod_qs = prod_qs.order_by(*order_fields)
-    # ---------- counts для facets ------------------
-    category_block = [
-        {
-            "id": cat_row["category_id"],
-            "name": cat_row["category__name_category"],
-            "count": cat_row["cnt"],
-            "additional_data": cat_row["category__additional_data"],
-        }
-        for cat_row in prod_qs.values(
-            "category_id", "category__name_category", "category__additional_data"
-        )
-        .annotate(cnt=Count("id", distinct=True))
-        .order_by("-cnt")
-    ]
-    brands_block = [
-        {
-            "id": row["brand_id"],
-            "name": row["brand__name_brand"],
-            "count": row["cnt"],
-            "additional_data": row["brand__additional_data"],
-        }
-        for row in prod_qs.values(
-            "brand_id", "brand__name_brand", "brand__additional_data"
-        )
-        .annotate(cnt=Count("id", distinct=True))
-        .order_by("-cnt")
-        if row["brand_id"]
-    ]
-
-    # spec_rows = (
-    #     prod_qs.values(
-    #         "specifications__name_specification_id",
-    #         "specifications__name_specification__name_specification",
-    #         "specifications__value_specification_id",
-    #         "specifications__value_specification__value_specification",
-    #     )
-    #     .annotate(cnt=Count("id", distinct=False))
-    #     .order_by("-cnt")
-    # )
-    spec_rows = (
-        Specifications.objects.filter(product__in=prod_qs)
-        .values(
-            "name_specification_id",
-            "name_specification__name_specification",
-            "name_specification__additional_data",
-            "value_specification_id",
-            "value_specification__value_specification",
-            "value_specification__additional_data",
-        )
-        .annotate(cnt=Count("id", distinct=False))
-        .order_by("-cnt")
-    )
 
-    spec_map: dict[int, dict] = defaultdict(
-        lambda: {"id": None, "name": "", "additional_data": {}, "values": []}
+    # ---------- выборка и counts для facets по индексу в памяти ------------------
+    # Фильтры, счётчики и порядок товаров считаются по битовым множествам
+    # FacetIndex; в базу идёт только запрос карточек страницы.
+    index = FacetIndex.get()
+    bits = index.select(category_ids, brand_ids, spec_filters, city_name)
+    category_block, brands_block, specs_block = index.facets(bits)
+    products_total = index.count(bits)
+
+    # ---------- теги кеша ответа -------------------
+    CacheTags.add(
+        CacheTags.PRODUCTS,
+        city_name and CacheTags.city(city_name),
+        *(CacheTags.category(row["id"]) for row in category_block),
+        *(CacheTags.brand(row["id"]) for row in brands_block),
     )
-    for r in spec_rows:
-        sid = r["name_specification_id"]
-        if sid:
-            spec_map[sid]["id"] = sid
-            spec_map[sid]["name"] = r["name_specification__name_specification"]
-            spec_map[sid]["additional_data"] = r["name_specification__additional_data"]
-            spec_map[sid]["values"].append(
-                {
-                    "id": r["value_specification_id"],
-                    "value": r["value_specification__value_specification"],
-                    "additional_data": r["value_specification__additional_data"],
-                    "count": r["cnt"],
-                }
-            )
-    specs_block = list(spec_map.values())
 
     # ---------- блок товаров -----------------------
     limit = int(request.GET.get("limit", 20))
     offset = int(request.GET.get("offset", 0))
 
-    # ---------- блок фильтрации по городу -----------------------
-    # TODO я немного запутался, но считаю, что перенос этого блока выше правильное решение
-    # # Фильтрация по городу, если указан
-    # city_name = request.GET.get("city")
-    # prod_qs = ProductsQueryFactory.enrich(base_qs)
-    # if city_name:
-    #     # Фильтрация товаров по остаткам в указанном городе
-    #     stocks_filter = Q(stocks__warehouse__city__name_city=city_name)
-    #     # Фильтрация товаров по рёбрам, ведущим в указанный город
-    #     edges_filter = Q(
-    #         Q(category__edges__city_to__name_city=city_name)
-    #         | Q(brand__edges__city_to__name_city=city_name)
-    #     )
-    #     # Применяем фильтры и удаляем дубли
-    #     prod_qs = prod_qs.filter(stocks_filter | edges_filter)
-
-    page_qs = prod_qs[offset : offset + limit]
-
-    serializer = ProductSerializer(page_qs, many=True)
-
-    products_total = prod_qs.count()
-
-    products_block = {
-        "count": products_total,
-        "limit": limit,
-        "offset": offset,
-        "items": serializer.data,
-    }
+    if ProductsKeysetPagination.is_requested(request):
+        # keyset-режим: страница по курсору из базы, количество — из индекса
+        base_qs = Products.objects.filter(show_it=True, category_id__in=category_ids)
+        prod_qs = ProductsQueryFactory.enrich(
+            _apply_filters(base_qs, brand_ids, spec_filters)
+        )
+        if city_name:
+            # Остатки на складах города или рёбра в город (ProductCityVisibility)
+            prod_qs = ProductsQueryFactory.only_visible_in_city(prod_qs, city_name)
+        paginator = ProductsKeysetPagination()
+        page_qs = paginator.paginate_queryset(prod_qs, request)
+        serializer = ProductSerializer(page_qs, many=True)
+        products_block = {
+            "count": products_total,
+            "limit": paginator.limit,
+            "next_cursor": paginator.get_next_cursor(),
+            "next": paginator.get_next_link(),
+            "items": serializer.data,
+        }
+    else:
+        # ---------- сортировка -----------------------------
+        # пример: ?ordering=price,-rating; разрешены ключи FacetIndex.ORDERING_FIELDS,
+        # знак «-» — обратный порядок, цена — минимальная цена (в городе, если задан)
+        ordering = [
+            term
+            for term in request.GET.get("ordering", "").split(",")
+            if term.lstrip("-") in FacetIndex.ORDERING_FIELDS
+        ]
+        page_ids = index.page(bits, ordering, offset, limit, city_name)
+        products = ProductsQueryFactory.enrich(Products.objects.filter(pk__in=page_ids))
+        by_id = {product.pk: product for product in products}
+        page = [by_id[pk] for pk in page_ids if pk in by_id]
+
+        serializer = ProductSerializer(page, many=True)
+
+        products_block = {
+            "count": products_total,
+            "limit": limit,
+            "offset": offset,
+            "items": serializer.data,
+        }
 
     # ---------- ответ ------------------------------
     return Response(
@@ -0,0 +1,175 @@
+import threading
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app_products.models import Products
+from app_products.ProductsQueryFactory import ProductsQueryFactory
+from app_products.ProductCardUpdater import ProductCardUpdater
+from app_sales_points.utils import ProductCityVisibilityUpdater
+from app_discounts.models import (
+    ProductDiscount,
+    CategoryDiscount,
+    BrandDiscount,
+    ProductEffectiveDiscount,
+)
+
+
+class EffectiveDiscountUpdater:
+    """
+    Поддерживает таблицу ProductEffectiveDiscount: одна действующая
+    скидка на товар (товар → категория → бренд, внутри уровня — максимальная).
+    После пересчёта скидок пересчитываются и карточки ProductCard.
+    """
+
+    CHUNK_SIZE = 500
+    UPDATE_FIELDS = [
+        "source",
+        "discount_id",
+        "name",
+        "description",
+        "amount",
+        "start_date",
+        "end_date",
+    ]
+    # Когда задача refresh_discount_windows проверяла границы в последний раз
+    CHECKED_AT_CACHE_KEY = "discounts:windows_checked_at"
+    # Окно проверки, если отметки в кеше нет (первый запуск / сброс кеша)
+    DEFAULT_LOOKBACK = timedelta(minutes=10)
+
+    _local = threading.local()
+
+    @classmethod
+    def schedule(cls, product_ids):
+        """Откладывает пересчёт до коммита текущей транзакции (одной пачкой)."""
+        product_ids = {pk for pk in product_ids if pk}
+        if not product_ids:
+            return
+        batch = getattr(cls._local, "batch", None)
+        if batch is None:
+            batch = cls._local.batch = set()
+        batch.update(product_ids)
+        transaction.on_commit(cls._flush)
+
+    @classmethod
+    def _flush(cls):
+        batch = getattr(cls._local, "batch", None)
+        cls._local.batch = None
+        if batch:
+            cls.refresh(batch)
+
+    @classmethod
+    def refresh(cls, product_ids, now=None):
+        """
+        Пересчитывает действующие скидки указанных товаров,
+        затем их карточки (скидка выводится в товаре — кеш товаров
+        инвалидируется вместе с карточками) и цены по городам
+        (ProductCityPrice хранит цены до скидки).
+        """
+        now = now or timezone.now()
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), cls.CHUNK_SIZE):
+            cls._refresh_chunk(product_ids[start : start + cls.CHUNK_SIZE], now)
+        ProductCardUpdater.refresh(product_ids)
+        ProductCityVisibilityUpdater.refresh(product_ids)
+
+    @classmethod
+    def rebuild_all(cls):
+        """Полная перестройка таблицы (первичное заполнение / сверка)."""
+        product_ids = list(Products.objects.values_list("id", flat=True))
+        cls.refresh(product_ids)
+        return len(product_ids)
+
+    @classmethod
+    def refresh_windows(cls, now=None):
+        """
+        Пересчитывает товары, у скидок которых с прошлой проверки
+        наступил start_date или прошёл end_date. Возвращает число товаров.
+        """
+        now = now or timezone.now()
+        checked_at = cache.get(cls.CHECKED_AT_CACHE_KEY) or now - cls.DEFAULT_LOOKBACK
+        crossed = Q(start_date__gt=checked_at, start_date__lte=now) | Q(
+            end_date__gte=checked_at, end_date__lt=now
+        )
+        product_ids = set()
+        for model in (ProductDiscount, CategoryDiscount, BrandDiscount):
+            for discount in model.objects.filter(crossed, active=True):
+                product_ids.update(cls.discount_product_ids(discount))
+        cls.refresh(product_ids, now)
+        cache.set(cls.CHECKED_AT_CACHE_KEY, now, None)
+        return len(product_ids)
+
+    @staticmethod
+    def discount_product_ids(discount):
+        """id товаров, на которые распространяется скидка любого вида."""
+        if isinstance(discount, ProductDiscount):
+            return discount.products.values_list("id", flat=True)
+        if isinstance(discount, CategoryDiscount):
+            return Products.objects.filter(
+                category__in=discount.categories.all()
+            ).values_list("id", flat=True)
+        if isinstance(discount, BrandDiscount):
+            return Products.objects.filter(brand__in=discount.brands.all()).values_list(
+                "id", flat=True
+            )
+        return []
+
+    @classmethod
+    def _refresh_chunk(cls, product_ids, now):
+        products = ProductsQueryFactory.with_all_discounts(
+            Products.objects.filter(pk__in=product_ids).select_related(
+                "category", "brand"
+            )
+        )
+        rows = []
+        for product in products:
+            row = cls._resolve(product, now)
+            if row is not None:
+                rows.append(row)
+
+        with transaction.atomic():
+            ProductEffectiveDiscount.objects.filter(product_id__in=product_ids).exclude(
+                product_id__in=[row.product_id for row in rows]
+            ).delete()
+            ProductEffectiveDiscount.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=cls.UPDATE_FIELDS + ["updated_at"],
+            )
+
+    @staticmethod
+    def _resolve(product, now):
+        candidates = (
+            (
+                ProductEffectiveDiscount.SOURCE_PRODUCT,
+                getattr(product, "prefetched_product_discounts", []),
+            ),
+            (
+                ProductEffectiveDiscount.SOURCE_CATEGORY,
+                getattr(product.category, "prefetched_category_discounts", []),
+            ),
+            (
+                ProductEffectiveDiscount.SOURCE_BRAND,
+                getattr(product.brand, "prefetched_brand_discounts", []),
+            ),
+        )
+        for source, discounts in candidates:
+            discounts = [discount for discount in discounts if discount.is_valid(now)]
+            if not discounts:
+                continue
+            discount = max(discounts, key=lambda d: d.amount)
+            return ProductEffectiveDiscount(
+                product=product,
+                source=source,
+                discount_id=discount.id,
+                name=discount.name,
+                description=discount.description,
+                amount=discount.amount,
+                start_date=discount.start_date,
+                end_date=discount.end_date,
+            )
+        return None
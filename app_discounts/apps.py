@@ -5,3 +5,6 @@ class AppDiscountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app_discounts"
     verbose_name = "Управление скидками"
+
+    def ready(self):
+        from app_discounts import signals
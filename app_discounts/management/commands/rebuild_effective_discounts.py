@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from app_discounts.EffectiveDiscountUpdater import EffectiveDiscountUpdater
+
+# первичное заполнение / сверка таблицы действующих скидок; заодно
+# перестраивает ProductCard и ProductCityVisibility / ProductCityPrice
+# python manage.py rebuild_effective_discounts
+
+
+class Command(BaseCommand):
+    help = (
+        "Полная перестройка таблицы ProductEffectiveDiscount, "
+        "карточек товаров и цен по городам"
+    )
+
+    def handle(self, *args, **options):
+        total = EffectiveDiscountUpdater.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ Пересчитано товаров: {total}"))
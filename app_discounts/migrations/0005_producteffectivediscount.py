@@ -0,0 +1,78 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_discounts", "0004_alter_branddiscount_brands_and_more"),
+        ("app_products", "0011_products_review_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductEffectiveDiscount",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="effective_discount",
+                        serialize=False,
+                        to="app_products.products",
+                        verbose_name="Продукт",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("product", "Скидка на продукт"),
+                            ("category", "Скидка на категорию"),
+                            ("brand", "Скидка на бренд"),
+                        ],
+                        max_length=8,
+                        verbose_name="Уровень скидки",
+                    ),
+                ),
+                ("discount_id", models.PositiveIntegerField(verbose_name="ID скидки")),
+                (
+                    "name",
+                    models.CharField(max_length=255, verbose_name="Название скидки"),
+                ),
+                (
+                    "description",
+                    models.TextField(blank=True, verbose_name="Описание скидки"),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Размер скидки"
+                    ),
+                ),
+                (
+                    "start_date",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата начала действия"
+                    ),
+                ),
+                (
+                    "end_date",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата окончания действия"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата пересчёта"),
+                ),
+            ],
+            options={
+                "verbose_name": "Действующая скидка товара",
+                "verbose_name_plural": "Действующие скидки товаров",
+            },
+        ),
+    ]
@@ -42,18 +42,18 @@ class BaseDiscount(JSONFieldsMixin, models.Model):
         verbose_name="Дата окончания действия",
     )
 
-    def is_valid(self):
-        """Проверяет, активна ли скидка и в допустимом ли диапазоне даты"""
+    def is_valid(self, now=None):
+        """
+        Проверяет, активна ли скидка и в допустимом ли диапазоне даты.
+        Только чтение: переходы через start_date / end_date
+        отрабатывает периодическая задача refresh_discount_windows.
+        """
         if not self.active:
             return False
-        now = timezone.now()
+        now = now or timezone.now()
         if self.start_date and self.start_date > now:
-            self.active = False
-            self.save()
             return False
         if self.end_date and self.end_date < now:
-            self.active = False
-            self.save()
             return False
         return True
 
@@ -101,3 +101,71 @@ class BrandDiscount(BaseDiscount):
     class Meta:
         verbose_name = "Скидка на бренд"
         verbose_name_plural = "Скидка на бренды"
+
+
+class ProductEffectiveDiscount(models.Model):
+    """
+    Действующая прямо сейчас скидка товара (read model).
+    Приоритет: товар → категория → бренд, внутри уровня — максимальная.
+    Строка есть только у товаров со скидкой; поддерживается
+    EffectiveDiscountUpdater.
+    """
+
+    SOURCE_PRODUCT = "product"
+    SOURCE_CATEGORY = "category"
+    SOURCE_BRAND = "brand"
+    SOURCE_CHOICES = [
+        (SOURCE_PRODUCT, "Скидка на продукт"),
+        (SOURCE_CATEGORY, "Скидка на категорию"),
+        (SOURCE_BRAND, "Скидка на бренд"),
+    ]
+
+    product = models.OneToOneField(
+        Products,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="effective_discount",
+        verbose_name="Продукт",
+    )
+    source = models.CharField(
+        max_length=8,
+        choices=SOURCE_CHOICES,
+        verbose_name="Уровень скидки",
+    )
+    discount_id = models.PositiveIntegerField(
+        verbose_name="ID скидки",
+    )
+    name = models.CharField(
+        max_length=255,
+        verbose_name="Название скидки",
+    )
+    description = models.TextField(
+        blank=True,
+        verbose_name="Описание скидки",
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Размер скидки",
+    )
+    start_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата начала действия",
+    )
+    end_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Дата окончания действия",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата пересчёта",
+    )
+
+    def __str__(self):
+        return f"{self.product_id}: {self.name} ({self.amount})"
+
+    class Meta:
+        verbose_name = "Действующая скидка товара"
+        verbose_name_plural = "Действующие скидки товаров"
@@ -0,0 +1,68 @@
+from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from app_products.models import Products
+from app_discounts.models import ProductDiscount, CategoryDiscount, BrandDiscount
+from app_discounts.EffectiveDiscountUpdater import EffectiveDiscountUpdater
+
+
+# ---------------------------------------------------------------------------
+# Действующие скидки товаров (ProductEffectiveDiscount)
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Products)
+def product_saved(sender, instance, **kwargs):
+    # могли смениться категория или бренд, а значит и их скидки
+    EffectiveDiscountUpdater.schedule([instance.pk])
+
+
+@receiver(post_save, sender=ProductDiscount)
+@receiver(post_save, sender=CategoryDiscount)
+@receiver(post_save, sender=BrandDiscount)
+def discount_saved(sender, instance, **kwargs):
+    EffectiveDiscountUpdater.schedule(
+        EffectiveDiscountUpdater.discount_product_ids(instance)
+    )
+
+
+@receiver(m2m_changed, sender=ProductDiscount.products.through)
+@receiver(m2m_changed, sender=CategoryDiscount.categories.through)
+@receiver(m2m_changed, sender=BrandDiscount.brands.through)
+def discount_targets_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # При clear набор целей после операции уже пуст — берём его до очистки
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # instance — товар/категория/бренд, у которого меняют скидки
+        if isinstance(instance, Products):
+            product_ids = [instance.pk]
+        elif sender is CategoryDiscount.categories.through:
+            product_ids = Products.objects.filter(category=instance).values_list(
+                "id", flat=True
+            )
+        else:
+            product_ids = Products.objects.filter(brand=instance).values_list(
+                "id", flat=True
+            )
+    elif action == "pre_clear":
+        product_ids = EffectiveDiscountUpdater.discount_product_ids(instance)
+    elif sender is ProductDiscount.products.through:
+        product_ids = pk_set
+    elif sender is CategoryDiscount.categories.through:
+        product_ids = Products.objects.filter(category_id__in=pk_set).values_list(
+            "id", flat=True
+        )
+    else:
+        product_ids = Products.objects.filter(brand_id__in=pk_set).values_list(
+            "id", flat=True
+        )
+    EffectiveDiscountUpdater.schedule(list(product_ids))
+
+
+@receiver(pre_delete, sender=ProductDiscount)
+@receiver(pre_delete, sender=CategoryDiscount)
+@receiver(pre_delete, sender=BrandDiscount)
+def discount_deleted(sender, instance, **kwargs):
+    # Связи M2M удаляются каскадом без m2m_changed — собираем цели заранее
+    EffectiveDiscountUpdater.schedule(
+        EffectiveDiscountUpdater.discount_product_ids(instance)
+    )
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from app_discounts.EffectiveDiscountUpdater import EffectiveDiscountUpdater
+
+
+@shared_task(bind=True, name="Пересчитать скидки на границах периодов действия")
+def refresh_discount_windows(self):
+    return EffectiveDiscountUpdater.refresh_windows()
@@ -1,3 +1,80 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_products.models import Products
+from app_discounts.models import (
+    ProductDiscount,
+    CategoryDiscount,
+    BrandDiscount,
+    ProductEffectiveDiscount,
+)
+from app_discounts.EffectiveDiscountUpdater import EffectiveDiscountUpdater
+
+
+class EffectiveDiscountTest(TestCase):
+    """Приоритет товар → категория → бренд и периоды действия скидок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name_category="Диваны", slug="divany")
+        cls.brand = Brands.objects.create(name_brand="Brand")
+        cls.product = Products.objects.create(
+            vendor_code="V1",
+            name_product="Диван",
+            category=cls.category,
+            brand=cls.brand,
+        )
+
+    def effective(self, now=None):
+        EffectiveDiscountUpdater.refresh([self.product.pk], now)
+        return ProductEffectiveDiscount.objects.filter(product=self.product).first()
+
+    def test_priority(self):
+        BrandDiscount.objects.create(name="b", amount=30).brands.add(self.brand)
+        self.assertEqual(self.effective().source, "brand")
+
+        CategoryDiscount.objects.create(name="c", amount=20).categories.add(
+            self.category
+        )
+        self.assertEqual(self.effective().source, "category")
+
+        ProductDiscount.objects.create(name="p1", amount=5).products.add(self.product)
+        ProductDiscount.objects.create(name="p2", amount=10).products.add(self.product)
+        effective = self.effective()
+        self.assertEqual((effective.source, effective.amount), ("product", 10))
+
+    def test_window(self):
+        now = timezone.now()
+        discount = ProductDiscount.objects.create(
+            name="p",
+            amount=10,
+            start_date=now + timedelta(hours=1),
+            end_date=now + timedelta(hours=2),
+        )
+        discount.products.add(self.product)
+
+        self.assertIsNone(self.effective(now))
+        self.assertIsNotNone(self.effective(now + timedelta(minutes=90)))
+        self.assertIsNone(self.effective(now + timedelta(hours=3)))
+        # проверка периода ничего не пишет в базу
+        discount.refresh_from_db()
+        self.assertTrue(discount.active)
+        self.assertFalse(discount.is_valid(now))
+
+    def test_refresh_windows(self):
+        now = timezone.now()
+        ProductDiscount.objects.create(
+            name="p", amount=10, start_date=now + timedelta(minutes=1)
+        ).products.add(self.product)
+        self.assertIsNone(self.effective(now))
 
-# Create your tests here.
+        cache.delete(EffectiveDiscountUpdater.CHECKED_AT_CACHE_KEY)
+        EffectiveDiscountUpdater.refresh_windows(now + timedelta(minutes=2))
+        self.assertTrue(
+            ProductEffectiveDiscount.objects.filter(product=self.product).exists()
+        )
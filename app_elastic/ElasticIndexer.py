@@ -0,0 +1,176 @@
+import logging
+
+from django.core.cache import cache
+from elasticsearch.helpers import parallel_bulk, scan
+
+from app_category.documents import CategoryDocument
+from app_products.documents import ProductDocument
+
+from core.CacheLock import CacheLock
+from core.CacheTags import CacheTags
+from core.ChangeFeed import ChangeFeed
+
+logger = logging.getLogger(__name__)
+
+
+class ElasticIndexer:
+    """
+    Инкрементальная синхронизация индексов Elasticsearch (товары и
+    категории) вместо синхронного запроса к ES на каждый save().
+
+    Товары переиндексируются по ленте изменений ChangeFeed("products"):
+    в неё уже попадают изменения карточек — остатков, цен, тегов,
+    характеристик, — переименования категорий, брендов и характеристик
+    и удаления товаров (см. FacetIndex). Сброс ленты или потерянные
+    пачки — полная переиндексация. Категории небольшие: переиндексируются
+    целиком, когда сдвигается версия CacheTags.SEARCH_DICTIONARIES.
+
+    Документы собираются пачками с prefetch (ProductDocument.get_queryset)
+    и отправляются через parallel_bulk. Последний применённый номер
+    ленты хранится в кеше — sync() вызывает Celery каждые несколько секунд.
+    """
+
+    feed = ChangeFeed("products")
+    STATE_KEY = "elastic_indexer:state"
+    LOCK_KEY = "elastic_indexer:lock"
+    # Блокировка снимается после синхронизации; TTL — на случай падения воркера
+    LOCK_TIMEOUT = 60 * 30
+    CHUNK_SIZE = 500
+    THREAD_COUNT = 4
+
+    # ------------------------------------------------------------------ #
+    # Синхронизация
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def sync(cls):
+        """
+        Применяет накопившиеся изменения. Возвращает число отправленных
+        документов (None — синхронизация уже идёт в другом воркере).
+        """
+        lock = CacheLock(cls.LOCK_KEY, cls.LOCK_TIMEOUT)
+        if not lock.acquire():
+            return None
+        try:
+            return cls._sync()
+        finally:
+            lock.release()
+
+    @classmethod
+    def _sync(cls):
+        version = CacheTags.versions([CacheTags.SEARCH_DICTIONARIES])[
+            CacheTags.SEARCH_DICTIONARIES
+        ]
+        state = cache.get(cls.STATE_KEY)
+        if state is None:
+            return cls._rebuild(version)
+
+        seq, product_ids = cls.feed.read(state["seq"])
+        if product_ids is None:
+            return cls._rebuild(version)
+
+        total = 0
+        if product_ids:
+            total += cls.index_products(product_ids)
+        if state["dictionaries"] != version:
+            total += cls.index_all(CategoryDocument())
+        cache.set(cls.STATE_KEY, {"seq": seq, "dictionaries": version}, None)
+        return total
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Полная переиндексация (первый запуск, сверка). None — идёт
+        синхронизация в другом воркере.
+        """
+        cache.delete(cls.STATE_KEY)
+        return cls.sync()
+
+    @classmethod
+    def _rebuild(cls, version):
+        # номер читается до данных: изменения во время переиндексации
+        # применятся повторно — это безопасно
+        seq = cls.feed.current()
+        total = cls.index_all(ProductDocument()) + cls.index_all(CategoryDocument())
+        cache.set(cls.STATE_KEY, {"seq": seq, "dictionaries": version}, None)
+        return total
+
+    # ------------------------------------------------------------------ #
+    # Индексация
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def index_products(cls, product_ids):
+        """Переиндексирует товары; отсутствующие в базе — удаляет из индекса."""
+        document = ProductDocument()
+        product_ids = set(product_ids)
+        existing = set(
+            document.get_queryset()
+            .filter(pk__in=product_ids)
+            .values_list("pk", flat=True)
+        )
+        queryset = document.get_queryset().filter(pk__in=existing)
+        return cls.bulk(
+            document,
+            cls.index_actions(document, queryset),
+            cls.delete_actions(document, product_ids - existing),
+        )
+
+    @classmethod
+    def index_all(cls, document):
+        """
+        Переиндексирует все объекты документа и удаляет из индекса те,
+        которых уже нет в базе. Индекс создаётся, если его нет.
+        """
+        index = document._index
+        if not index.exists():
+            index.create()
+        existing = set(document.get_queryset().values_list("pk", flat=True))
+        stale = {
+            int(hit["_id"])
+            for hit in scan(
+                document._get_connection(),
+                index=index._name,
+                query={"query": {"match_all": {}}},
+                _source=False,
+            )
+        } - existing
+        return cls.bulk(
+            document,
+            cls.index_actions(document, document.get_queryset()),
+            cls.delete_actions(document, stale),
+        )
+
+    @classmethod
+    def index_actions(cls, document, queryset):
+        return document.get_actions(
+            queryset.iterator(chunk_size=cls.CHUNK_SIZE), "index"
+        )
+
+    @staticmethod
+    def delete_actions(document, pks):
+        for pk in sorted(pks):
+            yield {"_op_type": "delete", "_index": document._index._name, "_id": pk}
+
+    @classmethod
+    def bulk(cls, document, *action_lists):
+        """
+        Отправляет действия через parallel_bulk; ошибки отдельных
+        документов пишутся в лог (удаление отсутствующего — не ошибка).
+        Возвращает число действий.
+        """
+        total = 0
+        for action_list in action_lists:
+            for ok, item in parallel_bulk(
+                document._get_connection(),
+                action_list,
+                thread_count=cls.THREAD_COUNT,
+                chunk_size=cls.CHUNK_SIZE,
+                raise_on_error=False,
+            ):
+                total += 1
+                if ok:
+                    continue
+                op_type, result = next(iter(item.items()))
+                if op_type == "delete" and result.get("status") == 404:
+                    continue
+                logger.error("Ошибка индексации Elasticsearch: %s", item)
+        return total
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app_elastic.ElasticIndexer import ElasticIndexer
+
+# полная переиндексация товаров и категорий в Elasticsearch (parallel_bulk);
+# дальше индексы поддерживает задача Celery по ленте изменений
+# python manage.py rebuild_elastic_index
+
+
+class Command(BaseCommand):
+    help = "Полная переиндексация товаров и категорий в Elasticsearch"
+
+    def handle(self, *args, **options):
+        total = ElasticIndexer.rebuild()
+        if total is None:
+            self.stdout.write(
+                self.style.WARNING("Синхронизация уже идёт — повторите позже")
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(f"✅ Отправлено документов: {total}"))
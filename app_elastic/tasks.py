@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from app_elastic.ElasticIndexer import ElasticIndexer
+
+
+@shared_task(bind=True, name="Синхронизировать индексы Elasticsearch")
+def sync_elastic_indexes(self):
+    return ElasticIndexer.sync()
@@ -1,3 +1,59 @@
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from app_products.models import Products, ProductImage
+from app_sales_points.models import City, Warehouse, Stock
+from app_sales_points.utils import stocks_bulk_changed
+from app_elastic.ElasticIndexer import ElasticIndexer
+
+from core.CacheTags import CacheTags
+
+
+class ElasticIndexerTest(TestCase):
+    """Изменения остатков из синхронизации попадают в индекс через ленту."""
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(name_city="Алматы")
+        warehouse = Warehouse.objects.create(
+            name_warehouse="W1", city=city, external_id="1"
+        )
+        cls.product = Products.objects.create(vendor_code="V1", name_product="Диван")
+        ProductImage.objects.create(
+            product=cls.product, image="product_images/1.jpg", ind=1
+        )
+        cls.stock = Stock.objects.create(
+            product=cls.product, warehouse=warehouse, quantity=1, price=100
+        )
+
+    def setUp(self):
+        # индексы уже синхронизированы до текущего номера ленты
+        version = CacheTags.versions([CacheTags.SEARCH_DICTIONARIES])
+        cache.set(
+            ElasticIndexer.STATE_KEY,
+            {
+                "seq": ElasticIndexer.feed.current(),
+                "dictionaries": version[CacheTags.SEARCH_DICTIONARIES],
+            },
+            None,
+        )
+
+    def test_bulk_stock_change_is_indexed(self):
+        self.stock.price = 90
+        with self.captureOnCommitCallbacks(execute=True):
+            Stock.objects.bulk_update([self.stock], ["price"])
+            stocks_bulk_changed([self.product.pk])
+
+        with mock.patch.object(
+            ElasticIndexer, "index_products", return_value=1
+        ) as index_products:
+            self.assertEqual(ElasticIndexer.sync(), 1)
+        # в пачке могут быть и id, отложенные откатившимися транзакциями
+        index_products.assert_called_once()
+        self.assertIn(self.product.pk, index_products.call_args.args[0])
+
+        with mock.patch.object(ElasticIndexer, "index_products") as index_products:
+            self.assertEqual(ElasticIndexer.sync(), 0)
+        index_products.assert_not_called()
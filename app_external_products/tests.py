@@ -1,3 +1,10 @@
+from django.test import TestCase
+
+from app_products.models import Products, ProductImage, ProductCard
+from app_products.ProductCardUpdater import ProductCardUpdater
+from app_sales_points.models import City, Warehouse, Stock
+from app_external_products.utils import update_offers
+
 DATATEST = {
     "offers": [
         {
@@ -44,3 +51,36 @@ DATATEST = {
         },
     ]
 }
+
+
+class UpdateOffersTest(TestCase):
+    """Остатки товаров каталога из выгрузки Kaspi доходят до карточек."""
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(name_city="Караганда")
+        warehouse = Warehouse.objects.create(
+            name_warehouse="PPKD20", city=city, external_id="PPKD20"
+        )
+        cls.product = Products.objects.create(
+            vendor_code="21708", name_product="TV ART A55LU8500"
+        )
+        ProductImage.objects.create(
+            product=cls.product, image="product_images/tv.jpg", ind=1
+        )
+        Stock.objects.create(
+            product=cls.product, warehouse=warehouse, quantity=0, price=226000
+        )
+        ProductCardUpdater.rebuild_all()
+
+    def test_catalog_stock_refreshes_card(self):
+        offer = dict(DATATEST["offers"][0])
+        offer["availabilities"] = [
+            {"storeId": "PPKD20", "available": "yes", "stockCount": 66}
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            update_offers({"offers": [offer]})
+
+        card = ProductCard.objects.get(product=self.product)
+        self.assertEqual(card.total_quantity, 66)
+        self.assertTrue(card.in_stock)
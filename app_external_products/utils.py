@@ -24,6 +24,7 @@ from app_external_products.models import (
 
 from app_products.models import Products
 from app_sales_points.models import Stock as BaseStock, Warehouse as BaseWarehouse
+from app_sales_points.utils import stocks_bulk_changed
 
 
 def fetch_offers_from_kaspi():
@@ -244,6 +245,8 @@ def update_offers(data: dict):
     #
     final_stocks = defaultdict(int)
     final_stocks_base = defaultdict(int)
+    # остатки товаров каталога — одним bulk_update в конце
+    base_stocks_to_update = []
     print(f"---- final_stocks ---- >>> {final_stocks}")
 
     # Заполняем словарь final_stocks
@@ -264,7 +267,7 @@ def update_offers(data: dict):
                 ).first()
                 if stock:
                     stock.quantity = available.get("stockCount", 0)
-                    stock.save()
+                    base_stocks_to_update.append(stock)
                 else:
                     wh, created = BaseWarehouse.objects.get_or_create(
                         external_id=available["storeId"],
@@ -333,6 +336,11 @@ def update_offers(data: dict):
         if stocks_to_update:
             Stock.objects.bulk_update(stocks_to_update, ["quantity", "price"])
 
+        if base_stocks_to_update:
+            BaseStock.objects.bulk_update(base_stocks_to_update, ["quantity"])
+            # bulk_update не шлёт сигналов — карточки и кеш обновляем явно
+            stocks_bulk_changed(stock.product_id for stock in base_stocks_to_update)
+
 
 class SessionStorage:
     def __init__(self):
@@ -0,0 +1,478 @@
+import heapq
+import threading
+from collections import defaultdict
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_products.models import ProductCard
+from app_sales_points.models import City, ProductCityPrice, ProductCityVisibility
+from app_specifications.models import NameSpecifications, ValueSpecifications
+
+from core.CacheTags import CacheTags
+from core.ChangeFeed import ChangeFeed
+
+# Номера установленных битов для каждого значения байта
+BYTE_BITS = tuple(
+    tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)
+)
+
+
+class ProductFacets:
+    """Строка индекса: то, по чему товар фильтруется, считается и сортируется."""
+
+    __slots__ = (
+        "product_id",
+        "category_id",
+        "brand_id",
+        "min_price",
+        "avg_rating",
+        "reviews_count",
+        "specs",
+        "cities",
+        "city_prices",
+    )
+
+    def __init__(
+        self, product_id, category_id, brand_id, min_price, avg_rating, reviews_count
+    ):
+        self.product_id = product_id
+        self.category_id = category_id
+        self.brand_id = brand_id
+        self.min_price = min_price
+        self.avg_rating = avg_rating
+        self.reviews_count = reviews_count
+        # (id названия, id значения) характеристик и id городов видимости
+        self.specs = set()
+        self.cities = set()
+        # id города -> минимальная цена в городе (ProductCityPrice)
+        self.city_prices = {}
+
+
+class FacetIndex:
+    """
+    Индекс фасетов каталога в памяти процесса.
+
+    Каждому товару в выдаче (ProductCard.in_stock) назначен номер бита;
+    для каждой категории, бренда, значения характеристики и города
+    хранится битовое множество товаров (int Python). Фильтр — это
+    пересечение / объединение множеств, счётчики фасетов — bit_count()
+    пересечений, страница — первые offset + limit номеров по сортировке.
+    SQL остаётся только для самих карточек страницы.
+
+    Индекс обновляется по ленте изменений ChangeFeed("products"):
+    ProductCardUpdater (карточка и её spec_index) и
+    ProductCityVisibilityUpdater публикуют id изменённых товаров.
+    Переименования в справочниках (категории, бренды, характеристики,
+    города) сдвигают версию тега CacheTags.FACET_DICTIONARIES — тогда
+    перечитываются только названия. Изменения применяются к копии
+    индекса; пока один поток её готовит, остальные отдают прежний индекс.
+    """
+
+    feed = ChangeFeed("products")
+    # Сколько товаров в выборке ещё выгоднее посчитать перебором строк,
+    # чем пересекать множества всех значений фасетов
+    TALLY_LIMIT = 2000
+    # Ключи сортировки ?ordering= -> поле строки индекса
+    ORDERING_FIELDS = {
+        "price": "min_price",
+        "rating": "avg_rating",
+        "reviews": "reviews_count",
+        "brand": "brand_name",
+    }
+
+    _index = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.seq = 0
+        self.names_version = None
+        self.positions = {}  # id товара -> номер бита
+        self.rows = []  # номер бита -> ProductFacets (None — товар выбыл)
+        self.categories = defaultdict(int)
+        self.brands = defaultdict(int)
+        self.spec_values = defaultdict(int)  # (id названия, id значения) -> биты
+        self.cities = defaultdict(int)
+        # справочники для ответа: id -> (название, additional_data)
+        self.category_names = {}
+        self.brand_names = {}
+        self.spec_names = {}
+        self.value_names = {}
+        self.city_ids = {}  # название города -> id
+        self._ranks = {}
+
+    # ------------------------------------------------------------------ #
+    # Жизненный цикл
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def get(cls):
+        """
+        Актуальный индекс: применяет свежие изменения из ленты.
+        Если индекс уже обновляет другой поток — текущий, без ожидания.
+        """
+        index = cls._index
+        if index is not None and not cls._lock.acquire(blocking=False):
+            return index
+        if index is None:
+            # отдавать ещё нечего — ждём первого построения
+            cls._lock.acquire()
+        try:
+            cls._index = cls.refreshed(cls._index)
+            return cls._index
+        finally:
+            cls._lock.release()
+
+    @classmethod
+    def refreshed(cls, index):
+        """Индекс с применёнными изменениями (index — не изменяется)."""
+        version = CacheTags.versions([CacheTags.FACET_DICTIONARIES])[
+            CacheTags.FACET_DICTIONARIES
+        ]
+        if index is None:
+            return cls.build(version)
+        seq, product_ids = cls.feed.read(index.seq)
+        if product_ids is None:
+            return cls.build(version)
+        if product_ids or index.names_version != version:
+            index = index.copy()
+            if index.names_version != version:
+                index.reload_names(version)
+            if product_ids:
+                index.update_rows(product_ids)
+        index.seq = seq
+        return index
+
+    @classmethod
+    def build(cls, version=None):
+        index = cls()
+        # номер и версия читаются до данных: изменения, пришедшие во время
+        # построения, применятся повторно — это безопасно
+        index.seq = cls.feed.current()
+        index.names_version = version
+        index.load_rows(
+            ProductCard.objects.filter(in_stock=True).order_by("product_id"), full=True
+        )
+        index.city_ids = dict(City.objects.values_list("name_city", "id"))
+        return index
+
+    def copy(self):
+        index = FacetIndex.__new__(FacetIndex)
+        index.__dict__.update(self.__dict__)
+        index.positions = dict(self.positions)
+        index.rows = list(self.rows)
+        for name in ("categories", "brands", "spec_values", "cities"):
+            setattr(index, name, defaultdict(int, getattr(self, name)))
+        for name in ("category_names", "brand_names", "spec_names", "value_names"):
+            setattr(index, name, dict(getattr(self, name)))
+        index._ranks = {}
+        return index
+
+    def reload_names(self, version):
+        """Перечитывает названия справочников и городов (переименования)."""
+        self.category_names = {}
+        self.brand_names = {}
+        self.spec_names = {}
+        self.value_names = {}
+        self.load_names([row for row in self.rows if row is not None])
+        self.city_ids = dict(City.objects.values_list("name_city", "id"))
+        self.names_version = version
+        # сортировка по бренду идёт по названию
+        self._ranks = {}
+
+    def update_rows(self, product_ids):
+        """Пересчитывает строки product_ids (на копии индекса)."""
+        for product_id in product_ids:
+            self.remove_row(product_id)
+        self.load_rows(
+            ProductCard.objects.filter(in_stock=True, product_id__in=product_ids)
+        )
+
+    def load_rows(self, cards, full=False):
+        rows = {}
+        for product_id, *values, spec_index in cards.values_list(
+            "product_id",
+            "category_id",
+            "brand_id",
+            "min_price",
+            "avg_rating",
+            "reviews_count",
+            "spec_index",
+        ):
+            row = rows[product_id] = ProductFacets(product_id, *values)
+            row.specs = {
+                (int(name_id), value_id)
+                for name_id, value_ids in spec_index.items()
+                for value_id in value_ids
+            }
+        if not rows:
+            return
+        # при полном построении фильтр по id не нужен
+        scope = {} if full else {"product_id__in": list(rows)}
+        for product_id, city_id in (
+            ProductCityVisibility.objects.filter(**scope)
+            .values_list("product_id", "city_id")
+            .distinct()
+        ):
+            row = rows.get(product_id)
+            if row is not None:
+                row.cities.add(city_id)
+        for product_id, city_id, min_price in ProductCityPrice.objects.filter(
+            **scope
+        ).values_list("product_id", "city_id", "min_price"):
+            row = rows.get(product_id)
+            if row is not None:
+                row.city_prices[city_id] = min_price
+
+        groups = {
+            name: defaultdict(list)
+            for name in ("categories", "brands", "spec_values", "cities")
+        }
+        for product_id, row in rows.items():
+            position = self.positions.get(product_id)
+            if position is None:
+                position = self.positions[product_id] = len(self.rows)
+                self.rows.append(row)
+            else:
+                self.rows[position] = row
+            if row.category_id:
+                groups["categories"][row.category_id].append(position)
+            if row.brand_id:
+                groups["brands"][row.brand_id].append(position)
+            for spec in row.specs:
+                groups["spec_values"][spec].append(position)
+            for city_id in row.cities:
+                groups["cities"][city_id].append(position)
+        for name, group in groups.items():
+            target = getattr(self, name)
+            for key, positions in group.items():
+                target[key] |= self.to_bits(positions)
+        self.load_names(rows.values())
+
+    def remove_row(self, product_id):
+        position = self.positions.get(product_id)
+        if position is None or self.rows[position] is None:
+            return
+        row = self.rows[position]
+        self.rows[position] = None
+        keep = ~(1 << position)
+        if row.category_id:
+            self.categories[row.category_id] &= keep
+        if row.brand_id:
+            self.brands[row.brand_id] &= keep
+        for spec in row.specs:
+            self.spec_values[spec] &= keep
+        for city_id in row.cities:
+            self.cities[city_id] &= keep
+
+    def load_names(self, rows):
+        """Догружает названия для ещё неизвестных id справочников."""
+        missing = {
+            "category": {row.category_id for row in rows} - self.category_names.keys(),
+            "brand": {row.brand_id for row in rows} - self.brand_names.keys(),
+            "name": {name_id for row in rows for name_id, _ in row.specs}
+            - self.spec_names.keys(),
+            "value": {value_id for row in rows for _, value_id in row.specs}
+            - self.value_names.keys(),
+        }
+        sources = {
+            "category": (self.category_names, Category, "name_category"),
+            "brand": (self.brand_names, Brands, "name_brand"),
+            "name": (self.spec_names, NameSpecifications, "name_specification"),
+            "value": (self.value_names, ValueSpecifications, "value_specification"),
+        }
+        for kind, ids in missing.items():
+            ids.discard(None)
+            if not ids:
+                continue
+            names, model, field = sources[kind]
+            for pk, name, additional_data in model.objects.filter(
+                pk__in=ids
+            ).values_list("id", field, "additional_data"):
+                names[pk] = (name, additional_data)
+
+    # ------------------------------------------------------------------ #
+    # Битовые множества
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def to_bits(positions):
+        data = bytearray(max(positions) // 8 + 1)
+        for position in positions:
+            data[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(data, "little")
+
+    @staticmethod
+    def iter_positions(bits):
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        for offset, byte in enumerate(data):
+            if byte:
+                base = offset << 3
+                for bit in BYTE_BITS[byte]:
+                    yield base + bit
+
+    @staticmethod
+    def union(mapping, keys):
+        bits = 0
+        for key in keys:
+            bits |= mapping.get(key, 0)
+        return bits
+
+    # ------------------------------------------------------------------ #
+    # Запросы
+    # ------------------------------------------------------------------ #
+    def select(self, category_ids, brand_ids=(), spec_filters=None, city_name=None):
+        """
+        Битовое множество товаров: категории category_ids (любая из),
+        бренды (любой из), по каждой характеристике — любое из значений,
+        видимость в городе.
+        """
+        bits = self.union(self.categories, category_ids)
+        if brand_ids:
+            bits &= self.union(self.brands, brand_ids)
+        for name_id, value_ids in (spec_filters or {}).items():
+            if not bits:
+                break
+            bits &= self.union(
+                self.spec_values, ((name_id, value_id) for value_id in value_ids)
+            )
+        if city_name:
+            city_id = self.city_ids.get(city_name)
+            bits &= self.cities.get(city_id, 0) if city_id else 0
+        return bits
+
+    @staticmethod
+    def count(bits):
+        return bits.bit_count()
+
+    def count_facets(self, bits):
+        """{"categories" | "brands" | "spec_values": {ключ: число товаров}}."""
+        total = bits.bit_count()
+        if total <= self.TALLY_LIMIT:
+            counts = {
+                name: defaultdict(int)
+                for name in ("categories", "brands", "spec_values")
+            }
+            for position in self.iter_positions(bits):
+                row = self.rows[position]
+                if row.category_id:
+                    counts["categories"][row.category_id] += 1
+                if row.brand_id:
+                    counts["brands"][row.brand_id] += 1
+                for spec in row.specs:
+                    counts["spec_values"][spec] += 1
+            return counts
+        return {
+            name: {
+                key: count
+                for key, value_bits in getattr(self, name).items()
+                if (count := (bits & value_bits).bit_count())
+            }
+            for name in ("categories", "brands", "spec_values")
+        }
+
+    def facets(self, bits):
+        """Блоки categorys / brands / specifications ответа category_facets."""
+        counts = self.count_facets(bits)
+
+        def by_count(items):
+            return sorted(items, key=lambda item: (-item[1], item[0]))
+
+        category_block = [
+            {
+                "id": pk,
+                "name": self.category_names.get(pk, (None, None))[0],
+                "count": count,
+                "additional_data": self.category_names.get(pk, (None, None))[1],
+            }
+            for pk, count in by_count(counts["categories"].items())
+        ]
+        brands_block = [
+            {
+                "id": pk,
+                "name": self.brand_names.get(pk, (None, None))[0],
+                "count": count,
+                "additional_data": self.brand_names.get(pk, (None, None))[1],
+            }
+            for pk, count in by_count(counts["brands"].items())
+        ]
+        specs = {}
+        for (name_id, value_id), count in sorted(
+            counts["spec_values"].items(),
+            key=lambda item: (-item[1], item[0]),
+        ):
+            if name_id not in specs:
+                name, additional_data = self.spec_names.get(name_id, (None, None))
+                specs[name_id] = {
+                    "id": name_id,
+                    "name": name,
+                    "additional_data": additional_data,
+                    "values": [],
+                }
+            value, additional_data = self.value_names.get(value_id, (None, None))
+            specs[name_id]["values"].append(
+                {
+                    "id": value_id,
+                    "value": value,
+                    "additional_data": additional_data,
+                    "count": count,
+                }
+            )
+        return category_block, brands_block, list(specs.values())
+
+    def page(self, bits, ordering=(), offset=0, limit=20, city_name=None):
+        """
+        id товаров страницы. ordering — ключи ORDERING_FIELDS, «-» —
+        по убыванию; пустые значения — в конце. По умолчанию — по id.
+        С city_name цена — минимальная цена в городе (ProductCityPrice).
+        """
+        city_id = self.city_ids.get(city_name) if city_name else None
+        positions = self.iter_positions(bits)
+        stop = offset + limit
+        keys = [
+            self.get_ranks(key.lstrip("-"), key.startswith("-"), city_id)
+            for key in ordering
+        ]
+        if keys:
+            page = heapq.nsmallest(
+                stop,
+                positions,
+                key=lambda p: (*(ranks[p] for ranks in keys), p),
+            )
+        else:
+            page = []
+            for position in positions:
+                page.append(position)
+                if len(page) >= stop:
+                    break
+        return [self.rows[position].product_id for position in page[offset:]]
+
+    def get_ranks(self, key, descending=False, city_id=None):
+        """
+        Ранг значения поля для каждого номера бита: меньше — раньше,
+        равные значения — равный ранг, пустые — после всех.
+        """
+        if key != "price":
+            city_id = None
+        ranks = self._ranks.get((key, descending, city_id))
+        if ranks is None:
+            field = self.ORDERING_FIELDS[key]
+
+            def value(row):
+                if city_id is not None:
+                    return row.city_prices.get(city_id)
+                if field == "brand_name":
+                    return self.brand_names.get(row.brand_id, (None, None))[0]
+                return getattr(row, field)
+
+            values = {
+                position: value(row)
+                for position, row in enumerate(self.rows)
+                if row is not None
+            }
+            ordered = sorted(
+                {v for v in values.values() if v is not None}, reverse=descending
+            )
+            rank_of = {v: rank for rank, v in enumerate(ordered)}
+            ranks = [0] * len(self.rows)
+            for position, v in values.items():
+                ranks[position] = rank_of[v] if v is not None else len(ordered)
+            self._ranks[(key, descending, city_id)] = ranks
+        return ranks
@@ -0,0 +1,163 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Q, Min, Sum
+
+from app_sales_points.models import Stock
+from app_specifications.models import Specifications
+from app_products.models import Products, ProductImage, ProductCard
+from app_products.FacetIndex import FacetIndex
+
+from core.CacheTags import CacheTags
+
+
+class ProductCardUpdater:
+    """
+    Поддерживает таблицу ProductCard (read model для горячих списков).
+    Пересчёт идёт пачками по id товаров, после коммита транзакции.
+    """
+
+    CHUNK_SIZE = 500
+    UPDATE_FIELDS = [
+        "name_product",
+        "slug",
+        "vendor_code",
+        "category",
+        "brand",
+        "min_price",
+        "avg_rating",
+        "reviews_count",
+        "total_quantity",
+        "spec_index",
+        "in_stock",
+    ]
+
+    _local = threading.local()
+
+    @classmethod
+    def schedule(cls, product_ids):
+        """
+        Откладывает пересчёт карточек до коммита текущей транзакции.
+        Все id, накопленные за транзакцию, пересчитываются одной пачкой.
+        """
+        product_ids = {pk for pk in product_ids if pk}
+        if not product_ids:
+            return
+        batch = getattr(cls._local, "batch", None)
+        if batch is None:
+            batch = cls._local.batch = set()
+        batch.update(product_ids)
+        transaction.on_commit(cls._flush)
+
+    @classmethod
+    def _flush(cls):
+        batch = getattr(cls._local, "batch", None)
+        cls._local.batch = None
+        if batch:
+            cls.refresh(batch)
+
+    @classmethod
+    def refresh(cls, product_ids):
+        """
+        Пересчитывает карточки указанных товаров.
+        Невидимые товары (show_it=False или без изображений) карточки теряют.
+        Кеш ответов с этими товарами инвалидируется, а если изменился
+        состав выдачи — и кеш списков (CacheTags.PRODUCTS); товары
+        попадают в ленту изменений FacetIndex.
+        """
+        product_ids = list(product_ids)
+        listing_changed = False
+        for start in range(0, len(product_ids), cls.CHUNK_SIZE):
+            if cls._refresh_chunk(product_ids[start : start + cls.CHUNK_SIZE]):
+                listing_changed = True
+        FacetIndex.feed.publish(product_ids)
+        tags = {CacheTags.product(pk) for pk in product_ids}
+        if listing_changed:
+            tags.add(CacheTags.PRODUCTS)
+        CacheTags.invalidate(tags)
+
+    @classmethod
+    def rebuild_all(cls):
+        """Полная перестройка таблицы (первичное заполнение / сверка)."""
+        product_ids = list(Products.objects.values_list("id", flat=True))
+        cls.refresh(product_ids)
+        ProductCard.objects.exclude(product_id__in=product_ids).delete()
+        return len(product_ids)
+
+    @classmethod
+    def _refresh_chunk(cls, product_ids):
+        """Возвращает True, если изменился набор товаров в выдаче."""
+        listed_before = set(
+            ProductCard.objects.filter(
+                product_id__in=product_ids, in_stock=True
+            ).values_list("product_id", flat=True)
+        )
+        products = Products.objects.filter(pk__in=product_ids, show_it=True)
+
+        # Товар без изображений в выдачу не попадает
+        with_images = set(
+            ProductImage.objects.filter(product_id__in=product_ids)
+            .exclude(image="")
+            .values_list("product_id", flat=True)
+        )
+
+        stocks = {
+            row["product_id"]: row
+            for row in Stock.objects.filter(product_id__in=product_ids)
+            .values("product_id")
+            .annotate(
+                total_quantity=Sum("quantity"),
+                min_price=Min("price", filter=Q(price__gt=0)),
+            )
+        }
+
+        spec_index = {}
+        for product_id, name_id, value_id in (
+            Specifications.objects.filter(
+                product_id__in=product_ids,
+                name_specification__isnull=False,
+                value_specification__isnull=False,
+            )
+            .order_by("name_specification_id", "value_specification_id")
+            .values_list(
+                "product_id", "name_specification_id", "value_specification_id"
+            )
+            .distinct()
+        ):
+            values = spec_index.setdefault(product_id, {}).setdefault(str(name_id), [])
+            values.append(value_id)
+
+        cards = []
+        for product in products:
+            if product.pk not in with_images:
+                continue
+            stock = stocks.get(product.pk, {})
+            total_quantity = stock.get("total_quantity") or 0
+            cards.append(
+                ProductCard(
+                    product=product,
+                    name_product=product.name_product,
+                    slug=product.slug,
+                    vendor_code=product.vendor_code,
+                    category_id=product.category_id,
+                    brand_id=product.brand_id,
+                    min_price=stock.get("min_price") or 0,
+                    avg_rating=product.avg_rating,
+                    reviews_count=product.reviews_count,
+                    total_quantity=total_quantity,
+                    in_stock=total_quantity > 0,
+                    spec_index=spec_index.get(product.pk, {}),
+                )
+            )
+
+        with transaction.atomic():
+            ProductCard.objects.filter(product_id__in=product_ids).exclude(
+                product_id__in=[card.product_id for card in cards]
+            ).delete()
+            ProductCard.objects.bulk_create(
+                cards,
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=cls.UPDATE_FIELDS + ["updated_at"],
+            )
+        return listed_before != {card.product_id for card in cards if card.in_stock}
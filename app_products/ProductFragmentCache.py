@@ -0,0 +1,86 @@
+import hashlib
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import QuerySet, prefetch_related_objects
+
+from core.CacheTags import CacheTags, RESPONSE_CACHE_TIMEOUT
+from core.renderers import JSONFragment, ORJSONRenderer
+
+
+class ProductFragmentCache:
+    """
+    Кеш сериализованных товаров: JSON-фрагмент (bytes) на товар.
+
+    Ключ — id товара, набор полей / хост запроса, текущая дата (сроки
+    доставки в рёбрах считаются от сегодня) и версии тегов товара,
+    его категории и бренда (CacheTags). Изменение товара сдвигает версию,
+    и старый фрагмент просто перестаёт находиться (доживает до TTL).
+    Истечение маршрутов по дате сдвигает теги их категорий и брендов
+    (ProductCityVisibilityUpdater.refresh_expired_edges).
+    Страница собирается из фрагментов; через сериализатор проходят
+    только товары без актуального фрагмента, и только для них
+    выполняются отложенные prefetch-запросы.
+    """
+
+    KEY_PREFIX = "product_fragment:"
+    TIMEOUT = RESPONSE_CACHE_TIMEOUT
+
+    def __init__(self, serializer):
+        self.signature = self.get_signature(serializer)
+
+    @staticmethod
+    def get_signature(serializer):
+        """Всё, от чего зависит JSON товара, кроме самих данных."""
+        request = serializer.context.get("request")
+        raw = "|".join(
+            [
+                f"{type(serializer).__module__}.{type(serializer).__name__}",
+                ",".join(serializer.fields),
+                request.build_absolute_uri("/") if request else "",
+                # EdgeSerializer.estimated_delivery_date — от date.today()
+                date.today().isoformat(),
+            ]
+        )
+        return hashlib.md5(raw.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def defer_prefetch(queryset):
+        """
+        Снимает prefetch_related с queryset.
+        Возвращает (queryset без предзагрузок, отложенные lookups).
+        """
+        if not isinstance(queryset, QuerySet):
+            return queryset, ()
+        lookups = tuple(queryset._prefetch_related_lookups)
+        if not lookups:
+            return queryset, ()
+        return queryset.prefetch_related(None), lookups
+
+    def get_key(self, product, versions):
+        tags = sorted(CacheTags.for_products([product]))
+        version = ".".join(str(versions[tag]) for tag in tags)
+        return f"{self.KEY_PREFIX}{product.pk}:{self.signature}:{version}"
+
+    def render(self, items, represent, lookups=()):
+        """
+        items — экземпляры товаров, represent — instance -> dict.
+        Возвращает список JSONFragment в порядке items.
+        """
+        versions = CacheTags.versions(CacheTags.for_products(items))
+        keys = [self.get_key(item, versions) for item in items]
+        found = cache.get_many(keys)
+
+        missing = [item for item, key in zip(items, keys) if key not in found]
+        if missing:
+            if lookups:
+                prefetch_related_objects(missing, *lookups)
+            renderer = ORJSONRenderer()
+            fresh = {
+                key: renderer.render(represent(item))
+                for item, key in zip(items, keys)
+                if key not in found
+            }
+            cache.set_many(fresh, self.TIMEOUT)
+            found.update(fresh)
+        return [JSONFragment(found[key]) for key in keys]
@@ -0,0 +1,266 @@
+from operator import attrgetter
+
+from django.db import models
+from django.db.models import prefetch_related_objects
+from django.core.exceptions import ObjectDoesNotExist
+
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, RelatedField, ManyRelatedField
+from rest_framework.reverse import reverse
+
+from core.CacheTags import CacheTags
+
+from app_products.ProductFragmentCache import ProductFragmentCache
+
+from app_reviews.serializers import ReviewsForProductsSerializer
+from app_sales_points.serializers import EdgeSerializer
+
+
+class SerializerCompiler:
+    """
+    «Компилирует» DRF-сериализатор в обычную функцию instance -> dict.
+
+    Поля, источники и преобразования разбираются один раз на страницу,
+    после чего каждая строка обходится без создания вложенных сериализаторов,
+    ReturnDict и генератора _readable_fields. Результат совпадает
+    с Serializer.to_representation: те же ключи, порядок, None и SkipField.
+    """
+
+    # Поля, у которых to_representation сводится к простому вызову
+    PLAIN_CONVERTERS = {
+        serializers.CharField: str,
+        serializers.IntegerField: int,
+        serializers.FloatField: float,
+    }
+
+    def __init__(self, method_overrides=None):
+        # (класс сериализатора, имя метода) -> фабрика быстрой реализации
+        self.method_overrides = method_overrides or {}
+
+    def compile(self, serializer):
+        plan = [
+            (field.field_name, self.get_getter(field), self.get_converter(field))
+            for field in serializer._readable_fields
+        ]
+
+        def to_representation(instance):
+            ret = {}
+            for name, getter, convert in plan:
+                try:
+                    attribute = getter(instance)
+                except SkipField:
+                    continue
+                ret[name] = None if attribute is None else convert(attribute)
+            return ret
+
+        return to_representation
+
+    def compile_many(self, serializer):
+        """Функция для ListSerializer (many=True)."""
+        child = self.compile(serializer.child)
+
+        def to_representation(data):
+            iterable = (
+                data.all() if isinstance(data, models.manager.BaseManager) else data
+            )
+            return [child(item) for item in iterable]
+
+        return to_representation
+
+    # ------------------------------------------------------------------ #
+    # Получение значения поля
+    # ------------------------------------------------------------------ #
+    def get_getter(self, field):
+        if field.source == "*":
+            return _identity
+        if isinstance(field, (RelatedField, ManyRelatedField)):
+            return self._related_getter(field)
+
+        fast = attrgetter(".".join(field.source_attrs))
+        slow = field.get_attribute
+
+        def getter(instance):
+            # Быстрый путь для обычных атрибутов; всё необычное
+            # (словари, вызываемые объекты, ошибки) — как в DRF
+            try:
+                value = fast(instance)
+            except (AttributeError, KeyError, ObjectDoesNotExist):
+                return slow(instance)
+            if callable(value) and not isinstance(value, models.manager.BaseManager):
+                return slow(instance)
+            return value
+
+        return getter
+
+    @staticmethod
+    def _related_getter(field):
+        slow = field.get_attribute
+
+        def getter(instance):
+            attribute = slow(instance)
+            if isinstance(attribute, PKOnlyObject) and attribute.pk is None:
+                return None
+            return attribute
+
+        return getter
+
+    # ------------------------------------------------------------------ #
+    # Преобразование значения
+    # ------------------------------------------------------------------ #
+    def get_converter(self, field):
+        if isinstance(field, serializers.ListSerializer):
+            return self.compile_many(field)
+        if isinstance(field, serializers.BaseSerializer):
+            return self.compile(field)
+        if isinstance(field, serializers.SerializerMethodField):
+            return self.get_method(field)
+        if isinstance(field, serializers.FileField):
+            return self._file_converter(field)
+        if isinstance(field, serializers.JSONField) and not field.binary:
+            return _identity
+        plain = self.PLAIN_CONVERTERS.get(type(field))
+        if plain is not None:
+            return plain
+        return field.to_representation
+
+    def get_method(self, field):
+        factory = self.method_overrides.get((type(field.parent), field.method_name))
+        if factory is not None:
+            return factory(self, field.parent)
+        return getattr(field.parent, field.method_name)
+
+    @staticmethod
+    def _file_converter(field):
+        request = field.context.get("request")
+        if not getattr(field, "use_url", True) or request is None:
+            return field.to_representation
+
+        def convert(value):
+            if not value:
+                return None
+            try:
+                url = value.url
+            except AttributeError:
+                return None
+            return request.build_absolute_uri(url)
+
+        return convert
+
+
+def _identity(value):
+    return value
+
+
+# ---------------------------------------------------------------------- #
+# Быстрые версии SerializerMethodField у ProductSerializer
+# ---------------------------------------------------------------------- #
+def _reviews_url(compiler, serializer):
+    """reverse() один раз на страницу, дальше — подстановка id."""
+    request = serializer.context.get("request")
+    marker = 987654321
+    template = reverse("all_reviews_to_product", args=[marker], request=request)
+    prefix, suffix = template.split(str(marker), 1)
+    return lambda obj: f"{prefix}{obj.id}{suffix}"
+
+
+def _ids_url(attr):
+    def factory(compiler, serializer):
+        request = serializer.context.get("request")
+        if not request:
+            return lambda obj: None
+        base_url = reverse("products-filter-by-ids", request=request)
+
+        def get_url(obj):
+            items = getattr(obj, attr, [])
+            return f"{base_url}?ids=" + ",".join(str(item.pk) for item in items)
+
+        return get_url
+
+    return factory
+
+
+def _reviews(compiler, serializer):
+    # Как и в ProductSerializer.get_reviews — без контекста запроса
+    many = compiler.compile_many(ReviewsForProductsSerializer(many=True))
+
+    def get_reviews(obj):
+        if hasattr(obj, "reviews"):
+            return many(obj.reviews.all()[:20])
+        return []
+
+    return get_reviews
+
+
+def _related_edges(compiler, serializer):
+    many = compiler.compile_many(EdgeSerializer(many=True))
+
+    def get_related_edges(obj):
+        if hasattr(obj.brand, "related_edges") or hasattr(
+            obj.category, "related_edges"
+        ):
+            edges_cat = getattr(obj.category, "related_edges", [])
+            edges_brand = getattr(obj.brand, "related_edges", [])
+            # Как и в ProductSerializer.get_related_edges: список рёбер бренда
+            # дополняется на месте, от этого зависит поле stocks
+            edges_brand.extend(edges_cat)
+            return many(edges_brand)
+        return []
+
+    return get_related_edges
+
+
+def _discount(compiler, serializer):
+    from app_products.serializers_v2 import DiscountShortSerializer  # цикл импорта
+
+    represent = compiler.compile(DiscountShortSerializer())
+
+    def get_discount(obj):
+        effective = getattr(obj, "effective_discount", None)
+        return None if effective is None else represent(effective)
+
+    return get_discount
+
+
+class ProductsFastListSerializer(serializers.ListSerializer):
+    """
+    many=True для ProductSerializer: сериализатор страницы компилируется
+    один раз (с учётом ?fields= / ?omit=), строки обходятся обычной функцией.
+
+    С context["json_fragments"] товары отдаются готовыми JSON-фрагментами
+    из ProductFragmentCache (рендерер — core.renderers.FragmentJSONRenderer);
+    context["deferred_prefetch"] — prefetch, снятые с queryset до пагинации.
+    """
+
+    def get_method_overrides(self):
+        child = type(self.child)
+        return {
+            (child, "get_reviews_url"): _reviews_url,
+            (child, "get_related_products_url"): _ids_url(
+                "prefetched_related_products"
+            ),
+            (child, "get_configuration_url"): _ids_url("prefetched_configuration"),
+            (child, "get_reviews"): _reviews,
+            (child, "get_related_edges"): _related_edges,
+            (child, "get_discount"): _discount,
+        }
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        fragments = self.context.get("json_fragments", False)
+        lookups = tuple(self.context.get("deferred_prefetch", ()))
+        if fragments:
+            data, own_lookups = ProductFragmentCache.defer_prefetch(data)
+            lookups += own_lookups
+        items = list(data)
+        # Ответ, в который попали товары, инвалидируется вместе с ними
+        CacheTags.add_products(items)
+
+        compiler = SerializerCompiler(self.get_method_overrides())
+        represent = compiler.compile(self.child)
+        if fragments:
+            return ProductFragmentCache(self.child).render(items, represent, lookups)
+        if lookups:
+            prefetch_related_objects(items, *lookups)
+        return [represent(item) for item in items]
@@ -1,13 +1,17 @@
+from collections import defaultdict
 from decimal import Decimal, InvalidOperation
 
 import django_filters as df
 
 from django import forms
-from django.db.models import Min, Q
+from django.db.models import F, Q
 from django_filters.widgets import CSVWidget
+from rest_framework.filters import OrderingFilter
 
 from app_products.models import Products
-from app_category.models import Category
+from app_products.ProductsQueryFactory import ProductsQueryFactory
+from app_specifications.models import NameSpecifications, ValueSpecifications
+from app_category.CategoryTree import CategoryTree
 
 
 class CharInFilter(df.BaseInFilter, df.CharFilter):
@@ -18,7 +22,9 @@ class CharInFilter(df.BaseInFilter, df.CharFilter):
 
 class PriceRangeFilter(df.CharFilter):
     """
-    Фильтрует товары по min(stock.price) в заданном диапазоне.
+    Фильтрует товары по минимальной цене в заданном диапазоне.
+    С ?city= — цена в городе (ProductCityPrice), иначе — по всем складам
+    (ProductCard.min_price). Оба условия — диапазон по индексу.
     Форматы: 100..5000000   100..   ..5000000
     """
 
@@ -50,21 +56,64 @@ class PriceRangeFilter(df.CharFilter):
 
         lower, upper = self._bounds(value)
 
-        # минимальная НЕ нулевая цена товара
-        qs = qs.annotate(
-            min_price=Min(
-                "stocks__price",
-                filter=Q(stocks__price__gt=0),  # игнорируем 0 / NULL
-            )
-        ).exclude(min_price__isnull=True)
+        request = getattr(self.parent, "request", None)
+        city_name = request.query_params.get("city") if request else None
+        if city_name:
+            qs = ProductsQueryFactory.with_city_price(qs, city_name)
+            field = "city_price"
+        else:
+            # минимальная НЕ нулевая цена товара (0 — цены нет)
+            field = "card__min_price"
+            qs = qs.filter(card__min_price__gt=0)
+        qs = qs.exclude(**{f"{field}__isnull": True})
 
         if lower is not None:
-            qs = qs.filter(min_price__gte=lower)
+            qs = qs.filter(**{f"{field}__gte": lower})
         if upper is not None:
-            qs = qs.filter(min_price__lte=upper)
+            qs = qs.filter(**{f"{field}__lte": upper})
         return qs
 
 
+class ProductsOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter, в котором цена (stocks__price, price) — минимальная
+    цена товара: с ?city= — в городе (ProductCityPrice), иначе — по
+    карточке. Без JOIN по остаткам (дубли строк и цена случайного склада).
+    """
+
+    price_fields = {"stocks__price", "price"}
+
+    @staticmethod
+    def price_source(request, queryset):
+        """
+        (queryset, поле цены): city_price с ?city=, иначе цена карточки.
+        Так же цену сортирует ProductsKeysetPagination.
+        """
+        city_name = request.query_params.get("city")
+        if city_name:
+            queryset = ProductsQueryFactory.with_city_price(queryset, city_name)
+            return queryset, "city_price"
+        return queryset, "card__min_price"
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+
+        order_by = []
+        for term in ordering:
+            if term.lstrip("-") not in self.price_fields:
+                order_by.append(term)
+                continue
+            queryset, field = self.price_source(request, queryset)
+            price = F(field)
+            if term.startswith("-"):
+                order_by.append(price.desc(nulls_last=True))
+            else:
+                order_by.append(price.asc(nulls_last=True))
+        return queryset.order_by(*order_by)
+
+
 class ProductsFilter(df.FilterSet):
     #
     #  1. Несколько брендов: ?brand=apple,samsung
@@ -86,10 +135,10 @@ class ProductsFilter(df.FilterSet):
 
     def filter_category(self, qs, name, value):
 
-        cat = Category.objects.filter(slug=value).first()
+        cat = CategoryTree.get().by_slug(value)
         if not cat:
             return qs.none()
-        return qs.filter(category__in=cat.get_descendants(include_self=True))
+        return qs.filter(category_id__in=cat.descendant_ids)
 
     #
     #  3. Характеристики (динамически): ?spec=color:red,size:15
@@ -108,15 +157,42 @@ class ProductsFilter(df.FilterSet):
         """
         Ожидаем строку вида color:red,size:15|16|17
         Каждая пара = обязательное условие AND, внутри пары несколько значений через |
+        Названия и значения переводятся в id, а условие проверяется
+        по ProductCard.spec_index.
         """
+        terms = []
         for pair in filter(None, value.split(",")):
             key, vals = pair.split(":")
-            vals = vals.split("|")
-            qs = qs.filter(
-                specifications__name_specification__name_specification__iexact=key,
-                specifications__value_specification__value_specification__in=vals,
-            )
-        return qs
+            terms.append((key.lower(), vals.split("|")))
+        if not terms:
+            return qs
+
+        names = defaultdict(list)
+        name_filter = Q()
+        for key, _ in terms:
+            name_filter |= Q(name_specification__iexact=key)
+        for pk, name_spec in NameSpecifications.objects.filter(name_filter).values_list(
+            "id", "name_specification"
+        ):
+            names[name_spec.lower()].append(pk)
+        values = defaultdict(list)
+        for pk, value_spec in ValueSpecifications.objects.filter(
+            value_specification__in={val for _, vals in terms for val in vals}
+        ).values_list("id", "value_specification"):
+            values[value_spec].append(pk)
+
+        return ProductsQueryFactory.only_with_spec_values(
+            qs,
+            [
+                [
+                    (name_id, value_id)
+                    for name_id in names[key]
+                    for val in vals
+                    for value_id in values[val]
+                ]
+                for key, vals in terms
+            ],
+        )
 
     #
     #  4. Диапазон цен
@@ -0,0 +1,227 @@
+import json
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal
+
+from django.db.models import F, Q
+from django.core.cache import cache
+
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+
+from app_products.ProductsFiltering import ProductsOrderingFilter
+
+
+class ProductsPagination(LimitOffsetPagination):
+    default_limit = 20  # Переопределение значения limit
+    # max_limit = 100  # Максимальный размер страницы
+
+
+class ProductsKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) пагинация по стабильному кортежу (ключ сортировки, id).
+    Не использует OFFSET и не считает COUNT(*) на каждой странице.
+
+    GET-параметры:
+    - pagination=cursor — включить режим (или просто передать cursor).
+    - cursor (str) — непрозрачный курсор из поля next предыдущей страницы.
+    - limit (int) — размер страницы.
+    - ordering (str) — ключ сортировки (используется первый из списка);
+      цена с ?city= — цена в городе, как в ProductsOrderingFilter.
+    - with_count=1 — добавить общее количество (кешируется).
+
+    Представление может задать keyset_priority — имя целочисленной
+    аннотации без NULL (например, приоритет бренда): она становится
+    первым ключом сортировки и курсора, по возрастанию.
+    """
+
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    ordering_query_param = "ordering"
+    count_query_param = "with_count"
+    default_limit = 20
+    max_limit = 100
+    count_cache_timeout = 60 * 5
+    invalid_cursor_message = "Invalid cursor"
+
+    # Публичные ключи сортировки -> колонки карточки товара (индексированы)
+    ordering_keys = {
+        "id": "pk",
+        "price": "card__min_price",
+        "stocks__price": "card__min_price",
+        "rating": "card__avg_rating",
+        "avg_rating": "card__avg_rating",
+        "reviews": "card__reviews_count",
+        "reviews_count": "card__reviews_count",
+    }
+
+    @classmethod
+    def is_requested(cls, request):
+        params = request.query_params
+        return (
+            params.get(cls.mode_query_param) == "cursor"
+            or cls.cursor_query_param in params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.ordering_key, self.field, self.descending = self.get_ordering(request)
+        if self.ordering_key.lstrip("-") in ProductsOrderingFilter.price_fields:
+            queryset, self.field = ProductsOrderingFilter.price_source(
+                request, queryset
+            )
+        self.priority_field = getattr(view, "keyset_priority", None)
+        self.count = None
+
+        if request.query_params.get(self.count_query_param) in ("1", "true"):
+            self.count = self.get_count(queryset)
+
+        queryset = queryset.order_by(*self.get_order_by())
+        if self.field != "pk":
+            queryset = queryset.annotate(keyset_value=F(self.field))
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(*position))
+
+        # Берём на один элемент больше, чтобы понять, есть ли следующая страница
+        page = list(queryset[: self.limit + 1])
+        self.has_next = len(page) > self.limit
+        page = page[: self.limit]
+        self.last_position = (
+            self.get_position(page[-1]) if self.has_next and page else None
+        )
+        return page
+
+    def get_paginated_response(self, data):
+        payload = {"next": self.get_next_link()}
+        if self.count is not None:
+            payload["count"] = self.count
+        payload["results"] = data
+        return Response(payload)
+
+    # ------------------------------------------------------------------ #
+    # Параметры запроса
+    # ------------------------------------------------------------------ #
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def get_ordering(self, request):
+        raw = request.query_params.get(self.ordering_query_param, "")
+        for term in filter(None, (t.strip() for t in raw.split(","))):
+            descending = term.startswith("-")
+            key = term.lstrip("-")
+            if key in self.ordering_keys:
+                return term, self.ordering_keys[key], descending
+        return "id", "pk", False
+
+    def get_order_by(self):
+        leading = [self.priority_field] if self.priority_field else []
+        if self.field == "pk":
+            return [*leading, "-pk" if self.descending else "pk"]
+        expression = F(self.field)
+        expression = (
+            expression.desc(nulls_last=True)
+            if self.descending
+            else expression.asc(nulls_last=True)
+        )
+        return [*leading, expression, "pk"]
+
+    # ------------------------------------------------------------------ #
+    # Позиция и фильтр «после курсора»
+    # ------------------------------------------------------------------ #
+    def get_position(self, obj):
+        priority = getattr(obj, self.priority_field) if self.priority_field else None
+        return getattr(obj, "keyset_value", None), obj.pk, priority
+
+    def get_position_filter(self, value, pk, priority=None):
+        condition = self.get_key_filter(value, pk)
+        if not self.priority_field:
+            return condition
+        # (приоритет, ключ, id) > позиции курсора
+        return Q(**{f"{self.priority_field}__gt": priority}) | (
+            Q(**{self.priority_field: priority}) & condition
+        )
+
+    def get_key_filter(self, value, pk):
+        if self.field == "pk":
+            return Q(pk__lt=pk) if self.descending else Q(pk__gt=pk)
+        if value is None:
+            # Уже листаем хвост с NULL-значениями (nulls last)
+            return Q(**{f"{self.field}__isnull": True, "pk__gt": pk})
+        lookup = "lt" if self.descending else "gt"
+        return (
+            Q(**{f"{self.field}__{lookup}": value})
+            | Q(**{self.field: value, "pk__gt": pk})
+            | Q(**{f"{self.field}__isnull": True})
+        )
+
+    # ------------------------------------------------------------------ #
+    # Курсор
+    # ------------------------------------------------------------------ #
+    def encode_cursor(self, position):
+        value, pk, priority = position
+        if isinstance(value, Decimal):
+            value = str(value)
+        data = {"o": self.ordering_key, "v": value, "id": pk}
+        if self.priority_field:
+            data["p"] = priority
+        raw = json.dumps(data)
+        return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            data = json.loads(urlsafe_b64decode(encoded + padding))
+            pk = int(data["id"])
+            value = data["v"]
+            ordering_key = data["o"]
+            priority = data.get("p")
+            if self.priority_field:
+                priority = int(priority)
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering_key != self.ordering_key:
+            raise NotFound(self.invalid_cursor_message)
+        if priority is not None and not self.priority_field:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(value, (str, int, float, type(None))):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, priority
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.mode_query_param, "cursor")
+        url = remove_query_param(url, self.count_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last_position)
+        )
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_position)
+
+    # ------------------------------------------------------------------ #
+    # Общее количество (опционально, кешируется по тексту запроса)
+    # ------------------------------------------------------------------ #
+    def get_count(self, queryset):
+        sql = str(queryset.order_by().query).encode()
+        key = "products_count:" + hashlib.md5(sql).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
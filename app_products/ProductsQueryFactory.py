@@ -1,9 +1,19 @@
 from django.utils.timezone import now
-from django.db.models import Prefetch, Q, Avg, Count, Sum
+from django.db.models import (
+    DecimalField,
+    Exists,
+    F,
+    FilteredRelation,
+    OuterRef,
+    Prefetch,
+    Q,
+    Sum,
+    Value,
+)
 
 from app_reviews.models import Review
 from app_manager_tags.models import Tag
-from app_sales_points.models import Stock, Edges
+from app_sales_points.models import City, Stock, Edges, ProductCityVisibility
 from app_specifications.models import Specifications
 from app_products.models import Products, ProductImage
 from app_discounts.models import ProductDiscount, CategoryDiscount, BrandDiscount
@@ -159,26 +169,16 @@ class ProductsQueryFactory:
         )
 
     @staticmethod
-    def annotate_reviews(queryset, prefetch_related_reviews=True):
+    def with_reviews(queryset):
         """
-        Добавляем аннотации рейтинга и количества отзывов, включая сами отзывы.
+        Добавляем prefetch_related для прошедших модерацию отзывов (новые первыми)
         """
-        qs = queryset.annotate(
-            avg_rating=Avg("reviews__rating", filter=Q(reviews__moderation=True)),
-            reviews_count=Count(
-                "reviews", filter=Q(reviews__moderation=True), distinct=True
-            ),
-        )
-        if prefetch_related_reviews:
-            qs.prefetch_related(
-                Prefetch(
-                    "reviews",
-                    queryset=Review.objects.filter(moderation=True).order_by(
-                        "-created_at"
-                    ),
-                )
+        return queryset.prefetch_related(
+            Prefetch(
+                "reviews",
+                queryset=Review.objects.filter(moderation=True).order_by("-created_at"),
             )
-        return qs
+        )
 
     # -------------------------------
     # Скидки
@@ -236,6 +236,14 @@ class ProductsQueryFactory:
         queryset = ProductsQueryFactory.with_brand_discounts(queryset)
         return queryset
 
+    @staticmethod
+    def with_effective_discount(queryset):
+        """
+        Действующая скидка товара одной строкой (ProductEffectiveDiscount):
+        приоритет и даты действия уже учтены, хватает LEFT JOIN.
+        """
+        return queryset.select_related("effective_discount")
+
     @staticmethod
     def only_in_stock(queryset):
         """
@@ -253,23 +261,213 @@ class ProductsQueryFactory:
         """
         return queryset.filter(productimage__isnull=False).distinct()
 
+    @staticmethod
+    def only_visible_in_city(queryset, city_name):
+        """
+        Товары, видимые в городе (остаток на складе города или ребро
+        категории/бренда в город): полусоединение с ProductCityVisibility
+        по id города вместо OR по остаткам и рёбрам с DISTINCT.
+        """
+        city_id = (
+            City.objects.filter(name_city=city_name)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if city_id is None:
+            return queryset.none()
+        return queryset.filter(
+            Exists(
+                ProductCityVisibility.objects.filter(
+                    product=OuterRef("pk"), city_id=city_id
+                )
+            )
+        )
+
+    @staticmethod
+    def with_city_price(queryset, city_name):
+        """
+        Аннотирует city_price — минимальную цену товара в городе
+        (ProductCityPrice): LEFT JOIN по уникальной паре (товар, город),
+        без дублей строк. Товары без цены в городе получают NULL.
+        """
+        if "city_price" in queryset.query.annotations:
+            return queryset
+        city_id = (
+            City.objects.filter(name_city=city_name)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if city_id is None:
+            return queryset.annotate(
+                city_price=Value(None, output_field=DecimalField())
+            )
+        return queryset.annotate(
+            price_in_city=FilteredRelation(
+                "city_prices", condition=Q(city_prices__city_id=city_id)
+            ),
+            city_price=F("price_in_city__min_price"),
+        )
+
+    @staticmethod
+    def only_listed_cards(queryset):
+        """
+        Видимость берём из ProductCard: один индексированный JOIN
+        вместо HAVING по остаткам и DISTINCT по изображениям.
+        """
+        return queryset.filter(card__in_stock=True)
+
+    @staticmethod
+    def only_with_spec_values(queryset, conditions):
+        """
+        Фильтр по характеристикам через ProductCard.spec_index.
+        conditions — список условий (AND), каждое — пары
+        (id названия, id значения), из которых подходит любая (OR).
+        Условия с одной парой сводятся в одно вхождение @> (GIN-индекс),
+        без JOIN по Specifications на каждое условие и без DISTINCT.
+        """
+        contained = {}
+        predicate = Q()
+        for pairs in conditions:
+            pairs = sorted({(str(name_id), value_id) for name_id, value_id in pairs})
+            if not pairs:
+                return queryset.none()
+            if len(pairs) == 1:
+                name_id, value_id = pairs[0]
+                contained.setdefault(name_id, []).append(value_id)
+                continue
+            any_of = Q()
+            for name_id, value_id in pairs:
+                any_of |= Q(card__spec_index__contains={name_id: [value_id]})
+            predicate &= any_of
+        if contained:
+            predicate &= Q(card__spec_index__contains=contained)
+        return queryset.filter(predicate)
+
+    # -------------------------------
+    # Выбор этапов по полям сериализатора (?fields= / ?omit=)
+    # -------------------------------
+    # Полный план get_all_details в порядке применения
+    DETAIL_STAGES = (
+        "with_tags",
+        "with_effective_discount",
+        "with_images",
+        "with_specifications",
+        "with_stocks",
+        "with_category_edges",
+        "with_brand_edges",
+        "with_related_products",
+        "with_configuration",
+    )
+    # Поле ProductSerializer -> этапы, без которых оно не сериализуется
+    # (из перечисленных применяются те, что входят в план)
+    FIELD_STAGES = {
+        "tags": ("with_tags",),
+        "images": ("with_images",),
+        "specifications": ("with_specifications",),
+        "stocks": (
+            "with_stocks",
+            "with_effective_discount",
+            "with_category_edges",
+            "with_brand_edges",
+        ),
+        "related_edges": ("with_category_edges", "with_brand_edges"),
+        "discount": ("with_effective_discount",),
+        "reviews": ("with_reviews",),
+        "related_products_url": ("with_related_products", "with_related_ids"),
+        "configuration_url": ("with_configuration", "with_configuration_ids"),
+    }
+
+    @staticmethod
+    def stages_for_fields(fields=None, stages=None):
+        """
+        Возвращает этапы плана stages (по умолчанию DETAIL_STAGES),
+        нужные для указанных полей. fields=None означает «все поля».
+        """
+        if stages is None:
+            stages = ProductsQueryFactory.DETAIL_STAGES
+        if fields is None:
+            return tuple(stages)
+        needed = {
+            stage
+            for field in fields
+            for stage in ProductsQueryFactory.FIELD_STAGES.get(field, ())
+        }
+        return tuple(s for s in stages if s in needed)
+
+    @staticmethod
+    def apply_stages(queryset, stages):
+        """Последовательно применяет этапы фабрики по их именам."""
+        for stage in stages:
+            queryset = getattr(ProductsQueryFactory, stage)(queryset)
+        return queryset
+
+    @staticmethod
+    def with_related_ids(queryset, to_attr="prefetched_related_products"):
+        """
+        Для related_products_url нужны только id связанных товаров
+        """
+        return queryset.prefetch_related(
+            Prefetch(
+                "related_product", queryset=Products.objects.only("id"), to_attr=to_attr
+            )
+        )
+
+    @staticmethod
+    def with_configuration_ids(queryset, to_attr="prefetched_configuration"):
+        """
+        Для configuration_url нужны только id комплектаций
+        """
+        return queryset.prefetch_related(
+            Prefetch(
+                "configuration", queryset=Products.objects.only("id"), to_attr=to_attr
+            )
+        )
+
+    # -------------------------------
+    # Профили планов запроса (list / card / detail / search)
+    # -------------------------------
+    PROFILES = {}
+
+    @staticmethod
+    def register_profile(profile):
+        """Добавляет профиль в реестр (имя профиля уникально)."""
+        ProductsQueryFactory.PROFILES[profile.name] = profile
+        return profile
+
+    @staticmethod
+    def get_profile(name):
+        try:
+            return ProductsQueryFactory.PROFILES[name]
+        except KeyError:
+            raise ValueError(f"Неизвестный профиль запроса: {name}")
+
+    @staticmethod
+    def build(profile, queryset=None, fields=None):
+        """
+        Строит QuerySet по профилю. Вызывается на каждый запрос,
+        поэтому now() в фильтрах рёбер всегда актуален.
+        """
+        return ProductsQueryFactory.get_profile(profile).build(queryset, fields)
+
+    @staticmethod
+    def get_card_details(fields=None):
+        """
+        Тот же набор prefetch, что и get_all_details, но видимость
+        читается из денормализованной карточки товара.
+        """
+        return ProductsQueryFactory.build("list", fields=fields)
+
     # На этом уровне можно организовать кеширование (использую пока уровне маршрутов)
     @staticmethod
-    def get_all_details():
+    def get_all_details(fields=None):
         """
-        Финальный метод, объединяющий все варианты prefetch и аннотаций
+        Финальный метод, объединяющий все варианты prefetch и аннотаций.
+        Если передан список полей — применяются только нужные им этапы.
         """
         base = ProductsQueryFactory.get_base_query()
-        base = ProductsQueryFactory.with_tags(base)
-        base = ProductsQueryFactory.with_all_discounts(base)
-        base = ProductsQueryFactory.with_images(base)
-        base = ProductsQueryFactory.with_specifications(base)
-        base = ProductsQueryFactory.with_stocks(base)
-        base = ProductsQueryFactory.with_category_edges(base)
-        base = ProductsQueryFactory.with_brand_edges(base)
-        base = ProductsQueryFactory.with_related_products(base)
-        base = ProductsQueryFactory.with_configuration(base)
-        base = ProductsQueryFactory.annotate_reviews(base)
+        base = ProductsQueryFactory.apply_stages(
+            base, ProductsQueryFactory.stages_for_fields(fields)
+        )
         base = ProductsQueryFactory.only_in_stock(base)
         base = ProductsQueryFactory.only_with_images(base)
         return base
@@ -284,25 +482,164 @@ class ProductsQueryFactory:
         base = ProductsQueryFactory.with_tags(base)
         base = ProductsQueryFactory.with_images(base)
         base = ProductsQueryFactory.with_stocks(base)
-        base = ProductsQueryFactory.annotate_reviews(base)
         # Опционально можно дополнить категориями или брендами, если нужно
         return base
 
     @staticmethod
     def enrich(qs):
         """
-        Применяет все «тяжёлые» prefetch/annotate к уже отфильтрованному qs.
-        """
-        # qs = ProductsQueryFactory.with_tags(qs)
-        qs = ProductsQueryFactory.with_all_discounts(qs)
-        qs = ProductsQueryFactory.with_images(qs)
-        qs = ProductsQueryFactory.with_specifications(qs)
-        qs = ProductsQueryFactory.with_stocks(qs)
-        qs = ProductsQueryFactory.with_category_edges(qs)
-        qs = ProductsQueryFactory.with_brand_edges(qs)
-        # qs = ProductsQueryFactory.with_related_products(qs)
-        # qs = ProductsQueryFactory.with_configuration(qs)
-        qs = ProductsQueryFactory.annotate_reviews(qs, prefetch_related_reviews=False)
-        qs = ProductsQueryFactory.only_in_stock(qs)
-        qs = ProductsQueryFactory.only_with_images(qs)
-        return qs
+        Применяет все «тяжёлые» prefetch/annotate к уже отфильтрованному qs
+        (профиль search).
+        """
+        return ProductsQueryFactory.build("search", queryset=qs)
+
+
+class QueryProfile:
+    """
+    Именованный план запроса к Products: какие этапы фабрики нужны
+    и откуда берётся видимость товара.
+
+    visibility:
+    - "card" — видимость из ProductCard (один JOIN);
+    - "aggregate" — остатки и изображения считаются в самом запросе.
+    fields — поля ответа профиля по умолчанию (None — все поля сериализатора).
+    """
+
+    CARD = "card"
+    AGGREGATE = "aggregate"
+
+    def __init__(self, name, stages, visibility=CARD, fields=None):
+        self.name = name
+        self.stages = tuple(stages)
+        self.visibility = visibility
+        self.fields = fields
+
+    def get_stages(self, fields=None):
+        if fields is None:
+            fields = self.fields
+        return ProductsQueryFactory.stages_for_fields(fields, self.stages)
+
+    def build(self, queryset=None, fields=None):
+        if queryset is None:
+            queryset = ProductsQueryFactory.get_base_query()
+        queryset = ProductsQueryFactory.apply_stages(queryset, self.get_stages(fields))
+        if self.visibility == self.CARD:
+            return ProductsQueryFactory.only_listed_cards(queryset)
+        queryset = ProductsQueryFactory.only_in_stock(queryset)
+        return ProductsQueryFactory.only_with_images(queryset)
+
+    def __repr__(self):
+        return f"<QueryProfile {self.name}: {', '.join(self.stages)}>"
+
+
+# Все поля ProductSerializer — страница товара
+DETAIL_FIELDS = [
+    "id",
+    "vendor_code",
+    "slug",
+    "name_product",
+    "additional_data",
+    "category",
+    "brand",
+    "images",
+    "related_edges",
+    "avg_rating",
+    "reviews_count",
+    "rating_histogram",
+    "stocks",
+    "discount",
+    "tags",
+    "specifications",
+    "reviews",
+    "reviews_url",
+    "description",
+    "related_products_url",
+    "configuration_url",
+]
+
+# Списки: поля страницы товара без отзывов (в списке — reviews_count
+# и reviews_url) и гистограммы; для ссылок related/configuration достаточно id
+ProductsQueryFactory.register_profile(
+    QueryProfile(
+        "list",
+        stages=(
+            "with_tags",
+            "with_effective_discount",
+            "with_images",
+            "with_specifications",
+            "with_stocks",
+            "with_category_edges",
+            "with_brand_edges",
+            "with_related_ids",
+            "with_configuration_ids",
+        ),
+        fields=[
+            name
+            for name in DETAIL_FIELDS
+            if name not in ("reviews", "rating_histogram")
+        ],
+    )
+)
+# Карточка товара в подборках: без характеристик, отзывов и ссылок
+ProductsQueryFactory.register_profile(
+    QueryProfile(
+        "card",
+        stages=(
+            "with_tags",
+            "with_effective_discount",
+            "with_images",
+            "with_stocks",
+            "with_category_edges",
+            "with_brand_edges",
+        ),
+        fields=[
+            "id",
+            "vendor_code",
+            "slug",
+            "name_product",
+            "category",
+            "brand",
+            "images",
+            "avg_rating",
+            "reviews_count",
+            "stocks",
+            "discount",
+            "tags",
+        ],
+    )
+)
+# Страница товара: один объект, полные данные (с гистограммой оценок)
+ProductsQueryFactory.register_profile(
+    QueryProfile(
+        "detail",
+        stages=(
+            "with_tags",
+            "with_effective_discount",
+            "with_images",
+            "with_specifications",
+            "with_stocks",
+            "with_category_edges",
+            "with_brand_edges",
+            "with_related_ids",
+            "with_configuration_ids",
+            "with_reviews",
+        ),
+        fields=DETAIL_FIELDS,
+    )
+)
+# Поиск и фасеты категорий: применяется к уже отфильтрованному qs,
+# видимость считается в запросе; этапы — как раньше в enrich (без отзывов)
+ProductsQueryFactory.register_profile(
+    QueryProfile(
+        "search",
+        stages=(
+            "with_effective_discount",
+            "with_images",
+            "with_specifications",
+            "with_stocks",
+            "with_category_edges",
+            "with_brand_edges",
+        ),
+        visibility=QueryProfile.AGGREGATE,
+    )
+)
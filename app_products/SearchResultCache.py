@@ -0,0 +1,205 @@
+import re
+import time
+import hashlib
+import logging
+from datetime import date, timedelta
+
+from django.core.cache import cache
+
+from core.CacheTags import CacheTags
+
+logger = logging.getLogger(__name__)
+
+# fmt: off
+CYR_TO_LAT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "j", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "h", "ц": "c", "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+LAT_TO_CYR = {
+    "sch": "щ", "zh": "ж", "ch": "ч", "sh": "ш", "yu": "ю", "ya": "я",
+    "a": "а", "b": "б", "v": "в", "g": "г", "d": "д", "e": "е", "z": "з",
+    "i": "и", "j": "й", "k": "к", "l": "л", "m": "м", "n": "н", "o": "о",
+    "p": "п", "r": "р", "s": "с", "t": "т", "u": "у", "f": "ф", "h": "х",
+    "c": "ц", "y": "ы",
+}
+# fmt: on
+# Обратная замена жадная: сначала длинные сочетания
+LAT_RE = re.compile("|".join(sorted(LAT_TO_CYR, key=len, reverse=True)))
+LATIN_WORD_RE = re.compile(r"[a-z]")
+CYRILLIC_WORD_RE = re.compile(r"[а-яё]")
+
+
+def to_latin(word):
+    return "".join(CYR_TO_LAT.get(char, char) for char in word)
+
+
+def to_cyrillic(word):
+    return LAT_RE.sub(lambda match: LAT_TO_CYR[match.group()], word)
+
+
+def normalize_query(query):
+    """
+    Канонический вид запроса: регистр, пробелы и раскладка не важны.
+
+    Слова латиницей, набранные транслитом («divan»), переводятся в
+    кириллицу («диван»), если обратная транслитерация даёт то же слово;
+    остальные слова (с q/w/x, смешанные) остаются как есть.
+    """
+    words = []
+    for word in query.lower().split():
+        if LATIN_WORD_RE.search(word) and not CYRILLIC_WORD_RE.search(word):
+            cyrillic = to_cyrillic(word)
+            if not LATIN_WORD_RE.search(cyrillic) and to_latin(cyrillic) == word:
+                word = cyrillic
+        words.append(word)
+    return " ".join(words)
+
+
+def query_forms(normalized):
+    """
+    Формы канонического запроса для поиска: сам запрос и его латиница.
+    Обе зависят только от ключа кеша — результат не зависит от того,
+    каким вариантом написания запрос пришёл первым.
+    """
+    latin = " ".join(to_latin(word) for word in normalized.split())
+    return [normalized] if latin == normalized else [normalized, latin]
+
+
+class SearchResultCache:
+    """
+    Кеш результатов глобального поиска по каноническому запросу и городу.
+
+    Хранятся не ответы, а ранжированные id товаров и строки категорий,
+    брендов и тегов: «Диван», «диван » и «divan» с любыми прочими
+    параметрами URL попадают в одну запись, а карточки товаров
+    собираются из кеша фрагментов. Запись действует, пока не сдвинулись
+    версии тегов PRODUCTS, SEARCH_DICTIONARIES и города, но не дольше
+    TIMEOUT (переименования товаров версий не сдвигают).
+    """
+
+    KEY_PREFIX = "search_result:"
+    TIMEOUT = 60 * 15
+
+    @classmethod
+    def get_key(cls, normalized, city_name):
+        raw = f"{city_name}|{normalized}"
+        return cls.KEY_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+    @staticmethod
+    def tags(city_name):
+        return [
+            CacheTags.PRODUCTS,
+            CacheTags.SEARCH_DICTIONARIES,
+            *([CacheTags.city(city_name)] if city_name else []),
+        ]
+
+    @classmethod
+    def get(cls, normalized, city_name, compute, max_age=None):
+        """
+        Результат из кеша или compute(normalized, city_name) с записью.
+        max_age — пересчитать и более молодую запись (прогрев).
+        """
+        key = cls.get_key(normalized, city_name)
+        entry = cache.get(key)
+        if entry is not None and CacheTags.versions(entry["tags"]) == entry["tags"]:
+            if max_age is None or time.time() - entry["stored_at"] < max_age:
+                return entry["result"]
+
+        # Версии читаются до выборки: инвалидация во время compute()
+        # сразу делает запись устаревшей
+        versions = CacheTags.versions(cls.tags(city_name))
+        result = compute(normalized, city_name)
+        cache.set(
+            key,
+            {
+                "tags": versions,
+                "result": result,
+                "stored_at": time.time(),
+            },
+            cls.TIMEOUT,
+        )
+        return result
+
+    @classmethod
+    def warm(cls, compute, limit=None):
+        """
+        Пересчитывает записи самых частых запросов из SearchQueryLog,
+        не дожидаясь, пока они устареют у пользователя. Возвращает число
+        прогретых запросов.
+        """
+        queries = SearchQueryLog.top(limit or SearchQueryLog.WARM_LIMIT)
+        for normalized, city_name in queries:
+            cls.get(normalized, city_name, compute, max_age=cls.TIMEOUT / 2)
+        return len(queries)
+
+
+class SearchQueryLog:
+    """
+    Журнал запросов поиска за последние DAYS дней: сортированные
+    множества Redis по дням (ZINCRBY), частые запросы — их объединение.
+    В множестве дня остаются MAX_DAY_QUERIES самых частых запросов.
+    Ошибки журнала не ломают ни поиск, ни прогрев.
+    """
+
+    KEY_PREFIX = "search_query_log:"
+    DAYS = 7
+    WARM_LIMIT = 200
+    # Длинные запросы не повторяются — не засоряем ими журнал
+    MAX_QUERY_LENGTH = 100
+    # Редкие запросы вытесняются из множества дня (ZREMRANGEBYRANK)
+    MAX_DAY_QUERIES = 10000
+    SEPARATOR = "\t"
+
+    @classmethod
+    def day_key(cls, day):
+        return f"{cls.KEY_PREFIX}{day.isoformat()}"
+
+    @staticmethod
+    def connection():
+        from django_redis import get_redis_connection
+
+        return get_redis_connection("default")
+
+    @classmethod
+    def record(cls, normalized, city_name):
+        if not normalized or len(normalized) > cls.MAX_QUERY_LENGTH:
+            return
+        key = cls.day_key(date.today())
+        try:
+            pipe = cls.connection().pipeline()
+            pipe.zincrby(key, 1, f"{city_name}{cls.SEPARATOR}{normalized}")
+            pipe.zremrangebyrank(key, 0, -cls.MAX_DAY_QUERIES - 1)
+            pipe.expire(key, 60 * 60 * 24 * (cls.DAYS + 1))
+            pipe.execute()
+        except Exception:
+            logger.warning("Не удалось записать поисковый запрос", exc_info=True)
+
+    @classmethod
+    def top(cls, limit):
+        """
+        [(канонический запрос, город)] по убыванию частоты за DAYS дней.
+        Журнал недоступен — пустой список.
+        """
+        today = date.today()
+        keys = [cls.day_key(today - timedelta(days=n)) for n in range(cls.DAYS)]
+        union_key = f"{cls.KEY_PREFIX}top"
+        try:
+            pipe = cls.connection().pipeline()
+            pipe.zunionstore(union_key, keys)
+            pipe.zrevrange(union_key, 0, limit - 1)
+            pipe.delete(union_key)
+            members = pipe.execute()[1]
+        except Exception:
+            logger.warning("Не удалось прочитать журнал запросов", exc_info=True)
+            return []
+
+        result = []
+        for member in members:
+            if isinstance(member, bytes):
+                member = member.decode()
+            city_name, _, normalized = member.partition(cls.SEPARATOR)
+            result.append((normalized, city_name))
+        return result
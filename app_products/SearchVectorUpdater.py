@@ -0,0 +1,127 @@
+import threading
+from functools import reduce
+from operator import add
+
+from django.db import transaction
+from django.db.models import Value
+from django.contrib.postgres.search import SearchVector
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_products.models import Products
+from app_specifications.models import Specifications
+
+
+class SearchVectorUpdater:
+    """
+    Поддерживает хранимые search_vector (tsvector, GIN-индекс) товаров,
+    категорий и брендов, чтобы поиск не векторизовал таблицы на лету.
+
+    Веса: A — название, B — переводы из additional_data, C — артикул
+    товара, D — названия и значения характеристик товара.
+    Пересчёт идёт пачками после коммита транзакции (bulk_update — без
+    сигналов post_save).
+    """
+
+    CHUNK_SIZE = 500
+    # Поля, от которых зависит вектор: save(update_fields=...) без них
+    # пересчёта не требует
+    SOURCE_FIELDS = {
+        Products: {"name_product", "additional_data", "vendor_code"},
+        Category: {"name_category", "additional_data"},
+        Brands: {"name_brand", "additional_data"},
+    }
+
+    _local = threading.local()
+
+    @classmethod
+    def schedule(cls, model, pks, update_fields=None):
+        """Откладывает пересчёт до коммита текущей транзакции (одной пачкой)."""
+        if update_fields and not cls.SOURCE_FIELDS[model] & set(update_fields):
+            return
+        pks = {pk for pk in pks if pk}
+        if not pks:
+            return
+        batch = getattr(cls._local, "batch", None)
+        if batch is None:
+            batch = cls._local.batch = {}
+        batch.setdefault(model, set()).update(pks)
+        transaction.on_commit(cls._flush)
+
+    @classmethod
+    def _flush(cls):
+        batch = getattr(cls._local, "batch", None)
+        cls._local.batch = None
+        for model, pks in (batch or {}).items():
+            cls.refresh(model, pks)
+
+    @classmethod
+    def refresh(cls, model, pks):
+        pks = list(pks)
+        for start in range(0, len(pks), cls.CHUNK_SIZE):
+            cls._refresh_chunk(model, pks[start : start + cls.CHUNK_SIZE])
+
+    @classmethod
+    def rebuild_all(cls):
+        """Полное заполнение векторов. Возвращает {модель: число объектов}."""
+        totals = {}
+        for model in cls.SOURCE_FIELDS:
+            pks = list(model.objects.values_list("pk", flat=True))
+            cls.refresh(model, pks)
+            totals[model] = len(pks)
+        return totals
+
+    @staticmethod
+    def translations(additional_data):
+        """Тексты переводов из additional_data ({"en": "...", "kk": "..."})."""
+        if not isinstance(additional_data, dict):
+            return ""
+        return " ".join(str(value) for value in additional_data.values() if value)
+
+    @staticmethod
+    def vector(parts):
+        """[(текст, вес)] -> выражение tsvector для bulk_update."""
+        return reduce(
+            add,
+            (SearchVector(Value(text), weight=weight) for text, weight in parts),
+        )
+
+    @classmethod
+    def _refresh_chunk(cls, model, pks):
+        if model is Products:
+            specs = {}
+            for product_id, name, value in Specifications.objects.filter(
+                product_id__in=pks
+            ).values_list(
+                "product_id",
+                "name_specification__name_specification",
+                "value_specification__value_specification",
+            ):
+                specs.setdefault(product_id, []).extend(filter(None, (name, value)))
+            rows = {
+                pk: [
+                    (name, "A"),
+                    (cls.translations(additional_data), "B"),
+                    (vendor_code, "C"),
+                    (" ".join(specs.get(pk, ())), "D"),
+                ]
+                for pk, name, additional_data, vendor_code in Products.objects.filter(
+                    pk__in=pks
+                ).values_list("pk", "name_product", "additional_data", "vendor_code")
+            }
+        else:
+            name_field = "name_category" if model is Category else "name_brand"
+            rows = {
+                pk: [(name, "A"), (cls.translations(additional_data), "B")]
+                for pk, name, additional_data in model.objects.filter(
+                    pk__in=pks
+                ).values_list("pk", name_field, "additional_data")
+            }
+
+        model.objects.bulk_update(
+            [
+                model(pk=pk, search_vector=cls.vector(parts))
+                for pk, parts in rows.items()
+            ],
+            ["search_vector"],
+        )
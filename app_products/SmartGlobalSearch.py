@@ -1,7 +1,11 @@
-from django.db.models.functions import Cast
-from django.db.models import Q, F, Value, TextField
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from operator import or_
+
+from django.db import close_old_connections
+from django.db.models.functions import Cast, Greatest
+from django.db.models import Exists, OuterRef, Q, F, Value, TextField
 from django.contrib.postgres.search import (
-    SearchVector,
     SearchQuery,
     SearchRank,
     TrigramSimilarity,
@@ -13,9 +17,16 @@ from rest_framework.response import Response
 from app_category.models import Category
 from app_brands.models import Brands
 from app_manager_tags.models import Tag
+from app_sales_points.models import Stock
 
 from app_products.serializers_v2 import ProductSerializer
 from app_products.ProductsQueryFactory import ProductsQueryFactory
+from app_products.SearchResultCache import (
+    SearchQueryLog,
+    SearchResultCache,
+    normalize_query,
+    query_forms,
+)
 
 
 class SmartGlobalSearchView(APIView):
@@ -28,10 +39,23 @@ class SmartGlobalSearchView(APIView):
 
     Пример запроса:
         /api/v2/globalsearch/?city=Караганда&q=Диван
+
+    Поиски по товарам, категориям, брендам и тегам независимы: товары
+    ищутся в потоке запроса, остальные три — параллельно в общем пуле
+    потоков, так что время ответа ≈ самому медленному из поисков.
+    Результат (id, а не ответ) кешируется по каноническому запросу и
+    городу в SearchResultCache; частые запросы прогревает Celery.
     """
 
+    # Общий на процесс пул: не больше MAX_WORKERS одновременных подзапросов
+    # (и соединений с БД сверх соединений самих запросов)
+    MAX_WORKERS = 12
+    executor = ThreadPoolExecutor(
+        max_workers=MAX_WORKERS, thread_name_prefix="globalsearch"
+    )
+
     def get(self, request):
-        query = request.GET.get("q", "").strip()
+        query = normalize_query(request.GET.get("q", ""))
         city_name = request.GET.get("city", "").strip()
         if not query:
             return Response(
@@ -43,104 +67,138 @@ class SmartGlobalSearchView(APIView):
                 }
             )
 
-        casted_query = Cast(Value(query), output_field=TextField())
+        SearchQueryLog.record(query, city_name)
+        result = SearchResultCache.get(query, city_name, self.find)
 
-        # === Продукты ===
-        product_vector = (
-            SearchVector("name_product", weight="A")
-            + SearchVector("additional_data", weight="B")
-            + SearchVector("vendor_code", weight="C")
+        return Response(
+            {
+                "products": self.serialize_products(request, result["products"]),
+                "categories": result["categories"],
+                "brands": result["brands"],
+                "tags": result["tags"],
+            }
         )
-        product_query = SearchQuery(query)
 
+    @classmethod
+    def find(cls, query, city_name):
+        """
+        Результат поиска для SearchResultCache: ранжированные id товаров
+        и строки категорий, брендов и тегов. Ищутся все формы запроса
+        (query_forms) — «divan» и «диван» дают одно и то же.
+        """
+        forms = query_forms(query)
+        futures = [
+            cls.submit(search, forms)
+            for search in (cls.search_categories, cls.search_brands, cls.search_tags)
+        ]
+        product_ids = cls.search_products(forms, city_name)
+        categories, brands, tags = (future.result() for future in futures)
+        return {
+            "products": product_ids,
+            "categories": categories,
+            "brands": brands,
+            "tags": tags,
+        }
+
+    @classmethod
+    def submit(cls, search, *args):
+        """Выполняет search(*args) в пуле; у потока пула свои соединения с БД."""
+
+        def task():
+            close_old_connections()
+            try:
+                return search(*args)
+            finally:
+                # соединение живёт по CONN_MAX_AGE, как у обычного запроса
+                close_old_connections()
+
+        return cls.executor.submit(task)
+
+    @staticmethod
+    def matches(vector_field, name_field, forms):
+        """
+        Условие и оценка совпадения с любой из форм запроса: по вектору
+        (GIN) или с опечаткой в названии (GIN trgm, %).
+        """
+        search_query = reduce(or_, (SearchQuery(form) for form in forms))
+        condition = Q(**{vector_field: search_query}) | reduce(
+            or_, (Q(**{f"{name_field}__trigram_similar": form}) for form in forms)
+        )
+        similarities = [
+            TrigramSimilarity(name_field, Cast(Value(form), output_field=TextField()))
+            for form in forms
+        ]
+        similarity = similarities[0] if len(forms) == 1 else Greatest(*similarities)
+        return condition, SearchRank(F(vector_field), search_query) + similarity
+
+    @classmethod
+    def search_products(cls, forms, city_name):
+        # Вектор хранится в search_vector (SearchVectorUpdater): название,
+        # переводы, артикул и характеристики — без JOIN и векторизации на лету
         qs = ProductsQueryFactory.get_base_query()
-        qs = ProductsQueryFactory.enrich(qs)
 
         if city_name:
-            qs = qs.filter(stocks__warehouse__city__name_city=city_name)
-
-        qs = qs.annotate(
-            rank=SearchRank(product_vector, product_query),
-            similarity_name=TrigramSimilarity("name_product", casted_query),
-            similarity_spec_name=TrigramSimilarity(
-                "specifications__name_specification__name_specification", casted_query
-            ),
-            similarity_spec_value=TrigramSimilarity(
-                "specifications__value_specification__value_specification", casted_query
-            ),
-            search=product_vector,
-        )
-
-        # Фильтрация по основному вектору + характеристикам
-        products = (
-            qs.filter(
-                Q(search=product_query)
-                | Q(similarity_name__gt=0.2)
-                | Q(similarity_spec_name__gt=0.2)
-                | Q(similarity_spec_value__gt=0.2)
+            qs = qs.filter(
+                Exists(
+                    Stock.objects.filter(
+                        product=OuterRef("pk"), warehouse__city__name_city=city_name
+                    )
+                )
             )
-            .annotate(
-                score=F("rank")
-                + F("similarity_name")
-                + F("similarity_spec_name")
-                + F("similarity_spec_value")
-            )
-            .order_by("-score")[:8]
-        )
 
-        serialized_products = ProductSerializer(
-            products, many=True, context={"request": request}
-        ).data
+        condition, score = cls.matches("search_vector", "name_product", forms)
+        return list(
+            qs.filter(condition)
+            .annotate(score=score)
+            .order_by("-score", "pk")
+            .values_list("pk", flat=True)[:8]
+        )
 
-        # === Категории ===
-        category_vector = SearchVector("name_category", weight="A") + SearchVector(
-            "additional_data", weight="B"
+    @staticmethod
+    def serialize_products(request, product_ids):
+        """Карточки товаров в порядке product_ids (из кеша фрагментов)."""
+        products = ProductsQueryFactory.enrich(
+            ProductsQueryFactory.get_base_query().filter(pk__in=product_ids)
         )
-        category_query = SearchQuery(query)
+        position = {pk: n for n, pk in enumerate(product_ids)}
+        products = sorted(products, key=lambda product: position[product.pk])
+        return ProductSerializer(
+            products, many=True, context={"request": request, "json_fragments": True}
+        ).data
 
-        categories = (
-            Category.objects.annotate(
-                rank=SearchRank(category_vector, category_query),
-                similarity=TrigramSimilarity("name_category", casted_query),
-                search=category_vector,
-            )
-            .filter(Q(search=category_query) | Q(similarity__gt=0.2))
-            .annotate(score=F("rank") + F("similarity"))
+    @classmethod
+    def search_categories(cls, forms):
+        condition, score = cls.matches("search_vector", "name_category", forms)
+        return list(
+            Category.objects.filter(condition)
+            .annotate(score=score)
             .order_by("-score")
             .values("id", "name_category", "slug")[:5]
         )
 
-        # === Бренды ===
-        brand_vector = SearchVector("name_brand", weight="A") + SearchVector(
-            "additional_data", weight="B"
-        )
-        brand_query = SearchQuery(query)
-
-        brands = (
-            Brands.objects.annotate(
-                rank=SearchRank(brand_vector, brand_query),
-                similarity=TrigramSimilarity("name_brand", casted_query),
-                search=brand_vector,
-            )
-            .filter(Q(search=brand_query) | Q(similarity__gt=0.2))
-            .annotate(score=F("rank") + F("similarity"))
+    @classmethod
+    def search_brands(cls, forms):
+        condition, score = cls.matches("search_vector", "name_brand", forms)
+        return list(
+            Brands.objects.filter(condition)
+            .annotate(score=score)
             .order_by("-score")
             .values("id", "name_brand")[:5]
         )
 
-        # === Теги ===
-        tags = (
-            Tag.objects.annotate(similarity=TrigramSimilarity("tag_text", casted_query))
+    @staticmethod
+    def search_tags(forms):
+        similarities = [
+            TrigramSimilarity("tag_text", Cast(Value(form), output_field=TextField()))
+            for form in forms
+        ]
+        return list(
+            Tag.objects.annotate(
+                similarity=(
+                    similarities[0] if len(forms) == 1 else Greatest(*similarities)
+                )
+            )
             .filter(similarity__gt=0.2)
             .order_by("-similarity")
             .values("id", "tag_text")[:5]
         )
-
-        return Response(
-            {
-                "products": serialized_products,
-                "categories": list(categories),
-                "brands": list(brands),
-                "tags": list(tags),
-            }
-        )
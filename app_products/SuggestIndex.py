@@ -0,0 +1,332 @@
+import heapq
+import re
+import time
+import logging
+import threading
+from bisect import bisect_left
+
+from django.db import connections
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_manager_tags.models import Tag
+from app_products.models import ProductCard
+
+from core.CacheTags import CacheTags
+from core.ChangeFeed import ChangeFeed
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    return (text or "").lower().replace("ё", "е")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TokenIndex:
+    """
+    Токены -> множества ключей записей.
+
+    Отсортированный список токенов даёт поиск по префиксу (bisect),
+    триграммы токенов — поиск с опечаткой. Изменения применяются
+    пачкой (update) к копии: множества заменяются, а не правятся.
+    """
+
+    # Больше токенов на один префикс не разворачиваем («д» → весь словарь)
+    MAX_PREFIX_TOKENS = 500
+    # Сходство токенов по триграммам для поиска с опечаткой (как в pg_trgm)
+    FUZZY_THRESHOLD = 0.3
+
+    def __init__(self):
+        self.postings = {}
+        self.tokens = []
+        self.trigrams = {}
+
+    def copy(self):
+        index = TokenIndex()
+        index.postings = dict(self.postings)
+        index.tokens = list(self.tokens)
+        index.trigrams = dict(self.trigrams)
+        return index
+
+    def update(self, removed=(), added=()):
+        """removed / added — пары (ключ, текст)."""
+        changes = {}
+        for sign, pairs in ((False, removed), (True, added)):
+            for key, text in pairs:
+                for token in set(tokenize(text)):
+                    changes.setdefault(token, ([], []))[sign].append(key)
+
+        new_tokens = []
+        for token, (drop, add) in changes.items():
+            keys = self.postings.get(token)
+            if keys is None:
+                keys = frozenset(add)
+                if keys:
+                    new_tokens.append(token)
+            else:
+                keys = (keys - set(drop)) | set(add)
+            # пустые множества остаются: токен пропадёт при перестройке
+            self.postings[token] = frozenset(keys)
+
+        if new_tokens:
+            self.tokens = sorted(self.tokens + new_tokens)
+            for token in new_tokens:
+                for trigram in trigrams(token):
+                    self.trigrams[trigram] = self.trigrams.get(trigram, ()) + (token,)
+
+    def prefix(self, token):
+        keys = set()
+        start = bisect_left(self.tokens, token)
+        for candidate in self.tokens[start : start + self.MAX_PREFIX_TOKENS]:
+            if not candidate.startswith(token):
+                break
+            keys |= self.postings[candidate]
+        return keys
+
+    def fuzzy(self, token):
+        own = trigrams(token)
+        shared = {}
+        for trigram in own:
+            for candidate in self.trigrams.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        keys = set()
+        for candidate, count in shared.items():
+            similarity = count / (len(own) + len(trigrams(candidate)) - count)
+            if similarity >= self.FUZZY_THRESHOLD:
+                keys |= self.postings[candidate]
+        return keys
+
+    def search(self, tokens):
+        """
+        Ключи, в которых есть все токены запроса — как префикс слова
+        (ввод не закончен), а если таких нет — с опечаткой.
+        """
+        result = None
+        for token in tokens:
+            keys = self.prefix(token)
+            if not keys and len(token) >= 3:
+                keys = self.fuzzy(token)
+            result = keys if result is None else result & keys
+            if not result:
+                return set()
+        return result or set()
+
+
+class SuggestIndex:
+    """
+    Индекс подсказок поиска в памяти процесса: товары (название,
+    артикул), категории, бренды и теги -> id и строка для показа.
+
+    Товары — из ProductCard (только товары в выдаче); индекс
+    обновляется по ленте изменений товаров ChangeFeed("products"), как
+    FacetIndex. Категории, бренды и теги — небольшие справочники:
+    перечитываются целиком, когда сдвигается версия тега
+    CacheTags.SEARCH_DICTIONARIES (сигналы их моделей).
+
+    Лента и версия проверяются не чаще CHECK_INTERVAL и одним потоком,
+    остальные запросы отдают текущий индекс без обращений к кешу;
+    полная перестройка (сброс ленты) идёт в фоновом потоке.
+    """
+
+    products_feed = ChangeFeed("products")
+    MIN_QUERY_LENGTH = 2
+    LIMITS = {"products": 8, "categories": 5, "brands": 5, "tags": 5}
+    # Как часто сверяться с лентой: подсказки отстают не больше чем на столько
+    CHECK_INTERVAL = 1.0
+
+    _index = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.seq = 0
+        self.dictionaries_version = None
+        self.checked_at = time.monotonic()
+        self.tokens = TokenIndex()
+        # ключ ("products" | "categories" | ..., id) -> запись для ответа
+        self.entries = {}
+        # ключ -> нормализованный текст, по которому он проиндексирован
+        self.texts = {}
+        # ключ -> популярность (для товаров — число отзывов)
+        self.weights = {}
+
+    # ------------------------------------------------------------------ #
+    # Жизненный цикл
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def get(cls):
+        """Индекс со свежими (не старше CHECK_INTERVAL) изменениями."""
+        index = cls._index
+        if index is not None:
+            if time.monotonic() - index.checked_at < cls.CHECK_INTERVAL:
+                return index
+            # сверяется другой поток — отдаём текущий индекс, не дожидаясь
+            if not cls._lock.acquire(blocking=False):
+                return index
+        else:
+            # отдавать ещё нечего — ждём первого построения
+            cls._lock.acquire()
+
+        release = True
+        try:
+            version = CacheTags.versions([CacheTags.SEARCH_DICTIONARIES])[
+                CacheTags.SEARCH_DICTIONARIES
+            ]
+            index = cls._index
+            if index is None:
+                index = cls._index = cls.build(version)
+                return index
+            seq, product_ids = cls.products_feed.read(index.seq)
+            if product_ids is None:
+                # блокировку снимет фоновый поток после перестройки
+                cls.rebuild_in_background(version)
+                release = False
+                return index
+            if product_ids or index.dictionaries_version != version:
+                index = index.copy()
+                if product_ids:
+                    index.load_products(product_ids)
+                if index.dictionaries_version != version:
+                    index.load_dictionaries(version)
+            index.seq = seq
+            index.checked_at = time.monotonic()
+            cls._index = index
+            return index
+        finally:
+            if release:
+                cls._lock.release()
+
+    @classmethod
+    def rebuild_in_background(cls, version):
+        """Перестраивает индекс в потоке; вызывающий держит _lock."""
+
+        def run():
+            try:
+                cls._index = cls.build(version)
+            except Exception:
+                logger.exception("Перестройка индекса подсказок не удалась")
+            finally:
+                cls._lock.release()
+                # у потока свои соединения с БД — закрываем их
+                connections.close_all()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @classmethod
+    def build(cls, version):
+        index = cls()
+        # номер читается до данных: изменения во время построения
+        # применятся повторно — это безопасно
+        index.seq = cls.products_feed.current()
+        index.load_products()
+        index.load_dictionaries(version)
+        return index
+
+    def copy(self):
+        index = SuggestIndex.__new__(SuggestIndex)
+        index.__dict__.update(self.__dict__)
+        index.tokens = self.tokens.copy()
+        index.entries = dict(self.entries)
+        index.texts = dict(self.texts)
+        index.weights = dict(self.weights)
+        return index
+
+    def replace(self, kind, rows):
+        """
+        Заменяет записи kind: rows — {id: (запись, текст, вес)};
+        None вместо строки — удалить запись. Прочие записи не трогаются.
+        """
+        removed = []
+        for pk in rows:
+            key = (kind, pk)
+            if key in self.texts:
+                removed.append((key, self.texts.pop(key)))
+                self.entries.pop(key)
+                self.weights.pop(key, None)
+        added = []
+        for pk, row in rows.items():
+            if row is None:
+                continue
+            entry, text, weight = row
+            key = (kind, pk)
+            self.entries[key] = entry
+            self.texts[key] = normalize(text)
+            self.weights[key] = weight
+            added.append((key, text))
+        self.tokens.update(removed, added)
+
+    def load_products(self, product_ids=None):
+        cards = ProductCard.objects.filter(in_stock=True)
+        rows = {}
+        if product_ids is not None:
+            cards = cards.filter(product_id__in=product_ids)
+            # выбывшие из выдачи товары удаляются
+            rows = dict.fromkeys(product_ids)
+        for pk, name, slug, vendor_code, reviews_count in cards.values_list(
+            "product_id", "name_product", "slug", "vendor_code", "reviews_count"
+        ):
+            rows[pk] = (
+                {"id": pk, "name": name, "slug": slug, "vendor_code": vendor_code},
+                f"{name} {vendor_code}",
+                reviews_count,
+            )
+        self.replace("products", rows)
+
+    def load_dictionaries(self, version):
+        sources = {
+            "categories": Category.objects.values_list("id", "name_category", "slug"),
+            "brands": Brands.objects.values_list("id", "name_brand"),
+            "tags": Tag.objects.values_list("id", "tag_text"),
+        }
+        for kind, queryset in sources.items():
+            rows = dict.fromkeys(pk for k, pk in self.entries if k == kind)
+            for pk, name, *rest in queryset:
+                entry = {"id": pk, "name": name}
+                if rest:
+                    entry["slug"] = rest[0]
+                rows[pk] = (entry, name, 0)
+            self.replace(kind, rows)
+        self.dictionaries_version = version
+
+    # ------------------------------------------------------------------ #
+    # Поиск
+    # ------------------------------------------------------------------ #
+    def suggest(self, query):
+        """{"products": [...], "categories": [...], "brands": [...], "tags": [...]}."""
+        result = {kind: [] for kind in self.LIMITS}
+        normalized = normalize(query).strip()
+        tokens = tokenize(normalized)
+        if len(normalized) < self.MIN_QUERY_LENGTH or not tokens:
+            return result
+
+        keys = self.tokens.search(tokens)
+        by_kind = {}
+        for key in keys:
+            by_kind.setdefault(key[0], []).append(key)
+
+        def rank(key):
+            text = self.texts[key]
+            # начало строки, затем популярность, затем короткие
+            return (
+                not text.startswith(normalized),
+                -self.weights[key],
+                len(text),
+                key[1],
+            )
+
+        for kind, limit in self.LIMITS.items():
+            result[kind] = [
+                self.entries[key]
+                for key in heapq.nsmallest(limit, by_kind.get(kind, ()), key=rank)
+            ]
+        return result
@@ -0,0 +1,24 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from app_products.SuggestIndex import SuggestIndex
+
+
+class SuggestView(APIView):
+    """
+    Подсказки при вводе поискового запроса.
+
+    GET-параметры:
+    - q (str, required): начало запроса (от 2 символов).
+
+    Пример запроса:
+        /api/v2/suggest/?q=див
+
+    Ответ — только id и строки для показа (товары, категории, бренды,
+    теги) из SuggestIndex в памяти процесса, без запросов к базе;
+    полный поиск с карточками товаров — /api/v2/globalsearch/.
+    """
+
+    def get(self, request):
+        query = request.GET.get("q", "").strip()
+        return Response(SuggestIndex.get().suggest(query))
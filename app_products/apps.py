@@ -5,3 +5,6 @@ class AppProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app_products"
     verbose_name = "Продукт"
+
+    def ready(self):
+        from app_products import signals
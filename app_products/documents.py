@@ -1,7 +1,10 @@
+from django.db.models import Prefetch
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
 
 from app_products.models import Products
+from app_sales_points.models import Stock
+from app_specifications.models import Specifications
 
 
 @registry.register_document
@@ -86,6 +89,32 @@ class ProductDocument(Document):
     class Django:
         model = Products
         fields = []
+        # iterator() с prefetch_related требует размер пачки
+        queryset_pagination = 500
+
+    def get_queryset(self):
+        """
+        Всё, что читают prepare_*, — пачкой на чанк, а не запросами
+        на каждый документ.
+        """
+        return (
+            super()
+            .get_queryset()
+            .select_related("category", "brand")
+            .prefetch_related(
+                "tag_prod",
+                Prefetch(
+                    "specifications",
+                    queryset=Specifications.objects.select_related(
+                        "name_specification", "value_specification"
+                    ),
+                ),
+                Prefetch(
+                    "stocks", queryset=Stock.objects.select_related("warehouse__city")
+                ),
+            )
+            .order_by("pk")
+        )
 
     def prepare_additional_data(self, instance):
         # Преобразуем JSON-данные в строку с учетом всех непустых значений
@@ -0,0 +1,85 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework import serializers
+from rest_framework.request import Request
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from app_products.serializers_v2 import ProductSerializer
+from app_products.ProductsQueryFactory import ProductsQueryFactory
+
+# сравнение DRF ProductSerializer и скомпилированного ProductsFastListSerializer
+# python manage.py benchmark_product_serializer --sizes 20 100 1000 --repeat 5
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк сериализации страниц товаров: DRF против скомпилированной"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[20, 100, 1000])
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--profile", default="list")
+
+    def handle(self, *args, **options):
+        request = self.get_request()
+        context = {
+            "request": request,
+            "default_fields": ProductsQueryFactory.get_profile(
+                options["profile"]
+            ).fields,
+        }
+        self.stdout.write(f"{'товаров':>8} {'DRF, мс':>10} {'fast, мс':>10} {'x':>6}")
+        for size in options["sizes"]:
+            drf_time = fast_time = 0.0
+            for _ in range(options["repeat"]):
+                # Страницы загружаются заново: сериализатор меняет
+                # предзагруженные списки рёбер, переиспользовать их нельзя
+                page = self.get_page(options["profile"], size)
+                start = time.perf_counter()
+                drf_json = JSONRenderer().render(
+                    serializers.ListSerializer(
+                        page, child=ProductSerializer(context=context), context=context
+                    ).data
+                )
+                drf_time += time.perf_counter() - start
+
+                page = self.get_page(options["profile"], size)
+                start = time.perf_counter()
+                fast_json = JSONRenderer().render(
+                    ProductSerializer(page, many=True, context=context).data
+                )
+                fast_time += time.perf_counter() - start
+
+                if drf_json != fast_json:
+                    raise CommandError(f"JSON различается на странице из {size}")
+
+            drf_ms = drf_time * 1000 / options["repeat"]
+            fast_ms = fast_time * 1000 / options["repeat"]
+            self.stdout.write(
+                f"{len(page):>8} {drf_ms:>10.1f} {fast_ms:>10.1f} "
+                f"{drf_ms / fast_ms if fast_ms else 0:>6.2f}"
+            )
+        self.stdout.write(self.style.SUCCESS("✅ JSON совпадает побайтно"))
+
+    @staticmethod
+    def get_request():
+        host = next((h for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+        host = host.lstrip(".")
+        return Request(APIRequestFactory().get("/api/v2/products_v2/", HTTP_HOST=host))
+
+    @staticmethod
+    def get_page(profile, size):
+        """
+        Страница из size товаров; если товаров в базе меньше —
+        выборка повторяется (каждый раз новые экземпляры).
+        """
+        page = []
+        while len(page) < size:
+            chunk = list(ProductsQueryFactory.build(profile)[: size - len(page)])
+            if not chunk:
+                raise CommandError("Нет товаров для бенчмарка")
+            page.extend(chunk)
+        return page
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_products.ProductCardUpdater import ProductCardUpdater
+
+# первичное заполнение / сверка таблицы карточек
+# python manage.py rebuild_product_cards
+
+
+class Command(BaseCommand):
+    help = "Полная перестройка таблицы ProductCard"
+
+    def handle(self, *args, **options):
+        total = ProductCardUpdater.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ Пересчитано товаров: {total}"))
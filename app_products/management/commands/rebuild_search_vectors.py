@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app_products.SearchVectorUpdater import SearchVectorUpdater
+
+# первичное заполнение / сверка поисковых векторов товаров, категорий и брендов
+# python manage.py rebuild_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Пересчёт search_vector у Products, Category и Brands"
+
+    def handle(self, *args, **options):
+        totals = SearchVectorUpdater.rebuild_all()
+        for model, total in totals.items():
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✅ {model._meta.verbose_name_plural}: пересчитано {total}"
+                )
+            )
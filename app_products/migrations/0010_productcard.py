@@ -0,0 +1,144 @@
+# Generated by Django 5.0.6 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_brands", "0003_brands_app_brands__name_br_f70b8b_idx_and_more"),
+        ("app_category", "0003_category_trgm_idx_name_category"),
+        ("app_products", "0009_populatesproducts_products"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCard",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="app_products.products",
+                        verbose_name="Продукт",
+                    ),
+                ),
+                (
+                    "name_product",
+                    models.CharField(
+                        max_length=150, verbose_name="Наименование продукта"
+                    ),
+                ),
+                ("slug", models.SlugField(max_length=255, verbose_name="URL")),
+                (
+                    "vendor_code",
+                    models.CharField(max_length=30, verbose_name="Артикул продукта"),
+                ),
+                (
+                    "cover_image",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Обложка"
+                    ),
+                ),
+                (
+                    "tags",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Теги продукта"
+                    ),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=10,
+                        verbose_name="Минимальная цена",
+                    ),
+                ),
+                (
+                    "discount_amount",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Размер скидки",
+                    ),
+                ),
+                (
+                    "avg_rating",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Средний рейтинг"
+                    ),
+                ),
+                (
+                    "reviews_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Количество отзывов"
+                    ),
+                ),
+                (
+                    "total_quantity",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Суммарный остаток"
+                    ),
+                ),
+                (
+                    "in_stock",
+                    models.BooleanField(default=False, verbose_name="Есть в наличии"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Время обновления"
+                    ),
+                ),
+                (
+                    "brand",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="app_brands.brands",
+                        verbose_name="Бренд продукта",
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="app_category.category",
+                        verbose_name="Категория продукта",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Карточка продукта",
+                "verbose_name_plural": "Карточки продуктов",
+                "indexes": [
+                    models.Index(
+                        fields=["in_stock", "category"],
+                        name="app_product_in_stoc_2841a6_idx",
+                    ),
+                    models.Index(
+                        fields=["in_stock", "brand"],
+                        name="app_product_in_stoc_d03902_idx",
+                    ),
+                    models.Index(
+                        fields=["in_stock", "min_price"],
+                        name="app_product_in_stoc_6289de_idx",
+                    ),
+                    models.Index(
+                        fields=["in_stock", "avg_rating"],
+                        name="app_product_in_stoc_26bf4e_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
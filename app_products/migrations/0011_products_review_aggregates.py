@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:05
+
+import app_products.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_brands", "0003_brands_app_brands__name_br_f70b8b_idx_and_more"),
+        ("app_category", "0003_category_trgm_idx_name_category"),
+        ("app_descriptions", "0003_remove_productdescription_product"),
+        ("app_manager_tags", "0002_tag_trgm_idx_tag_text"),
+        ("app_products", "0010_productcard"),
+        ("app_services", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="products",
+            name="avg_rating",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Средний рейтинг"
+            ),
+        ),
+        migrations.AddField(
+            model_name="products",
+            name="rating_histogram",
+            field=models.JSONField(
+                default=app_products.models.empty_rating_histogram,
+                editable=False,
+                verbose_name="Распределение оценок",
+            ),
+        ),
+        migrations.AddField(
+            model_name="products",
+            name="reviews_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество отзывов"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="products",
+            index=models.Index(
+                fields=["avg_rating"], name="app_product_avg_rat_38200b_idx"
+            ),
+        ),
+    ]
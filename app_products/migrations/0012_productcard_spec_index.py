@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:39
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_brands", "0003_brands_app_brands__name_br_f70b8b_idx_and_more"),
+        ("app_category", "0003_category_trgm_idx_name_category"),
+        ("app_products", "0011_products_review_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productcard",
+            name="spec_index",
+            field=models.JSONField(
+                blank=True, default=dict, verbose_name="Характеристики (индекс)"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productcard",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["spec_index"],
+                name="card_spec_index_gin",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_brands", "0004_brands_search_vector"),
+        ("app_category", "0004_category_search_vector"),
+        ("app_descriptions", "0003_remove_productdescription_product"),
+        ("app_manager_tags", "0002_tag_trgm_idx_tag_text"),
+        ("app_products", "0012_productcard_spec_index"),
+        ("app_services", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="products",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="products",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="products_search_vector_gin"
+            ),
+        ),
+    ]
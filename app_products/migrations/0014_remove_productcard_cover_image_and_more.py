@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0013_products_search_vector"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="productcard",
+            name="cover_image",
+        ),
+        migrations.RemoveField(
+            model_name="productcard",
+            name="discount_amount",
+        ),
+        migrations.RemoveField(
+            model_name="productcard",
+            name="tags",
+        ),
+    ]
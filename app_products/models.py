@@ -4,6 +4,7 @@ from django.urls import reverse
 
 from django.db import models, transaction
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 from core.mixins import JSONFieldsMixin, SlugModelMixin
 
@@ -15,6 +16,11 @@ from app_descriptions.models import ProductDescription
 from core.TranslationDecorator import register_for_translation
 
 
+def empty_rating_histogram():
+    """Распределение оценок 1–5 звёзд: {"1": 0, ..., "5": 0}"""
+    return {str(star): 0 for star in range(1, 6)}
+
+
 @register_for_translation("name_product", "additional_data")
 class Products(JSONFieldsMixin, SlugModelMixin, models.Model):
     show_it = models.BooleanField(
@@ -76,6 +82,28 @@ class Products(JSONFieldsMixin, SlugModelMixin, models.Model):
         blank=True,
         verbose_name="Услуги к продукту",
     )
+    # Агрегаты прошедших модерацию отзывов (ReviewAggregatesUpdater)
+    avg_rating = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Средний рейтинг",
+    )
+    reviews_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество отзывов",
+    )
+    rating_histogram = models.JSONField(
+        default=empty_rating_histogram,
+        editable=False,
+        verbose_name="Распределение оценок",
+    )
+    # Взвешенный tsvector для полнотекстового поиска (SearchVectorUpdater)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Продукт"
@@ -94,9 +122,14 @@ class Products(JSONFieldsMixin, SlugModelMixin, models.Model):
             GinIndex(
                 fields=["additional_data"],
             ),
+            GinIndex(
+                fields=["search_vector"],
+                name="products_search_vector_gin",
+            ),
             models.Index(fields=["category"]),
             models.Index(fields=["brand"]),
             models.Index(fields=["slug"]),
+            models.Index(fields=["avg_rating"]),
         ]
 
     def save(self, *args, **kwargs):
@@ -142,6 +175,100 @@ class ProductImage(models.Model):
         return self.product.name_product
 
 
+class ProductCard(models.Model):
+    """
+    Денормализованная «карточка» видимого товара (read model).
+    Строка есть только у товаров с show_it=True и хотя бы одним изображением,
+    поддерживается сигналами через ProductCardUpdater.
+    """
+
+    product = models.OneToOneField(
+        Products,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="card",
+        verbose_name="Продукт",
+    )
+    name_product = models.CharField(
+        max_length=150,
+        verbose_name="Наименование продукта",
+    )
+    slug = models.SlugField(
+        max_length=255,
+        verbose_name="URL",
+    )
+    vendor_code = models.CharField(
+        max_length=30,
+        verbose_name="Артикул продукта",
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        verbose_name="Категория продукта",
+    )
+    brand = models.ForeignKey(
+        Brands,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        verbose_name="Бренд продукта",
+    )
+    min_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        verbose_name="Минимальная цена",
+    )
+    avg_rating = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name="Средний рейтинг",
+    )
+    reviews_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Количество отзывов",
+    )
+    total_quantity = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Суммарный остаток",
+    )
+    in_stock = models.BooleanField(
+        default=False,
+        verbose_name="Есть в наличии",
+    )
+    # {"<id названия характеристики>": [id значений]} — для фильтра
+    # по характеристикам одним условием вхождения (@>) по GIN-индексу
+    spec_index = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Характеристики (индекс)",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Время обновления",
+    )
+
+    class Meta:
+        verbose_name = "Карточка продукта"
+        verbose_name_plural = "Карточки продуктов"
+        indexes = [
+            models.Index(fields=["in_stock", "category"]),
+            models.Index(fields=["in_stock", "brand"]),
+            models.Index(fields=["in_stock", "min_price"]),
+            models.Index(fields=["in_stock", "avg_rating"]),
+            GinIndex(
+                fields=["spec_index"],
+                name="card_spec_index_gin",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.name_product
+
+
 class ProductSetProduct(models.Model):
     populatesproducts = models.ForeignKey("PopulatesProducts", on_delete=models.CASCADE)
     products = models.ForeignKey("Products", on_delete=models.CASCADE)
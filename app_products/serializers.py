@@ -19,6 +19,8 @@ from app_specifications.serializers import (
 from app_services.serializers import ServiceSerializer
 from app_descriptions.serializers import ProductDescriptionSerializer
 
+from core.CacheTags import CacheTags
+
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -40,7 +42,8 @@ class BaseProductSerializer(serializers.ModelSerializer):
     tag_prod = TagSerializer(many=True, read_only=True)
     price = serializers.SerializerMethodField()
     average_rating = serializers.FloatField(read_only=True)
-    reviews_count = serializers.IntegerField(read_only=True)
+    # Products.reviews_count — только промодерированные; v1 считает все отзывы
+    reviews_count = serializers.IntegerField(read_only=True, source="all_reviews_count")
     # price = CityPriceSerializer(many=True, read_only=True)
     discount_amount_p = serializers.DecimalField(
         read_only=True,
@@ -93,6 +96,8 @@ class BaseProductSerializer(serializers.ModelSerializer):
         Returns:
             dict: Представление JSON продукта.
         """
+        # Ответ, в который попал товар, инвалидируется вместе с ним
+        CacheTags.add_products([instance])
         representation = super().to_representation(instance)
         representation["list_url_to_image"] = self.get_image_urls(instance)
         return representation
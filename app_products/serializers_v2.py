@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
+from core.mixins import SparseFieldsetsMixin
+from core.CacheTags import CacheTags
+
 from app_products.models import Products, ProductImage
+from app_products.ProductsFastSerializer import ProductsFastListSerializer
 
 from app_sales_points.serializers import EdgeSerializer, StocksByCityField
 from app_brands.serializers import BrandSerializer
@@ -19,15 +23,49 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = ["ind", "image"]  # Только поле изображения
 
 
+# Сериализатор действующей скидки (ProductEffectiveDiscount)
 class DiscountShortSerializer(serializers.Serializer):
-    id = serializers.IntegerField()
+    id = serializers.IntegerField(source="discount_id")
     name = serializers.CharField()
     amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     description = serializers.CharField()
 
 
-# Сериализатор для Products
-class ProductSerializer(serializers.ModelSerializer):
+# Тело запроса пакетного поиска товаров (POST products_v2/batch/)
+class ProductsBatchSerializer(serializers.Serializer):
+    MAX_ITEMS = 5000
+    # поле запроса -> поле Products
+    LOOKUPS = {"ids": "id", "slugs": "slug", "vendor_codes": "vendor_code"}
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=MAX_ITEMS,
+    )
+    slugs = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+        max_length=MAX_ITEMS,
+    )
+    vendor_codes = serializers.ListField(
+        child=serializers.CharField(max_length=30),
+        required=False,
+        max_length=MAX_ITEMS,
+    )
+    city = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        given = [name for name in self.LOOKUPS if name in attrs]
+        if len(given) != 1:
+            raise serializers.ValidationError(
+                "Передайте ровно один из списков: ids, slugs или vendor_codes."
+            )
+        attrs["lookup"] = given[0]
+        return attrs
+
+
+# Сериализатор для Products (поддерживает ?fields= / ?omit=)
+class ProductSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     related_edges = serializers.SerializerMethodField()  # Поле для ребер
     images = ProductImageSerializer(many=True, read_only=True)  # Изображения
     avg_rating = serializers.FloatField(read_only=True)  # Средний рейтинг
@@ -53,6 +91,8 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Products
+        # many=True сериализуется скомпилированной функцией (тот же JSON)
+        list_serializer_class = ProductsFastListSerializer
         fields = [
             "id",
             "vendor_code",
@@ -65,6 +105,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "related_edges",
             "avg_rating",
             "reviews_count",
+            "rating_histogram",
             "stocks",
             "discount",
             "tags",
@@ -76,6 +117,13 @@ class ProductSerializer(serializers.ModelSerializer):
             "related_products_url",
             "configuration_url",
         ]
+        # Только по ?fields= или в полях профиля (страница товара, "detail")
+        opt_in_fields = ["rating_histogram"]
+
+    def to_representation(self, instance):
+        # Ответ, в который попал товар, инвалидируется вместе с ним
+        CacheTags.add_products([instance])
+        return super().to_representation(instance)
 
     def get_reviews(self, obj):
         """
@@ -142,39 +190,10 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_discount(self, obj):
         """
-        1) Если есть скидка на товар - вернуть её (max)
-        2) Иначе смотреть скидку на категорию
-        3) Иначе скидку на бренд
+        Действующая скидка из ProductEffectiveDiscount: приоритет
+        товар → категория → бренд и даты действия учтены при пересчёте.
         """
-        # 1) Скидки на товар
-        product_discounts = getattr(obj, "prefetched_product_discounts", [])
-        if product_discounts:
-            # Вернуть  максимальную
-            disc = max(product_discounts, key=lambda d: d.amount)
-            return self._serialize_discount(disc)
-
-        # 2) Скидки на категорию
-        cat_discounts = []
-        if obj.category:
-            cat_discounts = getattr(obj.category, "prefetched_category_discounts", [])
-        if cat_discounts:
-            disc = max(cat_discounts, key=lambda d: d.amount)
-
-            return self._serialize_discount(disc)
-
-        # 3) Скидки на бренд
-        brand_discounts = []
-        if obj.brand:
-            brand_discounts = getattr(obj.brand, "prefetched_brand_discounts", [])
-        if brand_discounts:
-            disc = max(brand_discounts, key=lambda d: d.amount)
-
-            return self._serialize_discount(disc)
-
-        # Нет скидок
-        return None
-
-    def _serialize_discount(self, disc):
-        """Переводим объект скидки в удобный JSON."""
-        serializer = DiscountShortSerializer(disc)
-        return serializer.data
+        effective = getattr(obj, "effective_discount", None)
+        if effective is None:
+            return None
+        return DiscountShortSerializer(effective).data
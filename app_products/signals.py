@@ -0,0 +1,277 @@
+from django.db.models.signals import (
+    pre_save,
+    post_save,
+    pre_delete,
+    post_delete,
+    m2m_changed,
+)
+from django.dispatch import receiver
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_manager_tags.models import Tag
+from app_sales_points.models import Stock
+from app_specifications.models import (
+    Specifications,
+    NameSpecifications,
+    ValueSpecifications,
+)
+from app_descriptions.models import ProductDescription
+from app_products.models import (
+    Products,
+    ProductImage,
+    PopulatesProducts,
+    ProductSetProduct,
+)
+from app_products.ProductCardUpdater import ProductCardUpdater
+from app_products.FacetIndex import FacetIndex
+from app_products.SearchVectorUpdater import SearchVectorUpdater
+
+from core.CacheTags import CacheTags
+
+
+# ---------------------------------------------------------------------------
+# Карточки товаров (ProductCard)
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Products)
+def product_saved(sender, instance, **kwargs):
+    ProductCardUpdater.schedule([instance.pk])
+
+
+@receiver(m2m_changed, sender=Products.tag_prod.through)
+def product_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:  # изменили товары у тега
+        product_ids = pk_set or instance.products_set.values_list("id", flat=True)
+    else:
+        product_ids = [instance.pk]
+    ProductCardUpdater.schedule(product_ids)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def product_part_changed(sender, instance, **kwargs):
+    ProductCardUpdater.schedule([instance.product_id])
+
+
+# ---------------------------------------------------------------------------
+# Кеш ответов v2 (CacheTags). Сами товары инвалидирует ProductCardUpdater,
+# здесь — то, что карточку не меняет
+# ---------------------------------------------------------------------------
+@receiver(pre_save, sender=Products)
+def product_before_save(sender, instance, **kwargs):
+    instance._cache_previous = (
+        Products.objects.filter(pk=instance.pk)
+        .values_list("category_id", "brand_id")
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Products)
+def product_moved(sender, instance, **kwargs):
+    # Новый товар или смена категории / бренда меняют состав
+    # списков по категориям и фасетов
+    previous = getattr(instance, "_cache_previous", None)
+    if previous != (instance.category_id, instance.brand_id):
+        CacheTags.invalidate([CacheTags.PRODUCTS])
+
+
+@receiver(post_delete, sender=Products)
+def product_deleted(sender, instance, **kwargs):
+    # Карточка удаляется каскадом, мимо ProductCardUpdater
+    CacheTags.invalidate([CacheTags.product(instance.pk), CacheTags.PRODUCTS])
+    FacetIndex.feed.publish([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    CacheTags.invalidate([CacheTags.category(instance.pk)])
+
+
+@receiver(post_save, sender=Brands)
+@receiver(post_delete, sender=Brands)
+def brand_changed(sender, instance, **kwargs):
+    CacheTags.invalidate([CacheTags.brand(instance.pk)])
+
+
+@receiver(post_save, sender=Specifications)
+@receiver(post_delete, sender=Specifications)
+def specification_changed(sender, instance, **kwargs):
+    # Характеристики выводятся в товаре и в фасетах его категории
+    product = Products.objects.filter(pk=instance.product_id).first()
+    if product is not None:
+        CacheTags.invalidate(CacheTags.for_products([product]))
+    # ProductCard.spec_index (оттуда же изменение попадёт в FacetIndex)
+    ProductCardUpdater.schedule([instance.product_id])
+
+
+# ---------------------------------------------------------------------------
+# Справочники в фасетах (FacetIndex) и документах Elasticsearch
+# ---------------------------------------------------------------------------
+DICTIONARY_PRODUCT_LOOKUPS = {
+    Category: "category",
+    Brands: "brand",
+    NameSpecifications: "specifications__name_specification",
+    ValueSpecifications: "specifications__value_specification",
+    Tag: "tag_prod",
+}
+
+
+def dictionary_product_ids(instance):
+    """id товаров, в которых выводится название объекта справочника."""
+    lookup = DICTIONARY_PRODUCT_LOOKUPS[type(instance)]
+    return list(
+        Products.objects.filter(**{lookup: instance})
+        .values_list("id", flat=True)
+        .distinct()
+    )
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Brands)
+@receiver(pre_delete, sender=NameSpecifications)
+@receiver(pre_delete, sender=ValueSpecifications)
+@receiver(pre_delete, sender=Tag)
+def dictionary_before_delete(sender, instance, **kwargs):
+    # После удаления ссылки товаров уже обнулены (SET_NULL)
+    instance._dictionary_product_ids = dictionary_product_ids(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brands)
+@receiver(post_delete, sender=Brands)
+@receiver(post_save, sender=NameSpecifications)
+@receiver(post_delete, sender=NameSpecifications)
+@receiver(post_save, sender=ValueSpecifications)
+@receiver(post_delete, sender=ValueSpecifications)
+def dictionary_changed(sender, instance, **kwargs):
+    # Новые id FacetIndex догружает сам
+    if kwargs.get("created"):
+        return
+    # FacetIndex перечитает только названия, без перестройки
+    CacheTags.invalidate([CacheTags.FACET_DICTIONARIES])
+    product_ids = getattr(instance, "_dictionary_product_ids", None)
+    if product_ids is None:
+        # Переименование: названия есть в документах товаров Elasticsearch
+        product_ids = dictionary_product_ids(instance)
+        FacetIndex.feed.publish(product_ids)
+    else:
+        # Удаление: spec_index карточек ссылается на удалённые значения
+        ProductCardUpdater.schedule(product_ids)
+    if sender in (NameSpecifications, ValueSpecifications):
+        # Характеристики выводятся в самих товарах (категории и бренды —
+        # через свои теги, см. category_changed / brand_changed)
+        CacheTags.invalidate(CacheTags.product(pk) for pk in product_ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, created=False, **kwargs):
+    # Новый тег ещё ни у одного товара не выводится
+    if created:
+        return
+    product_ids = getattr(instance, "_dictionary_product_ids", None)
+    if product_ids is None:
+        product_ids = dictionary_product_ids(instance)
+    # Текст тега выводится в товарах (поле tags)
+    CacheTags.invalidate(CacheTags.product(pk) for pk in product_ids)
+
+
+PRODUCT_LINK_FIELDS = ("configuration", "related_product", "present", "services")
+
+
+@receiver(m2m_changed, sender=Products.configuration.through)
+@receiver(m2m_changed, sender=Products.related_product.through)
+@receiver(m2m_changed, sender=Products.present.through)
+@receiver(m2m_changed, sender=Products.services.through)
+def product_links_changed(sender, instance, action, reverse, pk_set, model, **kwargs):
+    # Связи «товар — товар» симметричны, поэтому меняются обе стороны
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if action == "pre_clear":
+        field = next(
+            name
+            for name in PRODUCT_LINK_FIELDS
+            if getattr(Products, name).through is sender
+        )
+        if reverse:  # очищают товары у услуги
+            pk_set = Products.objects.filter(**{field: instance}).values_list(
+                "id", flat=True
+            )
+        elif model is Products:
+            pk_set = getattr(instance, field).values_list("id", flat=True)
+    product_ids = set(pk_set or ()) if model is Products else set()
+    if isinstance(instance, Products):
+        product_ids.add(instance.pk)
+    CacheTags.invalidate(CacheTags.product(pk) for pk in product_ids)
+
+
+@receiver(post_save, sender=ProductDescription)
+def description_changed(sender, instance, **kwargs):
+    CacheTags.invalidate(
+        CacheTags.product(pk)
+        for pk in Products.objects.filter(description=instance).values_list(
+            "id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=PopulatesProducts)
+@receiver(post_delete, sender=PopulatesProducts)
+@receiver(post_save, sender=ProductSetProduct)
+@receiver(post_delete, sender=ProductSetProduct)
+def popular_set_changed(sender, instance, **kwargs):
+    CacheTags.invalidate([CacheTags.POPULAR_SET])
+
+
+# ---------------------------------------------------------------------------
+# Поисковые векторы (SearchVectorUpdater)
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Products)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brands)
+def search_source_saved(sender, instance, update_fields=None, **kwargs):
+    SearchVectorUpdater.schedule(sender, [instance.pk], update_fields)
+
+
+@receiver(post_save, sender=Specifications)
+@receiver(post_delete, sender=Specifications)
+def search_specification_changed(sender, instance, **kwargs):
+    SearchVectorUpdater.schedule(Products, [instance.product_id])
+
+
+@receiver(post_save, sender=NameSpecifications)
+@receiver(post_save, sender=ValueSpecifications)
+def search_specification_renamed(sender, instance, created, **kwargs):
+    # Новое название ещё ни у одного товара не используется
+    if created:
+        return
+    lookup = (
+        "name_specification" if sender is NameSpecifications else "value_specification"
+    )
+    SearchVectorUpdater.schedule(
+        Products,
+        Specifications.objects.filter(**{lookup: instance}).values_list(
+            "product_id", flat=True
+        ),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Подсказки поиска (SuggestIndex): товары идут через ленту ProductCardUpdater
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brands)
+@receiver(post_delete, sender=Brands)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def search_dictionary_changed(sender, instance, **kwargs):
+    CacheTags.invalidate([CacheTags.SEARCH_DICTIONARIES])
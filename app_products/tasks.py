@@ -3,6 +3,9 @@ from celery import shared_task
 
 from django.conf import settings
 
+from app_products.SearchResultCache import SearchResultCache
+from app_products.SmartGlobalSearch import SmartGlobalSearchView
+
 
 class ProductDataHandler:
     BASE_URL_ETL_1C = settings.BASE_URL_ETL_1C
@@ -78,3 +81,8 @@ def create_products_and_stocks(self):
 def update_stocks(self):
     handler = ProductDataHandler("update")
     handler.process_external_products()
+
+
+@shared_task(bind=True, name="Прогреть кеш частых поисковых запросов")
+def warm_search_cache(self):
+    return SearchResultCache.warm(SmartGlobalSearchView.find)
@@ -1,3 +1,1135 @@
-from django.test import TestCase
+import json
+import datetime
+import threading
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from django.contrib.contenttypes.models import ContentType
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_reviews.models import Review
+from app_manager_tags.models import Tag
+from app_sales_points.models import City, Warehouse, Stock, Edges
+from app_specifications.models import (
+    Specifications,
+    NameSpecifications,
+    ValueSpecifications,
+)
+from app_discounts.models import ProductDiscount, CategoryDiscount
+from app_products.models import Products, ProductImage, ProductCard
+from app_products.ProductsQueryFactory import ProductsQueryFactory
+from app_products.ProductsPagination import ProductsKeysetPagination
+from app_products.ProductsFiltering import ProductsFilter, ProductsOrderingFilter
+from app_products.ProductCardUpdater import ProductCardUpdater
+from app_products.ProductFragmentCache import ProductFragmentCache
+from app_products.FacetIndex import FacetIndex
+from app_products.SearchVectorUpdater import SearchVectorUpdater
+from app_products.SuggestIndex import SuggestIndex, TokenIndex
+from app_products.SearchResultCache import (
+    SearchQueryLog,
+    normalize_query,
+    query_forms,
+)
+from app_products.SmartGlobalSearch import SmartGlobalSearchView
+from app_products.views import ExternalProductBulkCreateAPIView, ProductsViewSet
+from app_products.serializers import ProductsDetailSerializer
+from app_products.views_v2 import ProductsViewSet_v2
+from app_products.serializers_v2 import ProductSerializer
+from app_sales_points.utils import ProductCityVisibilityUpdater
+from app_discounts.EffectiveDiscountUpdater import EffectiveDiscountUpdater
+
+from core.CacheTags import CacheTags
+
+
+class CatalogFixture:
+    """Каталог со всеми связями карточки: отзывы, скидки, рёбра, теги."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name_category="Диваны", slug="divany")
+        brand = Brands.objects.create(name_brand="Brand")
+        city = City.objects.create(name_city="Алматы")
+        warehouse = Warehouse.objects.create(
+            name_warehouse="W1", city=city, external_id="1"
+        )
+        tag = Tag.objects.create(tag_text="new")
+        products = []
+        for i in range(3):
+            product = Products.objects.create(
+                vendor_code=f"V{i}",
+                name_product=f"Диван {i}",
+                category=category,
+                brand=brand,
+            )
+            ProductImage.objects.create(
+                product=product, image=f"product_images/{i}.jpg", ind=1
+            )
+            Stock.objects.create(
+                product=product, warehouse=warehouse, quantity=1, price=100
+            )
+            Review.objects.create(
+                product=product, rating=5, review=f"ok {i}", moderation=True
+            )
+            product.tag_prod.add(tag)
+            products.append(product)
+        products[0].related_product.add(products[1])
+        products[0].configuration.add(products[2])
+        ProductDiscount.objects.create(name="p", amount=10).products.add(products[0])
+        CategoryDiscount.objects.create(name="c", amount=5).categories.add(category)
+        Edges.objects.create(
+            edges_name="e",
+            city_from=city,
+            city_to=city,
+            content_type=ContentType.objects.get_for_model(Category),
+            object_id=category.id,
+            expiration_date=datetime.date.today() + datetime.timedelta(days=1),
+        )
+        Edges.objects.create(
+            edges_name="b",
+            city_from=City.objects.create(name_city="Астана"),
+            city_to=city,
+            content_type=ContentType.objects.get_for_model(Brands),
+            object_id=brand.id,
+            expiration_date=datetime.date.today() + datetime.timedelta(days=1),
+        )
+        # on_commit внутри TestCase не срабатывает — read model строим явно
+        # (скидки, а за ними карточки и цены по городам)
+        EffectiveDiscountUpdater.rebuild_all()
+
+    def setUp(self):
+        # рёбра выбираются по ContentType — прогреваем его кеш заранее
+        ContentType.objects.get_for_models(Category, Brands)
+
+
+class QueryProfilesTest(CatalogFixture, TestCase):
+    """
+    Количество SQL-запросов каждого профиля не зависит от числа товаров:
+    один основной запрос + по одному на каждый prefetch.
+    """
+
+    # профиль -> ожидаемое число запросов
+    EXPECTED_QUERIES = {
+        "list": 9,
+        "card": 6,
+        "detail": 10,
+        "search": 6,
+    }
+
+    def test_registry_has_profiles(self):
+        self.assertLessEqual(
+            set(self.EXPECTED_QUERIES), set(ProductsQueryFactory.PROFILES)
+        )
+
+    def test_profile_query_count(self):
+        for name, expected in self.EXPECTED_QUERIES.items():
+            with self.subTest(profile=name):
+                queryset = ProductsQueryFactory.build(name)
+                with self.assertNumQueries(expected):
+                    self.assertEqual(len(list(queryset)), 3)
+
+    def test_fields_prune_profile_stages(self):
+        queryset = ProductsQueryFactory.build("list", fields=["id", "slug"])
+        with self.assertNumQueries(1):
+            list(queryset)
+
+    def test_list_skips_reviews(self):
+        """Отзывы — только на странице товара; в списке — reviews_url."""
+        profile = ProductsQueryFactory.get_profile("list")
+        self.assertNotIn("with_reviews", profile.get_stages())
+        self.assertNotIn("reviews", profile.fields)
+        self.assertIn("reviews_url", profile.fields)
+
+    def test_rating_histogram_only_on_detail(self):
+        """Гистограмма оценок — только на странице товара или по ?fields=."""
+        factory = APIRequestFactory()
+        for name, expected in (("list", False), ("card", False), ("detail", True)):
+            with self.subTest(profile=name):
+                request = Request(factory.get("/products/"))
+                fields = ProductSerializer.get_requested_fields(
+                    request, ProductsQueryFactory.PROFILES[name].fields
+                )
+                self.assertEqual("rating_histogram" in fields, expected)
+
+        request = Request(factory.get("/products/", {"fields": "id,rating_histogram"}))
+        self.assertEqual(
+            ProductSerializer.get_requested_fields(request),
+            ["id", "rating_histogram"],
+        )
+        # неизвестные имена игнорируются, ни одного известного — как без ?fields=
+        request = Request(factory.get("/products/", {"fields": "id,nope"}))
+        self.assertEqual(ProductSerializer.get_requested_fields(request), ["id"])
+        list_fields = ProductsQueryFactory.PROFILES["list"].fields
+        request = Request(factory.get("/products/", {"fields": "nope,bad"}))
+        self.assertEqual(
+            ProductSerializer.get_requested_fields(request, list_fields),
+            list_fields,
+        )
+        self.assertNotIn(
+            "rating_histogram", ProductSerializer.get_requested_fields(request)
+        )
+        request = Request(factory.get("/products/", {"omit": "description"}))
+        fields = ProductSerializer.get_requested_fields(request)
+        self.assertNotIn("rating_histogram", fields)
+        self.assertNotIn("description", fields)
+
+
+class ProductsFastSerializerTest(CatalogFixture, TestCase):
+    """
+    Скомпилированный список (ProductsFastListSerializer) выдаёт то же,
+    что ProductSerializer по одному товару, включая быстрые версии
+    get_reviews, get_discount и get_related_edges.
+    """
+
+    def represent(self, params, many):
+        request = Request(APIRequestFactory().get("/api/v2/products/", params))
+        # свежий queryset: get_related_edges дополняет prefetch на месте
+        products = list(ProductsQueryFactory.build("detail").order_by("pk"))
+        context = {"request": request}
+        if many:
+            data = ProductSerializer(products, many=True, context=context).data
+        else:
+            data = [
+                ProductSerializer(product, context=context).data for product in products
+            ]
+        return json.loads(JSONRenderer().render(data))
+
+    def test_compiled_matches_serializer(self):
+        for params in ({}, {"fields": "id,reviews,discount,related_edges,stocks"}):
+            with self.subTest(params=params):
+                compiled = self.represent(params, many=True)
+                expected = self.represent(params, many=False)
+                self.assertEqual(compiled, expected)
+                self.assertEqual(
+                    [list(item) for item in compiled],
+                    [list(item) for item in expected],
+                )
+
+    def test_overrides_are_covered(self):
+        """Проверка выше не пустая: у товаров есть отзывы, скидка и рёбра."""
+        first = self.represent({}, many=True)[0]
+        self.assertTrue(first["reviews"])
+        self.assertIsNotNone(first["discount"])
+        self.assertEqual(len(first["related_edges"]), 2)
+        self.assertIn("ids=", first["related_products_url"])
+
+
+class ProductFragmentCacheTest(SimpleTestCase):
+    """Фрагменты товаров не переживают смену дня (сроки доставки)."""
+
+    def signature_on(self, day):
+        with mock.patch("app_products.ProductFragmentCache.date") as today:
+            today.today.return_value = day
+            return ProductFragmentCache.get_signature(ProductSerializer(context={}))
+
+    def test_signature_depends_on_date(self):
+        day = datetime.date(2024, 5, 1)
+        self.assertEqual(self.signature_on(day), self.signature_on(day))
+        self.assertNotEqual(
+            self.signature_on(day),
+            self.signature_on(day + datetime.timedelta(days=1)),
+        )
+
+
+class ProductsV1ReviewAggregatesTest(TestCase):
+    """
+    API v1 считает рейтинг и отзывы по всем отзывам (как до появления
+    колонок Products, где учитываются только промодерированные).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Products.objects.create(vendor_code="V1", name_product="Диван")
+        cls.related = Products.objects.create(vendor_code="V2", name_product="Кресло")
+        cls.product.related_product.add(cls.related)
+        Review.objects.create(
+            product=cls.product, rating=5, review="ok", moderation=True
+        )
+        Review.objects.create(
+            product=cls.product, rating=1, review="new", moderation=False
+        )
+
+    def test_v1_counts_all_reviews(self):
+        request = Request(APIRequestFactory().get("/api/v1/products/"))
+        queryset = ProductsViewSet().get_annotated_queryset(
+            Products.objects.filter(pk=self.product.pk)
+        )
+        data = ProductsDetailSerializer(
+            queryset.get(), context={"request": request}
+        ).data
+        self.assertEqual(data["average_rating"], 3.0)
+        self.assertEqual(data["reviews_count"], 2)
+        # у связанных товаров агрегатов нет — поля не выводятся, как раньше
+        self.assertNotIn("reviews_count", data["related_product"][0])
+        self.assertNotIn("average_rating", data["related_product"][0])
+
+        # v2 — только промодерированные
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 1)
+
+
+class ExternalStockSyncTest(TestCase):
+    """
+    Синхронизация цен и остатков (PATCH external_products) пишет Stock
+    через bulk_update — карточки и кеш ответов всё равно обновляются.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        city = City.objects.create(name_city="Алматы")
+        warehouse = Warehouse.objects.create(
+            name_warehouse="W17", city=city, external_id="17"
+        )
+        cls.product = Products.objects.create(
+            vendor_code="17679", name_product="Телевизор"
+        )
+        ProductImage.objects.create(
+            product=cls.product, image="product_images/tv.jpg", ind=1
+        )
+        Stock.objects.create(
+            product=cls.product, warehouse=warehouse, quantity=0, price=100
+        )
+        ProductCardUpdater.rebuild_all()
+
+    def test_patch_refreshes_card_and_cache(self):
+        tags = [CacheTags.product(self.product.pk), CacheTags.CITY_STATS]
+        before = CacheTags.versions(tags)
+        self.assertFalse(ProductCard.objects.get(product=self.product).in_stock)
+
+        view = ExternalProductBulkCreateAPIView.as_view()
+        with self.captureOnCommitCallbacks(execute=True):
+            request = APIRequestFactory().patch(
+                "/api/v1/external_products/",
+                [
+                    {
+                        "product_name": "Телевизор",
+                        "product_code": 17679,
+                        "price": 63262,
+                        "stock": 3,
+                        "warehouse_code": 17,
+                    }
+                ],
+                format="json",
+            )
+            response = view(request)
+        self.assertEqual(response.data["updated"], 1)
+
+        card = ProductCard.objects.get(product=self.product)
+        self.assertEqual((card.min_price, card.total_quantity), (63262, 3))
+        self.assertTrue(card.in_stock)
+        after = CacheTags.versions(tags)
+        for tag in tags:
+            self.assertNotEqual(before[tag], after[tag], tag)
+
+
+class ProductsPriceFilteringTest(TestCase):
+    """
+    Фильтр ?price= и сортировка по цене: минимальная цена карточки,
+    а с ?city= — минимальная цена в городе (ProductCityPrice).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        almaty = City.objects.create(name_city="Алматы")
+        astana = City.objects.create(name_city="Астана")
+        cls.products = {}
+        for vendor_code, city, price in (
+            ("A100", almaty, 100),
+            ("A300", almaty, 300),
+            ("B200", astana, 200),
+            ("NONE", None, None),
+        ):
+            product = Products.objects.create(
+                vendor_code=vendor_code, name_product=vendor_code
+            )
+            ProductImage.objects.create(
+                product=product, image=f"product_images/{vendor_code}.jpg", ind=1
+            )
+            if city:
+                warehouse = Warehouse.objects.create(
+                    name_warehouse=f"W{vendor_code}", city=city
+                )
+                Stock.objects.create(
+                    product=product, warehouse=warehouse, quantity=1, price=price
+                )
+            cls.products[vendor_code] = product
+        # цена в Алматы дешевле, чем по всем складам
+        Stock.objects.create(
+            product=cls.products["B200"],
+            warehouse=Warehouse.objects.get(name_warehouse="WA300"),
+            quantity=1,
+            price=250,
+        )
+        # on_commit внутри TestCase не срабатывает — read model строим явно
+        ProductCardUpdater.rebuild_all()
+        ProductCityVisibilityUpdater.rebuild_all()
+
+    @staticmethod
+    def request(**params):
+        return Request(APIRequestFactory().get("/api/v2/products/", params))
+
+    def filtered(self, **params):
+        request = self.request(**params)
+        queryset = ProductsFilter(
+            request.query_params, queryset=Products.objects.all(), request=request
+        ).qs
+        return set(queryset.values_list("vendor_code", flat=True))
+
+    def ordered(self, **params):
+        queryset = ProductsOrderingFilter().filter_queryset(
+            self.request(**params), Products.objects.all(), ProductsViewSet_v2
+        )
+        return list(queryset.values_list("vendor_code", flat=True))
+
+    def test_price_bounds(self):
+        self.assertEqual(self.filtered(price="150..300"), {"A300", "B200"})
+        self.assertEqual(self.filtered(price="150.."), {"A300", "B200"})
+        self.assertEqual(self.filtered(price="..150"), {"A100"})
+        self.assertEqual(self.filtered(price="200"), {"A300", "B200"})
+        # без цены (0 в карточке) товар не попадает ни в один диапазон
+        self.assertEqual(self.filtered(price="0.."), {"A100", "A300", "B200"})
+
+    def test_price_in_city(self):
+        self.assertEqual(self.filtered(price="..260", city="Алматы"), {"A100", "B200"})
+        self.assertEqual(self.filtered(price="..260", city="Астана"), {"B200"})
+        self.assertEqual(self.filtered(price="..260", city="Нет такого"), set())
+
+    def test_ordering(self):
+        # по карточке: товар без цены (min_price=0) — как нулевая цена,
+        # так же сортируют FacetIndex и ProductsKeysetPagination
+        self.assertEqual(
+            self.ordered(ordering="price"), ["NONE", "A100", "B200", "A300"]
+        )
+        self.assertEqual(
+            self.ordered(ordering="-stocks__price"), ["A300", "B200", "A100", "NONE"]
+        )
+
+    def test_ordering_in_city_nulls_last(self):
+        self.assertEqual(
+            self.ordered(ordering="-price", city="Алматы")[:3],
+            ["A300", "B200", "A100"],
+        )
+        self.assertEqual(self.ordered(ordering="price", city="Астана")[:1], ["B200"])
+        self.assertEqual(
+            set(self.ordered(ordering="price", city="Астана")[1:]),
+            {"A100", "A300", "NONE"},
+        )
+
+    def keyset(self, **params):
+        """Все страницы keyset-пагинации по два товара."""
+        result, cursor = [], None
+        while True:
+            query = dict(params, pagination="cursor", limit=2)
+            if cursor:
+                query["cursor"] = cursor
+            paginator = ProductsKeysetPagination()
+            page = paginator.paginate_queryset(
+                Products.objects.filter(card__in_stock=True), self.request(**query)
+            )
+            result += [product.vendor_code for product in page]
+            cursor = paginator.get_next_cursor()
+            if cursor is None:
+                return result
+
+    def test_keyset_price_in_city(self):
+        """Курсорные страницы сортируют цену так же, как ProductsOrderingFilter."""
+        self.assertEqual(
+            self.keyset(ordering="-price", city="Алматы"), ["A300", "B200", "A100"]
+        )
+        self.assertEqual(
+            self.keyset(ordering="price", city="Алматы"), ["A100", "B200", "A300"]
+        )
+        # в Астане цена есть только у B200, остальные — NULL, в конце по id
+        self.assertEqual(
+            self.keyset(ordering="price", city="Астана"), ["B200", "A100", "A300"]
+        )
+        self.assertEqual(self.keyset(ordering="price"), ["A100", "B200", "A300"])
+
+
+class ProductsKeysetPaginationTest(TestCase):
+    """Курсор, обход страниц с NULL-ключами и приоритет бренда."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand_a = Brands.objects.create(name_brand="A")
+        cls.brand_b = Brands.objects.create(name_brand="B")
+        ratings = {}
+        for vendor_code, brand, rating in (
+            ("R5", cls.brand_a, 5.0),
+            ("R3", cls.brand_b, 3.0),
+            ("R3A", cls.brand_a, 3.0),
+            ("N1", cls.brand_b, None),
+            ("N2", cls.brand_a, None),
+        ):
+            product = Products.objects.create(
+                vendor_code=vendor_code, name_product=vendor_code, brand=brand
+            )
+            ProductImage.objects.create(
+                product=product, image=f"product_images/{vendor_code}.jpg", ind=1
+            )
+            ratings[product.pk] = rating
+        ProductCardUpdater.rebuild_all()
+        for pk, rating in ratings.items():
+            ProductCard.objects.filter(product_id=pk).update(avg_rating=rating)
+
+    @staticmethod
+    def request(**params):
+        return Request(APIRequestFactory().get("/api/v2/products/", params))
+
+    def walk(self, queryset, view=None, **params):
+        """Все страницы по курсорам next_cursor, по два товара."""
+        result, cursor = [], None
+        while True:
+            query = dict(params, pagination="cursor", limit=2)
+            if cursor:
+                query["cursor"] = cursor
+            paginator = ProductsKeysetPagination()
+            page = paginator.paginate_queryset(queryset, self.request(**query), view)
+            result += [product.vendor_code for product in page]
+            cursor = paginator.get_next_cursor()
+            if cursor is None:
+                return result
+
+    def test_nulls_last_in_both_directions(self):
+        queryset = Products.objects.all()
+        self.assertEqual(
+            self.walk(queryset, ordering="-rating"), ["R5", "R3", "R3A", "N1", "N2"]
+        )
+        self.assertEqual(
+            self.walk(queryset, ordering="rating"), ["R3", "R3A", "R5", "N1", "N2"]
+        )
+        self.assertEqual(
+            self.walk(queryset, ordering="-id"), ["N2", "N1", "R3A", "R3", "R5"]
+        )
+
+    def test_brand_priority_leads_keyset(self):
+        queryset = Products.objects.annotate(
+            priority=Case(
+                When(brand_id=self.brand_a.pk, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+        view = SimpleNamespace(keyset_priority="priority")
+        self.assertEqual(
+            self.walk(queryset, view, ordering="-rating"),
+            ["R5", "R3A", "N2", "R3", "N1"],
+        )
+        self.assertEqual(self.walk(queryset, view), ["R5", "R3A", "N2", "R3", "N1"])
+
+    def test_cursor_round_trip(self):
+        paginator = ProductsKeysetPagination()
+        paginator.ordering_key, paginator.priority_field = "-price", None
+        cursor = paginator.encode_cursor((Decimal("199.90"), 7, None))
+        self.assertNotIn("=", cursor)
+        request = self.request(cursor=cursor)
+        self.assertEqual(paginator.decode_cursor(request), ("199.90", 7, None))
+
+        paginator.priority_field = "priority"
+        cursor = paginator.encode_cursor((None, 3, 1))
+        self.assertEqual(
+            paginator.decode_cursor(self.request(cursor=cursor)), (None, 3, 1)
+        )
+
+    def test_bad_cursor_is_not_found(self):
+        def encode(data):
+            return urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        paginator = ProductsKeysetPagination()
+        paginator.ordering_key, paginator.priority_field = "price", None
+        for cursor in (
+            "not-a-cursor",
+            encode([1, 2]),
+            encode({"o": "price", "v": 1}),
+            encode({"o": "-price", "v": 1, "id": 1}),  # другая сортировка
+            encode({"o": "price", "v": {"x": 1}, "id": 1}),
+            encode({"o": "price", "v": 1, "id": 1, "p": 0}),  # без приоритета
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(NotFound):
+                    paginator.decode_cursor(self.request(cursor=cursor))
+
+        paginator.priority_field = "priority"
+        with self.assertRaises(NotFound):
+            paginator.decode_cursor(
+                self.request(cursor=encode({"o": "price", "v": 1, "id": 1}))
+            )
+
+
+class DictionaryInvalidationTest(TestCase):
+    """
+    Переименование характеристики или тега сдвигает теги кеша товаров,
+    в которых оно выводится (ответы и фрагменты товаров).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Products.objects.create(vendor_code="V1", name_product="Диван")
+        cls.other = Products.objects.create(vendor_code="V2", name_product="Кресло")
+        cls.color = NameSpecifications.objects.create(name_specification="Цвет")
+        cls.red = ValueSpecifications.objects.create(value_specification="Красный")
+        Specifications.objects.create(
+            product=cls.product,
+            name_specification=cls.color,
+            value_specification=cls.red,
+        )
+        cls.tag = Tag.objects.create(tag_text="new")
+        cls.product.tag_prod.add(cls.tag)
+
+    def setUp(self):
+        # пачки, накопленные при создании данных (on_commit не сработал)
+        ProductCardUpdater._local.batch = None
+
+    def assertProductsInvalidated(self, change, invalidated):
+        tags = [CacheTags.product(self.product.pk), CacheTags.product(self.other.pk)]
+        before = CacheTags.versions(tags)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        after = CacheTags.versions(tags)
+        self.assertEqual(
+            [before[tag] != after[tag] for tag in tags], [invalidated, False]
+        )
+
+    def test_specification_rename(self):
+        for instance, field in (
+            (self.color, "name_specification"),
+            (self.red, "value_specification"),
+        ):
+            with self.subTest(field=field):
+                setattr(instance, field, getattr(instance, field) + "!")
+                self.assertProductsInvalidated(instance.save, True)
+
+    def test_specification_delete(self):
+        self.assertProductsInvalidated(self.red.delete, True)
+
+    def test_tag_edit_and_delete(self):
+        self.tag.tag_text = "sale"
+        self.assertProductsInvalidated(self.tag.save, True)
+        self.assertProductsInvalidated(self.tag.delete, True)
+
+    def test_new_tag_invalidates_nothing(self):
+        self.assertProductsInvalidated(
+            lambda: Tag.objects.create(tag_text="hit"), False
+        )
+
+
+class FacetIndexTest(TestCase):
+    """
+    Выборка, счётчики фасетов и страница FacetIndex совпадают с теми же
+    запросами к базе; изменения применяются без перестройки индекса.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sofas = Category.objects.create(name_category="Диваны", slug="divany")
+        cls.chairs = Category.objects.create(name_category="Кресла", slug="kresla")
+        cls.brand_a = Brands.objects.create(name_brand="A")
+        cls.brand_b = Brands.objects.create(name_brand="B")
+        almaty = City.objects.create(name_city="Алматы")
+        astana = City.objects.create(name_city="Астана")
+        warehouses = {
+            city: Warehouse.objects.create(name_warehouse=f"W{city.pk}", city=city)
+            for city in (almaty, astana)
+        }
+        cls.color = NameSpecifications.objects.create(name_specification="Цвет")
+        cls.red = ValueSpecifications.objects.create(value_specification="Красный")
+        cls.blue = ValueSpecifications.objects.create(value_specification="Синий")
+
+        cls.products = []
+        for i, (category, brand, city, price, color) in enumerate(
+            (
+                (cls.sofas, cls.brand_a, almaty, 300, cls.red),
+                (cls.sofas, cls.brand_b, astana, 100, cls.blue),
+                (cls.sofas, cls.brand_a, astana, 200, cls.red),
+                (cls.chairs, cls.brand_b, almaty, 100, None),
+                (cls.chairs, None, almaty, 500, cls.blue),
+                (cls.sofas, cls.brand_b, almaty, 400, cls.blue),
+            )
+        ):
+            product = Products.objects.create(
+                vendor_code=f"F{i}",
+                name_product=f"Товар {i}",
+                category=category,
+                brand=brand,
+            )
+            ProductImage.objects.create(
+                product=product, image=f"product_images/f{i}.jpg", ind=1
+            )
+            Stock.objects.create(
+                product=product, warehouse=warehouses[city], quantity=1, price=price
+            )
+            if color:
+                Specifications.objects.create(
+                    product=product,
+                    name_specification=cls.color,
+                    value_specification=color,
+                )
+            cls.products.append(product)
+        # on_commit внутри TestCase не срабатывает — read model строим явно
+        ProductCardUpdater.rebuild_all()
+        ProductCityVisibilityUpdater.rebuild_all()
+
+    def setUp(self):
+        self.index = FacetIndex.build()
+
+    def tearDown(self):
+        FacetIndex._index = None
+
+    # выборки по базе — как category_facets до индекса в памяти
+    def sql(self, category_ids, brand_ids=(), spec_filters=None, city_name=None):
+        queryset = Products.objects.filter(
+            card__in_stock=True, category_id__in=category_ids
+        )
+        if brand_ids:
+            queryset = queryset.filter(brand_id__in=brand_ids)
+        for name_id, value_ids in (spec_filters or {}).items():
+            queryset = queryset.filter(
+                pk__in=Specifications.objects.filter(
+                    name_specification_id=name_id, value_specification_id__in=value_ids
+                ).values("product_id")
+            )
+        if city_name:
+            queryset = ProductsQueryFactory.only_visible_in_city(queryset, city_name)
+        return queryset
+
+    def ids(self, bits):
+        return {
+            self.index.rows[position].product_id
+            for position in self.index.iter_positions(bits)
+        }
+
+    def filters(self):
+        spec = {self.color.pk: [self.red.pk]}
+        both = {self.color.pk: [self.red.pk, self.blue.pk]}
+        all_categories = [self.sofas.pk, self.chairs.pk]
+        return [
+            (all_categories, (), None, None),
+            ([self.sofas.pk], (), None, None),
+            (all_categories, [self.brand_b.pk], None, None),
+            (all_categories, (), spec, None),
+            ([self.sofas.pk], [self.brand_a.pk, self.brand_b.pk], both, None),
+            (all_categories, (), None, "Алматы"),
+            ([self.sofas.pk], (), both, "Астана"),
+            (all_categories, (), None, "Нет такого"),
+        ]
+
+    def sql_counts(self, queryset):
+        specs = (
+            Specifications.objects.filter(product__in=queryset)
+            .values_list("name_specification_id", "value_specification_id")
+            .annotate(count=Count("product_id", distinct=True))
+        )
+        return {
+            "categories": dict(
+                queryset.values_list("category_id").annotate(count=Count("id"))
+            ),
+            "brands": dict(
+                queryset.exclude(brand=None)
+                .values_list("brand_id")
+                .annotate(count=Count("id"))
+            ),
+            "spec_values": {(name, value): count for name, value, count in specs},
+        }
+
+    def test_select_matches_sql(self):
+        for args in self.filters():
+            with self.subTest(args=args):
+                bits = self.index.select(*args)
+                expected = set(self.sql(*args).values_list("id", flat=True))
+                self.assertEqual(self.ids(bits), expected)
+                self.assertEqual(self.index.count(bits), len(expected))
+
+    def test_facet_counts_match_sql(self):
+        for tally_limit in (FacetIndex.TALLY_LIMIT, 0):
+            for args in self.filters():
+                with self.subTest(args=args, tally_limit=tally_limit):
+                    with mock.patch.object(FacetIndex, "TALLY_LIMIT", tally_limit):
+                        counts = self.index.count_facets(self.index.select(*args))
+                    self.assertEqual(
+                        {name: dict(value) for name, value in counts.items()},
+                        self.sql_counts(self.sql(*args)),
+                    )
+
+    def test_facets_blocks(self):
+        bits = self.index.select([self.sofas.pk, self.chairs.pk])
+        categories, brands, specs = self.index.facets(bits)
+        self.assertEqual(
+            [(row["name"], row["count"]) for row in categories],
+            [("Диваны", 4), ("Кресла", 2)],
+        )
+        self.assertEqual([(row["name"], row["count"]) for row in brands][0], ("B", 3))
+        self.assertEqual(
+            [(value["value"], value["count"]) for value in specs[0]["values"]],
+            [("Синий", 3), ("Красный", 2)],
+        )
+
+    def test_page_matches_sql(self):
+        args = ([self.sofas.pk, self.chairs.pk], (), None, None)
+        bits = self.index.select(*args)
+        for ordering, order_by in (
+            ([], ["pk"]),
+            (["price"], [F("card__min_price").asc(nulls_last=True), "pk"]),
+            (["-price"], [F("card__min_price").desc(nulls_last=True), "pk"]),
+            (["-reviews", "price"], ["-card__reviews_count", "card__min_price", "pk"]),
+        ):
+            with self.subTest(ordering=ordering):
+                expected = list(
+                    self.sql(*args).order_by(*order_by).values_list("id", flat=True)
+                )
+                self.assertEqual(self.index.page(bits, ordering, 0, 20), expected)
+                self.assertEqual(self.index.page(bits, ordering, 1, 2), expected[1:3])
+
+    def test_page_city_price(self):
+        args = ([self.sofas.pk, self.chairs.pk], (), None, "Астана")
+        expected = list(
+            ProductsQueryFactory.with_city_price(self.sql(*args), "Астана")
+            .order_by(F("city_price").asc(nulls_last=True), "pk")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(
+            self.index.page(self.index.select(*args), ["price"], 0, 20, "Астана"),
+            expected,
+        )
+
+    def test_remove_row(self):
+        product = self.products[0]
+        self.index.remove_row(product.pk)
+        self.index.remove_row(product.pk)  # повторно — без ошибок
+        self.index.remove_row(0)  # товара нет в индексе
+        for args in self.filters()[:4]:
+            with self.subTest(args=args):
+                bits = self.index.select(*args)
+                expected = set(
+                    self.sql(*args).exclude(pk=product.pk).values_list("id", flat=True)
+                )
+                self.assertEqual(self.ids(bits), expected)
+        counts = self.index.count_facets(self.index.select([self.sofas.pk]))
+        self.assertEqual(counts["categories"], {self.sofas.pk: 3})
+        self.assertEqual(counts["brands"], {self.brand_a.pk: 1, self.brand_b.pk: 2})
+
+    def test_rename_reloads_names_only(self):
+        FacetIndex._index = self.index
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sofas.name_category = "Софы"
+            self.sofas.save()
+            self.color.name_specification = "Окрас"
+            self.color.save()
+        with mock.patch.object(FacetIndex, "build", side_effect=AssertionError):
+            index = FacetIndex.get()
+        self.assertIsNot(index, self.index)
+        self.assertEqual(index.category_names[self.sofas.pk][0], "Софы")
+        self.assertEqual(index.spec_names[self.color.pk][0], "Окрас")
+        # прежний индекс не изменился — его ещё могут читать другие потоки
+        self.assertEqual(self.index.category_names[self.sofas.pk][0], "Диваны")
+
+    def test_get_does_not_wait_for_refresh(self):
+        FacetIndex._index = self.index
+        refreshing = threading.Event()
+        release = threading.Event()
+
+        def slow_refresh(index):
+            refreshing.set()
+            release.wait(5)
+            return index.copy()
+
+        with mock.patch.object(FacetIndex, "refreshed", side_effect=slow_refresh):
+            worker = threading.Thread(target=FacetIndex.get)
+            worker.start()
+            try:
+                self.assertTrue(refreshing.wait(5))
+                # обновление идёт в другом потоке — отдаём прежний индекс
+                self.assertIs(FacetIndex.get(), self.index)
+            finally:
+                release.set()
+                worker.join()
+        self.assertIsNot(FacetIndex._index, self.index)
+
+
+class SearchVectorUpdaterTest(TestCase):
+    """Пересчёт search_vector: пачка после коммита, только нужные поля."""
+
+    def setUp(self):
+        # пачку могли оставить откатившиеся транзакции других тестов
+        SearchVectorUpdater._local.batch = None
+
+    def test_translations(self):
+        self.assertEqual(
+            SearchVectorUpdater.translations({"en": "Sofa", "kk": "", "de": None}),
+            "Sofa",
+        )
+        self.assertEqual(SearchVectorUpdater.translations(None), "")
+        self.assertEqual(SearchVectorUpdater.translations(["Sofa"]), "")
+
+    def test_schedule_batches_after_commit(self):
+        with mock.patch.object(SearchVectorUpdater, "refresh") as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                SearchVectorUpdater.schedule(Products, [1], ["show_it"])
+                SearchVectorUpdater.schedule(Products, [2, None], ["additional_data"])
+                SearchVectorUpdater.schedule(Products, [3])
+                SearchVectorUpdater.schedule(Brands, [4])
+                refresh.assert_not_called()
+        self.assertEqual(
+            {call.args[0]: call.args[1] for call in refresh.call_args_list},
+            {Products: {2, 3}, Brands: {4}},
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "tsvector и pg_trgm — PostgreSQL")
+class SearchPredicatesTest(TestCase):
+    """
+    Условия глобального поиска по хранимому search_vector и триграммам
+    названия: название, перевод, артикул, характеристики, опечатки.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(
+            name_category="Диваны",
+            slug="divany",
+            additional_data={"en": "Sofas", "kk": ""},
+        )
+        cls.brand = Brands.objects.create(name_brand="Askona")
+        city = City.objects.create(name_city="Алматы")
+        warehouse = Warehouse.objects.create(name_warehouse="W1", city=city)
+        cls.sofa = Products.objects.create(
+            vendor_code="SF-100",
+            name_product="Диван угловой",
+            category=cls.category,
+            brand=cls.brand,
+            additional_data={"en": "Corner sofa", "kk": ""},
+        )
+        cls.lamp = Products.objects.create(vendor_code="LM-7", name_product="Лампа")
+        Stock.objects.create(product=cls.sofa, warehouse=warehouse, quantity=1)
+        Specifications.objects.create(
+            product=cls.lamp,
+            name_specification=NameSpecifications.objects.create(
+                name_specification="Цоколь"
+            ),
+            value_specification=ValueSpecifications.objects.create(
+                value_specification="E27"
+            ),
+        )
+        SearchVectorUpdater.rebuild_all()
+
+    def products(self, query, city_name=""):
+        return SmartGlobalSearchView.search_products(query_forms(query), city_name)
+
+    def test_products(self):
+        self.assertEqual(self.products("диван"), [self.sofa.pk])
+        self.assertEqual(self.products("sofa"), [self.sofa.pk])
+        self.assertEqual(self.products("divan"), [self.sofa.pk])
+        self.assertEqual(self.products("SF-100"), [self.sofa.pk])
+        self.assertEqual(self.products("e27"), [self.lamp.pk])
+        self.assertEqual(self.products("диавн угловой"), [self.sofa.pk])
+        self.assertEqual(self.products("холодильник"), [])
+
+    def test_products_in_city(self):
+        self.assertEqual(self.products("диван", "Алматы"), [self.sofa.pk])
+        self.assertEqual(self.products("лампа", "Алматы"), [])
+
+    def test_categories_and_brands(self):
+        forms = query_forms("sofas")
+        self.assertEqual(
+            [row["id"] for row in SmartGlobalSearchView.search_categories(forms)],
+            [self.category.pk],
+        )
+        self.assertEqual(
+            [row["id"] for row in SmartGlobalSearchView.search_brands(["askna"])],
+            [self.brand.pk],
+        )
+
+    def test_vector_follows_translation(self):
+        self.assertEqual(self.products("armchair"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.additional_data = {"en": "Armchair lamp", "kk": ""}
+            self.lamp.save(update_fields=["additional_data"])
+        self.assertEqual(self.products("armchair"), [self.lamp.pk])
+
+
+class TokenIndexTest(TestCase):
+    """Префиксы, опечатки и изменения пачкой в индексе токенов подсказок."""
+
+    def setUp(self):
+        self.index = TokenIndex()
+        self.index.update(
+            added=[
+                ("sofa", "Диван угловой Ёлка"),
+                ("chair", "Кресло-мешок"),
+                ("bed", "Кровать двуспальная"),
+            ]
+        )
+
+    def test_prefix(self):
+        self.assertEqual(self.index.prefix("кр"), {"chair", "bed"})
+        self.assertEqual(self.index.prefix("кресло"), {"chair"})
+        self.assertEqual(self.index.prefix("елк"), {"sofa"})
+        self.assertEqual(self.index.prefix("стол"), set())
+        with mock.patch.object(TokenIndex, "MAX_PREFIX_TOKENS", 1):
+            self.assertEqual(self.index.prefix("кр"), {"chair"})
+
+    def test_fuzzy(self):
+        self.assertEqual(self.index.fuzzy("дивна"), {"sofa"})
+        self.assertEqual(self.index.fuzzy("кравать"), {"bed"})
+        self.assertEqual(self.index.fuzzy("шкаф"), set())
+
+    def test_search(self):
+        self.assertEqual(self.index.search(["диван", "уг"]), {"sofa"})
+        self.assertEqual(self.index.search(["кр", "мешок"]), {"chair"})
+        # с опечаткой — только слова от 3 символов
+        self.assertEqual(self.index.search(["дивна"]), {"sofa"})
+        self.assertEqual(self.index.search(["дв"]), {"bed"})
+        self.assertEqual(self.index.search(["ди", "мешок"]), set())
+        self.assertEqual(self.index.search([]), set())
+
+    def test_update_copy(self):
+        copy = self.index.copy()
+        copy.update(
+            removed=[("sofa", "Диван угловой Ёлка")],
+            added=[("sofa", "Диван прямой"), ("bench", "Скамья")],
+        )
+        self.assertEqual(copy.prefix("угл"), set())
+        self.assertEqual(copy.prefix("прям"), {"sofa"})
+        self.assertEqual(copy.search(["скамья"]), {"bench"})
+        self.assertEqual(copy.tokens, sorted(copy.tokens))
+        # исходный индекс не изменился
+        self.assertEqual(self.index.prefix("угл"), {"sofa"})
+        self.assertEqual(self.index.prefix("ска"), set())
+
+
+class SuggestIndexGetTest(TestCase):
+    """SuggestIndex.get: сверка с лентой не чаще CHECK_INTERVAL, сброс — в фоне."""
+
+    def setUp(self):
+        self.index = SuggestIndex()
+        self.index.seq = SuggestIndex.products_feed.current()
+        SuggestIndex._index = self.index
+
+    def tearDown(self):
+        SuggestIndex._index = None
+
+    def test_checks_feed_once_per_interval(self):
+        with mock.patch.object(
+            SuggestIndex.products_feed, "read", return_value=(self.index.seq, set())
+        ) as read:
+            with mock.patch.object(CacheTags, "versions") as versions:
+                versions.return_value = {
+                    CacheTags.SEARCH_DICTIONARIES: self.index.dictionaries_version
+                }
+                self.assertIs(SuggestIndex.get(), self.index)
+                read.assert_not_called()
+
+                self.index.checked_at -= SuggestIndex.CHECK_INTERVAL
+                self.assertIs(SuggestIndex.get(), self.index)
+                self.assertIs(SuggestIndex.get(), self.index)
+        read.assert_called_once()
+        versions.assert_called_once()
+
+    def test_reset_rebuilds_in_background(self):
+        self.index.checked_at -= SuggestIndex.CHECK_INTERVAL
+        rebuilt = SuggestIndex()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_build(version):
+            started.set()
+            release.wait(5)
+            return rebuilt
+
+        with mock.patch.object(
+            SuggestIndex.products_feed, "read", return_value=(self.index.seq, None)
+        ):
+            with mock.patch.object(SuggestIndex, "build", side_effect=slow_build):
+                # запрос не ждёт перестройки
+                self.assertIs(SuggestIndex.get(), self.index)
+                self.assertTrue(started.wait(5))
+                self.assertIs(SuggestIndex.get(), self.index)
+                release.set()
+                self.assertTrue(SuggestIndex._lock.acquire(timeout=5))
+                SuggestIndex._lock.release()
+        self.assertIs(SuggestIndex.get(), rebuilt)
+
+
+class SearchQueryFormsTest(SimpleTestCase):
+    """Канонический вид запроса и его формы для поиска."""
+
+    def test_normalize_query(self):
+        cases = {
+            "Диван": "диван",
+            "  диван   угловой ": "диван угловой",
+            "divan": "диван",
+            "DIVAN uglovoj": "диван угловой",
+            "shkaf": "шкаф",
+            "sofa": "софа",
+            # q/w/x не транслитерируются — слово остаётся латиницей
+            "xbox": "xbox",
+            "wifi": "wifi",
+            # смешанная раскладка не трогается
+            "dиван": "dиван",
+            "ikea 2024": "икеа 2024",
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(normalize_query(query), expected)
+
+    def test_normalize_is_idempotent(self):
+        for query in ("divan", "Диван угловой", "xbox", "shkaf kupe"):
+            with self.subTest(query=query):
+                normalized = normalize_query(query)
+                self.assertEqual(normalize_query(normalized), normalized)
+
+    def test_forms_round_trip(self):
+        """Кириллица и её транслит дают один ключ и одни и те же формы."""
+        for cyrillic in ("диван", "шкаф купе", "кресло"):
+            with self.subTest(query=cyrillic):
+                forms = query_forms(normalize_query(cyrillic))
+                self.assertEqual(forms[0], cyrillic)
+                self.assertEqual(len(forms), 2)
+                self.assertEqual(normalize_query(forms[1]), cyrillic)
+                self.assertEqual(query_forms(normalize_query(forms[1])), forms)
+
+    def test_forms_without_cyrillic(self):
+        self.assertEqual(query_forms("xbox"), ["xbox"])
+        self.assertEqual(query_forms("2024"), ["2024"])
+
+
+class SearchQueryLogTest(SimpleTestCase):
+    """Журнал запросов ограничен по размеру и не ломает прогрев."""
+
+    def test_record_trims_day_set(self):
+        connection = mock.Mock()
+        with mock.patch.object(SearchQueryLog, "connection", return_value=connection):
+            SearchQueryLog.record("диван", "Алматы")
+        pipe = connection.pipeline.return_value
+        key = pipe.zincrby.call_args.args[0]
+        pipe.zremrangebyrank.assert_called_once_with(
+            key, 0, -SearchQueryLog.MAX_DAY_QUERIES - 1
+        )
+        pipe.execute.assert_called_once()
+
+    def test_top_survives_redis_errors(self):
+        with mock.patch.object(
+            SearchQueryLog, "connection", side_effect=ConnectionError("down")
+        ):
+            with self.assertLogs("app_products.SearchResultCache", "WARNING"):
+                self.assertEqual(SearchQueryLog.top(10), [])
+
+    def test_top_parses_members(self):
+        connection = mock.Mock()
+        connection.pipeline.return_value.execute.return_value = [
+            2,
+            ["Алматы\tдиван".encode(), b"\tsofa"],
+            1,
+        ]
+        with mock.patch.object(SearchQueryLog, "connection", return_value=connection):
+            self.assertEqual(
+                SearchQueryLog.top(10), [("диван", "Алматы"), ("sofa", "")]
+            )
@@ -1,62 +1,76 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 from app_products.views_v2 import ProductsViewSet_v2
 from app_products.SmartGlobalSearch import SmartGlobalSearchView
+from app_products.SuggestView import SuggestView
+
+from core.CacheTags import cache_tagged
 
 
 urlpatterns = [
     path(
+        # результаты кешируются по нормализованному запросу (SearchResultCache),
+        # кеш ответов по URL лишь дробил бы их и скрывал запросы от журнала
         "globalsearch/",
-        cache_page(60 * 15)(
-            SmartGlobalSearchView.as_view(),
-        ),
+        SmartGlobalSearchView.as_view(),
         name="products-list",
     ),
+    path(
+        # индекс в памяти быстрее кеша ответов — без cache_tagged
+        "suggest/",
+        SuggestView.as_view(),
+        name="suggest",
+    ),
     path(
         "products_v2/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             ProductsViewSet_v2.as_view({"get": "list"}),
         ),
         name="products-list",
     ),
     path(
         "products_v2/details/<slug:slug>/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             ProductsViewSet_v2.as_view({"get": "retrieve"}),
         ),
         name="products-detail",
     ),
     path(
         "products_v2/filter_by_ids/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             ProductsViewSet_v2.as_view({"get": "filter_by_ids"}),
         ),
         name="products-filter-by-ids",
     ),
+    path(
+        # POST: ответ зависит от тела запроса, кеш — на уровне фрагментов товаров
+        "products_v2/batch/",
+        ProductsViewSet_v2.as_view({"post": "batch"}),
+        name="products-batch",
+    ),
     path(
         "products_v2/popular_set/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             ProductsViewSet_v2.as_view({"get": "popular_set"}),
         ),
         name="popular-set-products",
     ),
     path(
         "products_v2/category/<slug:category_slug>/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             ProductsViewSet_v2.as_view({"get": "products_by_category"}),
         ),
         name="products-by-category",
     ),
     path(
         "products_v2/filter_by_city/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             ProductsViewSet_v2.as_view({"get": "filter_by_city"}),
         ),
         name="filter-by-city",
     ),
     path(
         "products_v2/discounted/",
-        cache_page(60 * 15)(
+        cache_tagged()(
             ProductsViewSet_v2.as_view({"get": "discounted"}),
         ),
         name="discounted",
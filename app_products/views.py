@@ -6,7 +6,7 @@ from django.utils import timezone
 
 # from django.utils.decorators import method_decorator
 # from django.views.decorators.csrf import csrf_exempt
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.db import transaction
 from django.db.models import Q, Avg, Count, Min, OuterRef, Prefetch, Subquery
 
@@ -17,7 +17,8 @@ from rest_framework.response import Response
 from app_products.models import Products, PopulatesProducts, ExternalProduct
 from app_discounts.models import ProductDiscount, CategoryDiscount
 from app_sales_points.models import Stock
-from app_category.models import Category
+from app_sales_points.utils import stocks_bulk_changed
+from app_category.CategoryTree import CategoryTree
 from app_specifications.models import Specifications
 from app_products.serializers import (
     ProductsListSerializer,
@@ -28,6 +29,9 @@ from app_products.serializers import (
     ExternalProductSerializer,
 )
 
+from core.CacheTags import CacheTags, cache_tagged
+from core.renderers import StreamingJSONArrayResponse
+
 
 class PopulatesProductsViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = PopulatesProducts.objects.filter(activ_set=True)
@@ -38,6 +42,22 @@ class ProductsViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Products.objects.all()
     serializer_class = ProductsListSerializer
     lookup_field = "slug_prod"
+    # Действия, ответы которых кешируются по тегам (с ETag / Last-Modified);
+    # slugs и vendor_cods зависят от данных, которые теги не отслеживают
+    cached_actions = {"list", "retrieve", "filter_by_cat", "get_products_by_ids"}
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if actions and set(actions.values()) <= cls.cached_actions:
+            return cache_tagged()(view)
+        return view
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Ответы зависят от состава товаров, а не только от попавших в них
+        # (в т.ч. retrieve: несуществующий slug отдаёт пустой объект)
+        CacheTags.add(CacheTags.PRODUCTS)
 
     def retrieve(self, request, slug_prod=None, *args, **kwargs):
         instance = self.get_object_by_slug(slug_prod)
@@ -97,8 +117,11 @@ class ProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
         return queryset.annotate(
+            # API v1: рейтинг и число отзывов по всем отзывам, включая
+            # непромодерированные (колонки Products считают только
+            # прошедшие модерацию — их выводит v2)
             average_rating=Avg("reviews__rating"),
-            reviews_count=Count("reviews"),
+            all_reviews_count=Count("reviews"),
             # city_prices=Subquery(city_prices_subquery),
             discount_amount_p=Subquery(discount_subquery_p),
             discount_amount_c=Subquery(discount_subquery_c),
@@ -110,40 +133,31 @@ class ProductsViewSet(viewsets.ReadOnlyModelViewSet):
         )
 
     def get_products_by_category(self, slug_cat):
-        # Получаем все товары, связанные с этой категорией
-        products_queryset = self.queryset.filter(category__slug=slug_cat)
-        # Если в категории нет продуктов, рекурсивно получаем продукты из всех подкатегорий
-        # if not products_queryset.exists():
-        category = get_object_or_404(Category, slug=slug_cat)
-        # Получаем все подкатегории данной категории
-        subcategories = category.children.all()
-        # Рекурсивно обходим каждую подкатегорию
-        for subcategory in subcategories:
-            products_queryset |= self.get_products_by_category(subcategory.slug)
-        products_queryset = self.get_annotated_queryset(products_queryset)
-        return products_queryset
+        # Товары категории и всех её подкатегорий (дерево — в памяти)
+        category = CategoryTree.get().by_slug(slug_cat)
+        if category is None:
+            raise Http404
+        products_queryset = self.queryset.filter(
+            category_id__in=category.descendant_ids
+        )
+        return self.get_annotated_queryset(products_queryset)
 
+    # Выгрузки всего каталога отдаются потоком, без списка в памяти
     def slugs(self, request):
-        self.serializer_class = PrductsListIDSerializer
-        products_queryset = self.get_queryset()
-        serializer = self.get_serializer(products_queryset, many=True)
-        slugs = [el["slug"] for el in serializer.data]
-        return Response(slugs)
+        return StreamingJSONArrayResponse(
+            self.get_queryset().values_list("slug", flat=True)
+        )
 
     def vendor_cods(self, request):
-        # self.serializer_class = PrductsListVendorCodeSerializer
-        products_codes_list = (
+        products_codes = (
             self.get_queryset()
             .order_by("vendor_code")
             .values_list("vendor_code", flat=True)
         )
-        products_external_codes_list = (
-            ExternalProduct.objects.all()
-            .order_by("product_code")
-            .values_list("product_code", flat=True)
+        external_codes = ExternalProduct.objects.order_by("product_code").values_list(
+            "product_code", flat=True
         )
-        combined_codes = list(products_codes_list) + list(products_external_codes_list)
-        return Response(combined_codes)
+        return StreamingJSONArrayResponse(products_codes, external_codes)
 
     def get_products_by_ids(self, *args, **kwargs):
         # Фильтрация продуктов по списку идентификаторов
@@ -309,6 +323,8 @@ class ExternalProductBulkCreateAPIView(APIView):
 
                     # Выполняем bulk_update
                     Stock.objects.bulk_update(updated_stocks, ["price", "quantity"])
+                    # bulk_update не шлёт сигналов — карточки и кеш обновляем явно
+                    stocks_bulk_changed(stock.product_id for stock in updated_stocks)
 
                     return Response(
                         {
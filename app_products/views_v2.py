@@ -1,28 +1,28 @@
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
 from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.filters import SearchFilter
 from rest_framework.viewsets import ReadOnlyModelViewSet
-from rest_framework.pagination import LimitOffsetPagination
 
-from django.utils import timezone
 from django.db.models import Q, Case, When, Value, IntegerField
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
-from app_category.models import Category
-from app_products.models import PopulatesProducts
+from app_category.CategoryTree import CategoryTree
+from app_products.models import PopulatesProducts, Products
 
-from app_products.serializers_v2 import ProductSerializer
+from app_products.serializers_v2 import ProductSerializer, ProductsBatchSerializer
 
-from app_products.ProductsFiltering import ProductsFilter
+from app_products.ProductsFiltering import ProductsFilter, ProductsOrderingFilter
+from app_products.ProductsPagination import (
+    ProductsPagination,
+    ProductsKeysetPagination,
+)
 from app_products.ProductsQueryFactory import ProductsQueryFactory
+from app_products.ProductFragmentCache import ProductFragmentCache
 
-from django_filters.rest_framework import DjangoFilterBackend
-
+from core.CacheTags import CacheTags
 
-class ProductsPagination(LimitOffsetPagination):
-    default_limit = 20  # Переопределение значения limit
-    # max_limit = 100  # Максимальный размер страницы
+from django_filters.rest_framework import DjangoFilterBackend
 
 
 class ProductsViewSet_v2(ReadOnlyModelViewSet):
@@ -30,12 +30,11 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
     Представление только для чтения продуктов с аннотированной информацией.
     """
 
-    queryset = ProductsQueryFactory.get_all_details()
     serializer_class = ProductSerializer
     pagination_class = ProductsPagination
     lookup_field = "slug"  # Указываем поле для поиска
     filter_backends = [
-        OrderingFilter,
+        ProductsOrderingFilter,
         SearchFilter,
         DjangoFilterBackend,
     ]
@@ -43,7 +42,8 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
     ordering_fields = [
         "avg_rating",
         "stocks__price",
-    ]  # Поля для сортировки
+        "price",
+    ]  # Поля для сортировки (цена — см. ProductsOrderingFilter)
     search_fields = [
         "name_product",
         "vendor_code",
@@ -54,30 +54,95 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
         "brand__additional_data",  # JSON
     ]
 
-    def filter_by_city_and_edges(self, queryset, city_name):
+    # Реестр: действие -> профиль плана запроса (ProductsQueryFactory.PROFILES)
+    query_profiles = {
+        "list": "list",
+        "retrieve": "detail",
+        "filter_by_ids": "list",
+        "batch": "card",
+        "popular_set": "list",
+        "products_by_category": "list",
+        "filter_by_city": "list",
+        "discounted": "list",
+    }
+    default_query_profile = "detail"
+    # Аннотация — первый ключ keyset-пагинации (см. products_by_category)
+    keyset_priority = None
+
+    def get_query_profile(self):
+        name = self.query_profiles.get(self.action, self.default_query_profile)
+        return ProductsQueryFactory.get_profile(name)
+
+    def get_product_fields(self):
         """
-        Фильтрует товары по остаткам и рёбрам для указанного города.
+        Поля ответа из ?fields= / ?omit= (или поля профиля по умолчанию).
+        None — нужны все поля.
         """
-        if not city_name:
-            return queryset
+        return ProductSerializer.get_requested_fields(
+            self.request, self.get_query_profile().fields
+        )
 
-        # Фильтрация товаров по остаткам в указанном городе
-        stocks_filter = Q(stocks__warehouse__city__name_city=city_name)
+    def get_queryset(self):
+        # План строится заново на каждый запрос (а не при импорте модуля)
+        CacheTags.add(*self.get_cache_tags())
+        return self.get_query_profile().build(fields=self.get_product_fields())
 
-        # Фильтрация товаров по рёбрам, ведущим в указанный город
-        edges_filter = Q(
-            Q(category__edges__city_to__name_city=city_name)
-            | Q(brand__edges__city_to__name_city=city_name)
-        )
+    def get_cache_tags(self):
+        """
+        Теги кеша ответа помимо тегов самих товаров
+        (их добавляет ProductSerializer).
+        """
+        tags = []
+        if self.action != "retrieve":
+            tags.append(CacheTags.PRODUCTS)
+        if self.action == "popular_set":
+            tags.append(CacheTags.POPULAR_SET)
+        city_name = self.request.query_params.get("city")
+        if city_name:
+            tags.append(CacheTags.city(city_name))
+        return tags
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["default_fields"] = self.get_query_profile().fields
+        # Списки собираются из JSON-фрагментов товаров (ProductFragmentCache)
+        context["json_fragments"] = True
+        context["deferred_prefetch"] = getattr(self, "deferred_prefetch", ())
+        return context
+
+    def paginate_queryset(self, queryset):
+        # prefetch выполняются при сериализации и только для товаров,
+        # которых нет в кеше фрагментов
+        queryset, self.deferred_prefetch = ProductFragmentCache.defer_prefetch(queryset)
+        return super().paginate_queryset(queryset)
+
+    @property
+    def paginator(self):
+        """
+        ?pagination=cursor (или ?cursor=...) включает keyset-пагинацию,
+        иначе используется обычная limit/offset.
+        """
+        if not hasattr(self, "_paginator"):
+            if ProductsKeysetPagination.is_requested(self.request):
+                self._paginator = ProductsKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
-        # Применяем фильтры и удаляем дубли
-        return queryset.filter(stocks_filter | edges_filter).distinct()
+    def filter_by_city_and_edges(self, queryset, city_name):
+        """
+        Фильтрует товары по остаткам и рёбрам для указанного города
+        (индекс ProductCityVisibility).
+        """
+        if not city_name:
+            return queryset
+        return ProductsQueryFactory.only_visible_in_city(queryset, city_name)
 
     def list(self, request, *args, **kwargs):
         """
         Переопределяем метод list для применения фильтрации по городам.
         """
-        # Получаем базовый QuerySet
+        # Базовый QuerySet читает видимость и агрегаты из ProductCard
         queryset = self.filter_queryset(self.get_queryset())
 
         # Проверяем наличие параметра `city`
@@ -118,6 +183,59 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request, *args, **kwargs):
+        """
+        Карточки товаров по списку id, slug или артикулов (до нескольких
+        тысяч) в порядке запроса. Тело: {"ids": [...]} | {"slugs": [...]} |
+        {"vendor_codes": [...]}, необязательно "city".
+
+        Каждый элемент results: {"lookup", "status", "product"}, где status —
+        "ok", "not_found" (товара нет) или "hidden" (не показывается
+        в каталоге или в городе). Карточки собираются из кеша фрагментов.
+        """
+        params = ProductsBatchSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        lookup = params.validated_data["lookup"]
+        values = list(dict.fromkeys(params.validated_data[lookup]))
+        field = ProductsBatchSerializer.LOOKUPS[lookup]
+
+        # значение -> id товаров (slug не уникален)
+        found = {}
+        for value, pk in (
+            Products.objects.filter(**{f"{field}__in": values})
+            .order_by("id")
+            .values_list(field, "id")
+        ):
+            found.setdefault(value, []).append(pk)
+
+        queryset = self.get_queryset().filter(
+            pk__in=[pk for pks in found.values() for pk in pks]
+        )
+        queryset = self.filter_by_city_and_edges(
+            queryset, params.validated_data.get("city")
+        )
+        # prefetch — только для товаров без фрагмента в кеше
+        queryset, self.deferred_prefetch = ProductFragmentCache.defer_prefetch(queryset)
+        products = list(queryset)
+        cards = dict(
+            zip(
+                [product.pk for product in products],
+                self.get_serializer(products, many=True).data,
+            )
+        )
+
+        results = []
+        for value in params.validated_data[lookup]:
+            pks = found.get(value)
+            if not pks:
+                status, card = "not_found", None
+            else:
+                card = next((cards[pk] for pk in pks if pk in cards), None)
+                status = "hidden" if card is None else "ok"
+            results.append({"lookup": value, "status": status, "product": card})
+        return Response({"results": results})
+
     @action(detail=False, methods=["get"], url_path="popular_set")
     def popular_set(self, request, *args, **kwargs):
         """
@@ -132,7 +250,7 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
 
         # Используем фабрику для аннотирования товаров
         queryset = (
-            ProductsQueryFactory.get_all_details()
+            self.get_queryset()
             .filter(id__in=product_ids)
             .order_by("productsetproduct__sort_value")
         )
@@ -160,12 +278,11 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
         """
         # --------------------------------------------------------------------- #
         # 1. Базовый набор товаров категории и её потомков
-        category = get_object_or_404(Category, slug=category_slug)
-        category_ids = category.get_descendants(include_self=True).values_list(
-            "id", flat=True
-        )
-        queryset = ProductsQueryFactory.get_all_details().filter(
-            category_id__in=category_ids
+        category = CategoryTree.get().by_slug(category_slug)
+        if category is None:
+            raise Http404
+        queryset = self.get_queryset().filter(
+            card__category_id__in=category.descendant_ids
         )
 
         # --------------------------------------------------------------------- #
@@ -190,6 +307,8 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
             ).order_by(
                 "priority",
             )
+            # keyset-режим: приоритет — первый ключ курсора
+            self.keyset_priority = "priority"
 
         # # --------------------------------------------------------------------- #
         # 4. Прочие сортировки через DRF OrderingFilter
@@ -254,48 +373,15 @@ class ProductsViewSet_v2(ReadOnlyModelViewSet):
         # 2. Ограничиваем городом (склады + рёбра)
         qs = self.filter_by_city_and_edges(qs, city_name)
 
-        # 3. Фильтр «есть активная скидка прямо сейчас»
-        now = timezone.now()
-
-        discount_filter = (
-            # Скидки на конкретные продукты
-            Q(product_discounts__active=True)
-            & (
-                Q(product_discounts__start_date__isnull=True)
-                | Q(product_discounts__start_date__lte=now)
-            )
-            & (
-                Q(product_discounts__end_date__isnull=True)
-                | Q(product_discounts__end_date__gte=now)
-            )
-            # Скидки на категории
-            | Q(category__category_discounts__active=True)
-            & (
-                Q(category__category_discounts__start_date__isnull=True)
-                | Q(category__category_discounts__start_date__lte=now)
-            )
-            & (
-                Q(category__category_discounts__end_date__isnull=True)
-                | Q(category__category_discounts__end_date__gte=now)
-            )
-            # Скидки на бренды
-            | Q(brand__brand_discounts__active=True)
-            & (
-                Q(brand__brand_discounts__start_date__isnull=True)
-                | Q(brand__brand_discounts__start_date__lte=now)
-            )
-            & (
-                Q(brand__brand_discounts__end_date__isnull=True)
-                | Q(brand__brand_discounts__end_date__gte=now)
-            )
-        )
-
-        qs = qs.filter(discount_filter).distinct()
+        # 3. Фильтр «есть активная скидка прямо сейчас»: строку
+        # ProductEffectiveDiscount пересчитывают сигналы и задача
+        # refresh_discount_windows на границах периодов действия
+        qs = qs.filter(effective_discount__isnull=False)
         qs = self.filter_queryset(qs)
 
         brands_to_filter = qs.values(
             "brand__id", "brand__name_brand", "brand__logobrand__image"
-        )
+        ).distinct()
         cat_to_filter = qs.values(
             "category__id",
             "category__name_category",
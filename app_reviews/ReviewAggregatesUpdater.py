@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models import Q, Avg, Count
+
+from app_reviews.models import Review
+from app_products.models import Products, empty_rating_histogram
+
+
+class ReviewAggregatesUpdater:
+    """
+    Поддерживает агрегаты отзывов в Products:
+    avg_rating, reviews_count и rating_histogram (1–5 звёзд).
+    Учитываются только прошедшие модерацию отзывы.
+    """
+
+    CHUNK_SIZE = 500
+    STARS = range(1, 6)
+    FIELDS = ["avg_rating", "reviews_count", "rating_histogram"]
+
+    @classmethod
+    def refresh(cls, product_ids):
+        """
+        Пересчитывает агрегаты указанных товаров.
+        Строки товаров блокируются, поэтому параллельные изменения
+        отзывов одного товара пересчитываются по очереди.
+        """
+        product_ids = sorted({pk for pk in product_ids if pk})
+        for start in range(0, len(product_ids), cls.CHUNK_SIZE):
+            cls._refresh_chunk(product_ids[start : start + cls.CHUNK_SIZE])
+
+    @classmethod
+    def rebuild_all(cls):
+        """Полный пересчёт (первичное заполнение / сверка)."""
+        product_ids = list(Products.objects.values_list("id", flat=True))
+        cls.refresh(product_ids)
+        return len(product_ids)
+
+    @classmethod
+    def _refresh_chunk(cls, product_ids):
+        with transaction.atomic():
+            locked = list(
+                Products.objects.select_for_update()
+                .filter(pk__in=product_ids)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            rows = {
+                row["product_id"]: row
+                for row in Review.objects.filter(product_id__in=locked, moderation=True)
+                .values("product_id")
+                .annotate(
+                    avg_rating=Avg("rating"),
+                    reviews_count=Count("id"),
+                    **{
+                        f"star_{star}": Count("id", filter=Q(rating=star))
+                        for star in cls.STARS
+                    },
+                )
+            }
+            products = [cls._build(pk, rows.get(pk)) for pk in locked]
+            # bulk_update — без save() и сигналов Products
+            Products.objects.bulk_update(products, cls.FIELDS)
+
+    @classmethod
+    def _build(cls, pk, row):
+        if row is None:
+            return Products(
+                pk=pk,
+                avg_rating=None,
+                reviews_count=0,
+                rating_histogram=empty_rating_histogram(),
+            )
+        return Products(
+            pk=pk,
+            avg_rating=row["avg_rating"],
+            reviews_count=row["reviews_count"],
+            rating_histogram={str(star): row[f"star_{star}"] for star in cls.STARS},
+        )
@@ -5,3 +5,6 @@ class AppReviewsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app_reviews"
     verbose_name = "Управление отзывами"
+
+    def ready(self):
+        from app_reviews import signals
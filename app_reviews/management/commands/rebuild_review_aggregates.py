@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_reviews.ReviewAggregatesUpdater import ReviewAggregatesUpdater
+
+# первичное заполнение / сверка агрегатов отзывов в Products
+# python manage.py rebuild_review_aggregates
+
+
+class Command(BaseCommand):
+    help = "Пересчёт рейтинга, числа отзывов и распределения оценок товаров"
+
+    def handle(self, *args, **options):
+        total = ReviewAggregatesUpdater.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ Пересчитано товаров: {total}"))
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from app_reviews.models import Review
+from app_reviews.ReviewAggregatesUpdater import ReviewAggregatesUpdater
+from app_products.ProductCardUpdater import ProductCardUpdater
+
+
+# ---------------------------------------------------------------------------
+# Агрегаты отзывов в Products (создание, модерация, удаление)
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    ReviewAggregatesUpdater.refresh([instance.product_id])
+    # Карточка читает агрегаты из Products — обновляем её после них
+    ProductCardUpdater.schedule([instance.product_id])
@@ -0,0 +1,69 @@
+from django.db.models import Exists, F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app_products.models import ProductCard
+from app_sales_points.models import City, ProductCityVisibility
+
+from core.CacheTags import CacheTags
+
+
+class CityStats:
+    """
+    Статистика по городам одним запросом: для каждого города —
+    число видимых в нём товаров и их суммарный остаток.
+
+    Видимость берётся из ProductCityVisibility (остаток или ребро),
+    наличие и остаток — из ProductCard (in_stock, total_quantity).
+    Товар считается один раз, сколько бы путей в город у него ни было.
+    """
+
+    @staticmethod
+    def visible_cards():
+        """Карточки в наличии, видимые в городе OuterRef("pk")."""
+        return (
+            ProductCard.objects.filter(in_stock=True)
+            .filter(
+                Exists(
+                    ProductCityVisibility.objects.filter(
+                        product_id=OuterRef("product_id"),
+                        city_id=OuterRef(OuterRef("pk")),
+                    )
+                )
+            )
+            .order_by()
+        )
+
+    @staticmethod
+    def aggregate(queryset, function, field):
+        """
+        Подзапрос SELECT function(field) по всему queryset: Func, а не
+        Count/Sum — Django не добавляет GROUP BY, строка всегда одна.
+        """
+        value = Func(F(field), function=function, output_field=IntegerField())
+        return Coalesce(
+            Subquery(queryset.annotate(value=value).values("value")),
+            0,
+            output_field=IntegerField(),
+        )
+
+    @classmethod
+    def annotate(cls, cities):
+        cards = cls.visible_cards()
+        return cities.annotate(
+            total_products=cls.aggregate(cards, "COUNT", "pk"),
+            total_quantity=cls.aggregate(cards, "SUM", "total_quantity"),
+        )
+
+    @classmethod
+    def get_cities(cls):
+        """
+        Города с total_products / total_quantity. Ответ, построенный
+        по ним, инвалидируется вместе с остатками, видимостью и городами.
+        """
+        cities = list(cls.annotate(City.objects.all()))
+        CacheTags.add(
+            CacheTags.PRODUCTS,
+            CacheTags.CITY_STATS,
+            *(CacheTags.city(city.name_city) for city in cities),
+        )
+        return cities
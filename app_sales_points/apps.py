@@ -5,3 +5,6 @@ class AppSalesPointsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app_sales_points"
     verbose_name = "Управление точками прожад"
+
+    def ready(self):
+        from app_sales_points import signals
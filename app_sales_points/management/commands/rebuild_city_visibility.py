@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app_sales_points.utils import ProductCityVisibilityUpdater
+
+# первичное заполнение / сверка индекса видимости и цен товаров по городам
+# python manage.py rebuild_city_visibility
+
+
+class Command(BaseCommand):
+    help = "Полная перестройка таблиц ProductCityVisibility и ProductCityPrice"
+
+    def handle(self, *args, **options):
+        total = ProductCityVisibilityUpdater.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ Пересчитано товаров: {total}"))
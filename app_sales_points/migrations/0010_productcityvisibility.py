@@ -0,0 +1,92 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0011_products_review_aggregates"),
+        ("app_sales_points", "0009_edges_app_sales_p_city_to_2303f2_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCityVisibility",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("stock", "Остаток на складе"), ("edge", "Маршрут")],
+                        max_length=5,
+                        verbose_name="Источник",
+                    ),
+                ),
+                (
+                    "estimated_delivery_days",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="Срок доставки (в днях)"
+                    ),
+                ),
+                (
+                    "transportation_cost",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=2,
+                        max_digits=10,
+                        null=True,
+                        verbose_name="Транспортировочные расходы",
+                    ),
+                ),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="app_sales_points.city",
+                        verbose_name="Город",
+                    ),
+                ),
+                (
+                    "edge",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="app_sales_points.edges",
+                        verbose_name="Маршрут",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="city_visibility",
+                        to="app_products.products",
+                        verbose_name="Продукт",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Видимость товара в городе",
+                "verbose_name_plural": "Видимость товаров в городах",
+                "indexes": [
+                    models.Index(
+                        fields=["city", "product"],
+                        name="app_sales_p_city_id_d0b18d_idx",
+                    )
+                ],
+            },
+        ),
+    ]
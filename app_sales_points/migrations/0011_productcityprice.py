@@ -0,0 +1,97 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_products", "0012_productcard_spec_index"),
+        ("app_sales_points", "0010_productcityvisibility"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCityPrice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Минимальная цена"
+                    ),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=10,
+                        verbose_name="Максимальная цена",
+                    ),
+                ),
+                (
+                    "min_price_before_discount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=10,
+                        verbose_name="Минимальная цена до скидки",
+                    ),
+                ),
+                (
+                    "max_price_before_discount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=10,
+                        verbose_name="Максимальная цена до скидки",
+                    ),
+                ),
+                (
+                    "city",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="app_sales_points.city",
+                        verbose_name="Город",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="city_prices",
+                        to="app_products.products",
+                        verbose_name="Продукт",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Цена товара в городе",
+                "verbose_name_plural": "Цены товаров в городах",
+                "indexes": [
+                    models.Index(
+                        fields=["city", "min_price"],
+                        name="app_sales_p_city_id_1ce96a_idx",
+                    ),
+                    models.Index(
+                        fields=["city", "max_price"],
+                        name="app_sales_p_city_id_44207c_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="productcityprice",
+            constraint=models.UniqueConstraint(
+                fields=("product", "city"), name="unique_product_city_price"
+            ),
+        ),
+    ]
@@ -169,3 +169,126 @@ class Edges(models.Model):
 
     def __str__(self):
         return f"{self.city_from} -> {self.city_to}"
+
+
+class ProductCityVisibility(models.Model):
+    """
+    Индекс видимости товара в городе: товар виден, если есть остаток
+    на складе города или ребро категории/бренда, ведущее в город.
+    Поддерживается ProductCityVisibilityUpdater (app_sales_points/utils.py).
+    """
+
+    SOURCE_STOCK = "stock"
+    SOURCE_EDGE = "edge"
+    SOURCE_CHOICES = [
+        (SOURCE_STOCK, "Остаток на складе"),
+        (SOURCE_EDGE, "Маршрут"),
+    ]
+
+    product = models.ForeignKey(
+        Products,
+        on_delete=models.CASCADE,
+        related_name="city_visibility",
+        verbose_name="Продукт",
+    )
+    city = models.ForeignKey(
+        City,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Город",
+    )
+    source = models.CharField(
+        max_length=5,
+        choices=SOURCE_CHOICES,
+        verbose_name="Источник",
+    )
+    edge = models.ForeignKey(
+        Edges,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Маршрут",
+    )
+    estimated_delivery_days = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Срок доставки (в днях)",
+    )
+    transportation_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Транспортировочные расходы",
+    )
+
+    class Meta:
+        verbose_name = "Видимость товара в городе"
+        verbose_name_plural = "Видимость товаров в городах"
+        indexes = [
+            models.Index(fields=["city", "product"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.city_id} ({self.source})"
+
+
+class ProductCityPrice(models.Model):
+    """
+    Цены товара в городе: остатки складов города, а по маршрутам
+    категории/бренда в город — остатки всех складов (как в ответе
+    StocksByCityField). Цена остатка — цена продажи (после скидки),
+    цена до скидки считается от действующей скидки товара.
+    Поддерживается ProductCityVisibilityUpdater (app_sales_points/utils.py).
+    """
+
+    product = models.ForeignKey(
+        Products,
+        on_delete=models.CASCADE,
+        related_name="city_prices",
+        verbose_name="Продукт",
+    )
+    city = models.ForeignKey(
+        City,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Город",
+    )
+    min_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Минимальная цена",
+    )
+    max_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Максимальная цена",
+    )
+    min_price_before_discount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Минимальная цена до скидки",
+    )
+    max_price_before_discount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Максимальная цена до скидки",
+    )
+
+    class Meta:
+        verbose_name = "Цена товара в городе"
+        verbose_name_plural = "Цены товаров в городах"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "city"], name="unique_product_city_price"
+            ),
+        ]
+        indexes = [
+            # диапазон и сортировка по цене внутри города
+            models.Index(fields=["city", "min_price"]),
+            models.Index(fields=["city", "max_price"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.city_id}: {self.min_price}"
@@ -90,23 +90,10 @@ class EdgeSerializer(serializers.ModelSerializer):
 class StocksByCityField(serializers.Field):
     def get_discount(self, obj):
         """
-        Приоритет: товар → категория → бренд.
-        Возвращаем объект скидки (или None).
+        Действующая скидка товара (ProductEffectiveDiscount) или None.
+        Приоритет товар → категория → бренд и даты уже учтены при пересчёте.
         """
-        product_discounts = getattr(obj, "prefetched_product_discounts", [])
-        if product_discounts:
-            return max(product_discounts, key=lambda d: d.amount)
-        cat_discounts = []
-        if obj.category:
-            cat_discounts = getattr(obj.category, "prefetched_category_discounts", [])
-            if cat_discounts:
-                return max(cat_discounts, key=lambda d: d.amount)
-        brand_discounts = []
-        if obj.brand:
-            brand_discounts = getattr(obj.brand, "prefetched_brand_discounts", [])
-            if brand_discounts:
-                return max(brand_discounts, key=lambda d: d.amount)
-        return None
+        return getattr(obj, "effective_discount", None)
 
     def to_representation(self, product):
         # 1) Получаем саму скидку (obj), если есть
@@ -0,0 +1,99 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db.models import Q
+from django.dispatch import receiver
+
+from app_products.models import Products
+from app_sales_points.models import City, Stock, Warehouse, Edges
+from app_sales_points.utils import ProductCityVisibilityUpdater, edge_target_tag
+
+from core.CacheTags import CacheTags
+
+
+# ---------------------------------------------------------------------------
+# Видимость товаров в городах (ProductCityVisibility)
+# ---------------------------------------------------------------------------
+@receiver(post_save, sender=Products)
+def product_saved(sender, instance, **kwargs):
+    # могли смениться категория или бренд, а значит и рёбра
+    ProductCityVisibilityUpdater.schedule([instance.pk])
+
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def stock_changed(sender, instance, **kwargs):
+    ProductCityVisibilityUpdater.schedule([instance.product_id])
+    CacheTags.invalidate([CacheTags.CITY_STATS])
+
+
+@receiver(post_save, sender=Warehouse)
+@receiver(pre_delete, sender=Warehouse)
+def warehouse_changed(sender, instance, **kwargs):
+    # При удалении склада остатки теряют его через SET_NULL без сигналов
+    ProductCityVisibilityUpdater.schedule(
+        instance.stocks.values_list("product_id", flat=True)
+    )
+
+
+@receiver(pre_save, sender=Edges)
+def edge_before_save(sender, instance, **kwargs):
+    # Запоминаем прежний объект маршрута: его товары тоже нужно пересчитать
+    instance._visibility_target = (
+        Edges.objects.filter(pk=instance.pk)
+        .values_list("content_type_id", "object_id")
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Edges)
+@receiver(post_delete, sender=Edges)
+def edge_changed(sender, instance, **kwargs):
+    targets = {(instance.content_type_id, instance.object_id)}
+    previous = getattr(instance, "_visibility_target", None)
+    if previous:
+        targets.add(previous)
+    for content_type_id, object_id in targets:
+        ProductCityVisibilityUpdater.schedule(
+            ProductCityVisibilityUpdater.edge_product_ids(content_type_id, object_id)
+        )
+    # Стоимость и сроки доставки по ребру выводятся в stocks всех товаров
+    # категории / бренда
+    CacheTags.invalidate(
+        edge_target_tag(content_type_id, object_id)
+        for content_type_id, object_id in targets
+    )
+
+
+def city_product_tags(city):
+    """
+    Теги товаров, в которых выводится название города: остатки на складах
+    города (stocks) и маршруты из города и в город (категории и бренды).
+    """
+    tags = {
+        CacheTags.product(pk)
+        for pk in Stock.objects.filter(warehouse__city=city)
+        .values_list("product_id", flat=True)
+        .distinct()
+    }
+    tags.update(
+        edge_target_tag(content_type_id, object_id)
+        for content_type_id, object_id in Edges.objects.filter(
+            Q(city_from=city) | Q(city_to=city)
+        )
+        .values_list("content_type_id", "object_id")
+        .distinct()
+    )
+    return tags
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def city_changed(sender, instance, created=False, **kwargs):
+    # Список городов со статистикой (CityViewSet); FacetIndex ищет город
+    # по названию — перечитает только справочники
+    tags = {CacheTags.CITY_STATS, CacheTags.FACET_DICTIONARIES}
+    if not created:
+        # Название города выводится в товарах (остатки и маршруты)
+        tags.update(city_product_tags(instance))
+    CacheTags.invalidate(tags)
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from app_sales_points.utils import ProductCityVisibilityUpdater
+
+
+@shared_task(bind=True, name="Пересчитать видимость товаров по истёкшим маршрутам")
+def refresh_expired_edges(self):
+    return ProductCityVisibilityUpdater.refresh_expired_edges()
@@ -1,3 +1,253 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import Sum
 from django.test import TestCase
+from django.core.cache import cache
+from django.utils import timezone
+from django.contrib.contenttypes.models import ContentType
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_products.models import Products, ProductImage
+from app_products.ProductCardUpdater import ProductCardUpdater
+from app_products.ProductsQueryFactory import ProductsQueryFactory
+from app_sales_points.models import (
+    City,
+    Warehouse,
+    Stock,
+    Edges,
+    ProductCityVisibility,
+    ProductCityPrice,
+)
+from app_sales_points.CityStats import CityStats
+from app_sales_points.utils import ProductCityVisibilityUpdater
+
+from core.CacheTags import CacheTags
+
+
+class ProductCityVisibilityUpdaterTest(TestCase):
+    """
+    Видимость и цены по городам: склад города и действующие маршруты
+    категории / бренда; истёкшие и выключенные маршруты не учитываются.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.localdate()
+        cls.almaty = City.objects.create(name_city="Алматы")
+        cls.astana = City.objects.create(name_city="Астана")
+        cls.shymkent = City.objects.create(name_city="Шымкент")
+        warehouse = Warehouse.objects.create(
+            name_warehouse="W1", city=cls.almaty, external_id="1"
+        )
+        category = Category.objects.create(name_category="Диваны", slug="divany")
+        brand = Brands.objects.create(name_brand="Brand")
+        cls.product = Products.objects.create(
+            vendor_code="V1", name_product="Диван", category=category, brand=brand
+        )
+        Stock.objects.create(
+            product=cls.product, warehouse=warehouse, quantity=1, price=100
+        )
+        cls.category_edge = Edges.objects.create(
+            edges_name="Алматы - Астана",
+            city_from=cls.almaty,
+            city_to=cls.astana,
+            content_type=ContentType.objects.get_for_model(Category),
+            object_id=category.id,
+            expiration_date=cls.today + datetime.timedelta(days=1),
+        )
+        Edges.objects.create(
+            edges_name="Алматы - Шымкент",
+            city_from=cls.almaty,
+            city_to=cls.shymkent,
+            content_type=ContentType.objects.get_for_model(Brands),
+            object_id=brand.id,
+            expiration_date=cls.today,
+        )
+
+    def setUp(self):
+        cache.delete(ProductCityVisibilityUpdater.EDGES_CHECKED_ON_CACHE_KEY)
+        # on_commit внутри TestCase не срабатывает — таблицы строим явно
+        ProductCityVisibilityUpdater.rebuild_all()
+
+    def cities(self):
+        return set(
+            ProductCityVisibility.objects.filter(product=self.product).values_list(
+                "city__name_city", flat=True
+            )
+        )
+
+    def test_price_row(self):
+        row = ProductCityVisibilityUpdater._price_row(
+            1, 2, [Decimal("250.50"), Decimal("100")], Decimal("10")
+        )
+        self.assertEqual((row.min_price, row.max_price), (100, Decimal("250.50")))
+        self.assertEqual(row.min_price_before_discount, Decimal("110.00"))
+        self.assertEqual(row.max_price_before_discount, Decimal("275.55"))
+
+        row = ProductCityVisibilityUpdater._price_row(1, 2, [Decimal("99.99")], None)
+        self.assertEqual(row.min_price_before_discount, Decimal("99.99"))
+
+    def test_only_active_edges(self):
+        self.assertEqual(self.cities(), {"Алматы", "Астана"})
+        self.assertEqual(
+            set(
+                ProductCityPrice.objects.filter(product=self.product).values_list(
+                    "city__name_city", "min_price"
+                )
+            ),
+            {("Алматы", 100), ("Астана", 100)},
+        )
+
+    def test_inactive_edge(self):
+        Edges.objects.filter(pk=self.category_edge.pk).update(is_active=False)
+        ProductCityVisibilityUpdater.refresh([self.product.pk])
+        self.assertEqual(self.cities(), {"Алматы"})
+
+    def test_refresh_expired_edges(self):
+        tomorrow = self.today + datetime.timedelta(days=1)
+        tag = CacheTags.category(self.product.category_id)
+        before = CacheTags.versions([tag])[tag]
+        with mock.patch.object(timezone, "localdate", return_value=tomorrow):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(
+                    ProductCityVisibilityUpdater.refresh_expired_edges(), 1
+                )
+            self.assertEqual(self.cities(), {"Алматы"})
+            # фрагменты товаров категории выводили истёкший маршрут
+            self.assertNotEqual(CacheTags.versions([tag])[tag], before)
+            self.assertEqual(
+                cache.get(ProductCityVisibilityUpdater.EDGES_CHECKED_ON_CACHE_KEY),
+                tomorrow,
+            )
+            # повторная проверка в тот же день ничего не пересчитывает
+            self.assertEqual(ProductCityVisibilityUpdater.refresh_expired_edges(), 0)
+
+
+class CityStatsTest(TestCase):
+    """Статистика городов одним запросом совпадает с прежним обходом городов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        almaty = City.objects.create(name_city="Алматы")
+        astana = City.objects.create(name_city="Астана")
+        shymkent = City.objects.create(name_city="Шымкент")
+        City.objects.create(name_city="Караганда")
+        warehouses = {
+            city: Warehouse.objects.create(name_warehouse=f"W{city.pk}", city=city)
+            for city in (almaty, astana)
+        }
+        category = Category.objects.create(name_category="Диваны", slug="divany")
+        other = Category.objects.create(name_category="Кресла", slug="kresla")
+        for vendor_code, product_category, stocks in (
+            ("P1", category, {almaty: 3, astana: 2}),
+            ("P2", other, {almaty: 5}),
+            ("P3", other, {astana: 0}),  # не в наличии
+            ("P4", category, {astana: 7}),
+        ):
+            product = Products.objects.create(
+                vendor_code=vendor_code,
+                name_product=vendor_code,
+                category=product_category,
+            )
+            ProductImage.objects.create(
+                product=product, image=f"product_images/{vendor_code}.jpg", ind=1
+            )
+            for city, quantity in stocks.items():
+                Stock.objects.create(
+                    product=product,
+                    warehouse=warehouses[city],
+                    quantity=quantity,
+                    price=100,
+                )
+        # товары категории видны в Шымкенте по маршруту из Алматы
+        Edges.objects.create(
+            edges_name="Алматы - Шымкент",
+            city_from=almaty,
+            city_to=shymkent,
+            content_type=ContentType.objects.get_for_model(Category),
+            object_id=category.id,
+            expiration_date=timezone.localdate() + datetime.timedelta(days=1),
+        )
+        # on_commit внутри TestCase не срабатывает — read model строим явно
+        ProductCardUpdater.rebuild_all()
+        ProductCityVisibilityUpdater.rebuild_all()
+
+    @staticmethod
+    def loop_stats(city):
+        """Прежний расчёт CityViewSet.list: по запросу на город."""
+        visible = ProductsQueryFactory.only_visible_in_city(
+            ProductsQueryFactory.get_all_details(), city.name_city
+        ).annotate(product_quantity=Sum("stocks__quantity"))
+        total_quantity = sum(p.product_quantity or 0 for p in visible)
+        return visible.count(), total_quantity
+
+    def test_matches_loop(self):
+        with self.assertNumQueries(1):
+            cities = list(CityStats.annotate(City.objects.order_by("pk")))
+        stats = {
+            city.name_city: (city.total_products, city.total_quantity)
+            for city in cities
+        }
+        self.assertEqual(
+            stats,
+            {
+                "Алматы": (2, 10),
+                "Астана": (2, 12),
+                "Шымкент": (2, 12),
+                "Караганда": (0, 0),
+            },
+        )
+        for city in cities:
+            with self.subTest(city=city.name_city):
+                self.assertEqual(stats[city.name_city], self.loop_stats(city))
+
+
+class CityRenameInvalidationTest(TestCase):
+    """Название города выводится в остатках и маршрутах товаров."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.almaty = City.objects.create(name_city="Алматы")
+        astana = City.objects.create(name_city="Астана")
+        cls.category = Category.objects.create(name_category="Диваны", slug="divany")
+        cls.stocked = Products.objects.create(vendor_code="V1", name_product="Диван")
+        cls.elsewhere = Products.objects.create(vendor_code="V2", name_product="Стол")
+        Stock.objects.create(
+            product=cls.stocked,
+            warehouse=Warehouse.objects.create(name_warehouse="W1", city=cls.almaty),
+            quantity=1,
+            price=100,
+        )
+        Stock.objects.create(
+            product=cls.elsewhere,
+            warehouse=Warehouse.objects.create(name_warehouse="W2", city=astana),
+            quantity=1,
+            price=100,
+        )
+        Edges.objects.create(
+            edges_name="Алматы - Астана",
+            city_from=cls.almaty,
+            city_to=astana,
+            content_type=ContentType.objects.get_for_model(Category),
+            object_id=cls.category.id,
+            expiration_date=timezone.localdate() + datetime.timedelta(days=1),
+        )
 
-# Create your tests here.
+    def test_rename_invalidates_products_and_edge_targets(self):
+        tags = [
+            CacheTags.product(self.stocked.pk),
+            CacheTags.category(self.category.pk),
+            CacheTags.product(self.elsewhere.pk),
+            CacheTags.CITY_STATS,
+        ]
+        before = CacheTags.versions(tags)
+        self.almaty.name_city = "Алма-Ата"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.almaty.save()
+        after = CacheTags.versions(tags)
+        self.assertEqual(
+            [before[tag] != after[tag] for tag in tags], [True, True, False, True]
+        )
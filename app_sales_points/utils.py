@@ -1,3 +1,52 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from django.core.cache import cache
+from django.db.models import Q
+from django.contrib.contenttypes.models import ContentType
+
+from app_brands.models import Brands
+from app_category.models import Category
+from app_products.models import Products
+from app_products.FacetIndex import FacetIndex
+from app_products.ProductCardUpdater import ProductCardUpdater
+from app_discounts.models import ProductEffectiveDiscount
+from app_sales_points.models import (
+    City,
+    Stock,
+    Edges,
+    ProductCityVisibility,
+    ProductCityPrice,
+)
+
+from core.CacheTags import CacheTags
+
+
+def edge_target_tag(content_type_id, object_id):
+    """Тег кеша категории или бренда, к которым привязан маршрут."""
+    model = ContentType.objects.get_for_id(content_type_id).model_class()
+    if model is Category:
+        return CacheTags.category(object_id)
+    if model is Brands:
+        return CacheTags.brand(object_id)
+    return None
+
+
+def stocks_bulk_changed(product_ids):
+    """
+    То же, что сигналы post_save остатка, для bulk_create / bulk_update
+    (они сигналов не шлют): карточки, видимость и цены по городам,
+    статистика городов. Вызывается внутри транзакции записи.
+    """
+    product_ids = {pk for pk in product_ids if pk}
+    ProductCardUpdater.schedule(product_ids)
+    ProductCityVisibilityUpdater.schedule(product_ids)
+    CacheTags.invalidate([CacheTags.CITY_STATS])
+
+
 class StockUpdater:
     """
     Класс для обновления информации о запасах на основе ребер.
@@ -34,3 +83,222 @@ class StockUpdater:
                     "transportation_cost": edge.transportation_cost,
                     "estimated_delivery_days": edge.estimated_delivery_days,
                 }
+
+
+class ProductCityVisibilityUpdater:
+    """
+    Поддерживает таблицы ProductCityVisibility и ProductCityPrice
+    (обе зависят от остатков, маршрутов и товара; цены — ещё и от скидки).
+    Пересчёт идёт пачками по id товаров, после коммита транзакции.
+    """
+
+    CHUNK_SIZE = 500
+    PRICE_FIELDS = (
+        "min_price",
+        "max_price",
+        "min_price_before_discount",
+        "max_price_before_discount",
+    )
+
+    # До какой даты учтены истёкшие маршруты (refresh_expired_edges)
+    EDGES_CHECKED_ON_CACHE_KEY = "visibility:edges_checked_on"
+    # Первая проверка: маршруты, истёкшие за этот срок
+    DEFAULT_LOOKBACK = timedelta(days=1)
+
+    _local = threading.local()
+
+    @classmethod
+    def schedule(cls, product_ids):
+        """
+        Откладывает пересчёт до коммита текущей транзакции.
+        Все id, накопленные за транзакцию, пересчитываются одной пачкой.
+        """
+        product_ids = {pk for pk in product_ids if pk}
+        if not product_ids:
+            return
+        batch = getattr(cls._local, "batch", None)
+        if batch is None:
+            batch = cls._local.batch = set()
+        batch.update(product_ids)
+        transaction.on_commit(cls._flush)
+
+    @classmethod
+    def _flush(cls):
+        batch = getattr(cls._local, "batch", None)
+        cls._local.batch = None
+        if batch:
+            cls.refresh(batch)
+
+    @classmethod
+    def refresh(cls, product_ids):
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), cls.CHUNK_SIZE):
+            cls._refresh_chunk(product_ids[start : start + cls.CHUNK_SIZE])
+
+    @classmethod
+    def rebuild_all(cls):
+        """Полная перестройка таблицы (первичное заполнение / сверка)."""
+        product_ids = list(Products.objects.values_list("id", flat=True))
+        cls.refresh(product_ids)
+        return len(product_ids)
+
+    @classmethod
+    def refresh_expired_edges(cls, today=None):
+        """
+        Пересчитывает товары маршрутов, у которых с прошлой проверки
+        прошёл expiration_date (истечение сигналов не шлёт), и сдвигает
+        теги их категорий и брендов: маршруты выводятся в stocks товаров
+        (фрагменты ProductFragmentCache, ответы). Возвращает число товаров.
+        """
+        today = today or timezone.localdate()
+        checked_on = cache.get(cls.EDGES_CHECKED_ON_CACHE_KEY) or (
+            today - cls.DEFAULT_LOOKBACK
+        )
+        targets = set(
+            Edges.objects.filter(
+                is_active=True,
+                expiration_date__gt=checked_on,
+                expiration_date__lte=today,
+            ).values_list("content_type_id", "object_id")
+        )
+        product_ids = set()
+        for content_type_id, object_id in targets:
+            product_ids.update(cls.edge_product_ids(content_type_id, object_id))
+        cls.refresh(product_ids)
+        CacheTags.invalidate(edge_target_tag(*target) for target in targets)
+        cache.set(cls.EDGES_CHECKED_ON_CACHE_KEY, today, None)
+        return len(product_ids)
+
+    @staticmethod
+    def edge_product_ids(content_type_id, object_id):
+        """id товаров, которых касается ребро категории или бренда."""
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is Category:
+            return Products.objects.filter(category_id=object_id).values_list(
+                "id", flat=True
+            )
+        if model is Brands:
+            return Products.objects.filter(brand_id=object_id).values_list(
+                "id", flat=True
+            )
+        return []
+
+    @classmethod
+    def _refresh_chunk(cls, product_ids):
+        visible_before = set(
+            ProductCityVisibility.objects.filter(product_id__in=product_ids)
+            .values_list("product_id", "city_id")
+            .distinct()
+        )
+        prices_before = set(
+            ProductCityPrice.objects.filter(product_id__in=product_ids).values_list(
+                "product_id", "city_id", *cls.PRICE_FIELDS
+            )
+        )
+        products = list(
+            Products.objects.filter(pk__in=product_ids).values_list(
+                "pk", "category_id", "brand_id"
+            )
+        )
+        stocks = list(
+            Stock.objects.filter(
+                product_id__in=product_ids, warehouse__city__isnull=False
+            ).values_list("product_id", "warehouse__city_id", "price")
+        )
+        rows = [
+            ProductCityVisibility(
+                product_id=product_id,
+                city_id=city_id,
+                source=ProductCityVisibility.SOURCE_STOCK,
+            )
+            for product_id, city_id in {(row[0], row[1]) for row in stocks}
+        ]
+        # Цены: город склада, а по маршруту в город — цены всех складов
+        product_prices = {}
+        city_prices = {}
+        for product_id, city_id, price in stocks:
+            if price and price > 0:
+                product_prices.setdefault(product_id, []).append(price)
+                city_prices.setdefault((product_id, city_id), []).append(price)
+
+        category_type = ContentType.objects.get_for_model(Category)
+        brand_type = ContentType.objects.get_for_model(Brands)
+        edges = {}
+        category_ids = {category_id for _, category_id, _ in products if category_id}
+        brand_ids = {brand_id for _, _, brand_id in products if brand_id}
+        # Действующие маршруты — как в ProductsQueryFactory.with_category_edges
+        for edge in Edges.objects.filter(
+            Q(content_type=category_type, object_id__in=category_ids)
+            | Q(content_type=brand_type, object_id__in=brand_ids),
+            is_active=True,
+            expiration_date__gt=timezone.localdate(),
+        ):
+            edges.setdefault((edge.content_type_id, edge.object_id), []).append(edge)
+
+        for product_id, category_id, brand_id in products:
+            for edge in edges.get((category_type.id, category_id), []) + edges.get(
+                (brand_type.id, brand_id), []
+            ):
+                rows.append(
+                    ProductCityVisibility(
+                        product_id=product_id,
+                        city_id=edge.city_to_id,
+                        source=ProductCityVisibility.SOURCE_EDGE,
+                        edge=edge,
+                        estimated_delivery_days=edge.estimated_delivery_days,
+                        transportation_cost=edge.transportation_cost,
+                    )
+                )
+                if product_id in product_prices:
+                    city_prices.setdefault((product_id, edge.city_to_id), []).extend(
+                        product_prices[product_id]
+                    )
+
+        discounts = dict(
+            ProductEffectiveDiscount.objects.filter(
+                product_id__in=product_ids
+            ).values_list("product_id", "amount")
+        )
+        price_rows = [
+            cls._price_row(product_id, city_id, prices, discounts.get(product_id))
+            for (product_id, city_id), prices in city_prices.items()
+        ]
+
+        with transaction.atomic():
+            ProductCityVisibility.objects.filter(product_id__in=product_ids).delete()
+            ProductCityVisibility.objects.bulk_create(rows)
+            ProductCityPrice.objects.filter(product_id__in=product_ids).delete()
+            ProductCityPrice.objects.bulk_create(price_rows)
+
+        # Кеш ответов по городам, где товары появились, пропали или сменили цену
+        visible_after = {(row.product_id, row.city_id) for row in rows}
+        prices_after = {
+            (row.product_id, row.city_id, *(getattr(row, f) for f in cls.PRICE_FIELDS))
+            for row in price_rows
+        }
+        changed = {row[:2] for row in visible_before ^ visible_after} | {
+            row[:2] for row in prices_before ^ prices_after
+        }
+        FacetIndex.feed.publish(product_id for product_id, _ in changed)
+        changed_cities = {city_id for _, city_id in changed}
+        if changed_cities:
+            CacheTags.invalidate(
+                CacheTags.city(name)
+                for name in City.objects.filter(pk__in=changed_cities).values_list(
+                    "name_city", flat=True
+                )
+            )
+
+    @staticmethod
+    def _price_row(product_id, city_id, prices, discount_amount):
+        """Строка ProductCityPrice; цена до скидки — как price_before_discount ответа."""
+        factor = 1 + Decimal(discount_amount or 0) / 100
+        cent = Decimal("0.01")
+        return ProductCityPrice(
+            product_id=product_id,
+            city_id=city_id,
+            min_price=min(prices),
+            max_price=max(prices),
+            min_price_before_discount=(min(prices) * factor).quantize(cent),
+            max_price_before_discount=(max(prices) * factor).quantize(cent),
+        )
@@ -1,12 +1,12 @@
-from django.http import JsonResponse
-from django.db.models import Min, Max, Count, Sum
+from django.http import JsonResponse, Http404
+from django.db.models import Min, Max
 from django.contrib.contenttypes.models import ContentType
 
 from rest_framework import viewsets
 from rest_framework.response import Response
 
 from app_sales_points.models import Stock, City
-from app_category.models import Category
+from app_category.CategoryTree import CategoryTree
 from app_products.models import Products
 from app_sales_points.serializers import (
     StockSerializer,
@@ -14,8 +14,9 @@ from app_sales_points.serializers import (
     CitySerializer,
 )
 
-from app_products.ProductsQueryFactory import ProductsQueryFactory
-from app_products.views_v2 import ProductsViewSet_v2
+from app_sales_points.CityStats import CityStats
+
+from core.CacheTags import cache_tagged
 
 
 # class CityViewSet(viewsets.ReadOnlyModelViewSet):
@@ -42,16 +43,14 @@ class StocksViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
     def get_prices_by_category(self, request, cat_pk):
-        # Получаем категорию и все её подкатегории
-        descendant_categories = (
-            Category.objects.get(pk=cat_pk)
-            .get_descendants(include_self=True)
-            .values_list("id", flat=True)
-        )
+        # Категория и все её подкатегории — из дерева в памяти
+        category = CategoryTree.get().by_id(int(cat_pk))
+        if category is None:
+            raise Http404
 
         # Получаем продукты из этих категорий
         product_ids = Products.objects.filter(
-            category_id__in=descendant_categories
+            category_id__in=category.descendant_ids
         ).values_list("id", flat=True)
 
         # Получаем цены на эти продукты, группируя по городам складов
@@ -85,6 +84,15 @@ def get_objects(request):
 
 class CityViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = CitySerializer
+    # Действия, ответы которых кешируются по тегам
+    cached_actions = {"list"}
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if actions and set(actions.values()) <= cls.cached_actions:
+            return cache_tagged()(view)
+        return view
 
     def get_queryset(self):
         # Базово вернём все города (потом в list() аннотируем их полями)
@@ -94,51 +102,12 @@ class CityViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Возвращает список городов, где у каждого города указано:
         - total_products: количество уникальных товаров, которые видны в этом городе (с учётом рёбер)
-        - total_quantity: суммарный остаток по всем видимым товарам (т.е. те склады, которые физически в городе ИЛИ в городах, из которых есть ребро?)
-          *в примере ниже — мы считаем сумму остатков только там, где физически хранится товар.
-           Но если нужно учитывать "виртуальные" остатки, это спорный момент: возможно, нужно считать только склады, физически находящиеся в "своём" городе,
-           или же суммировать склады "чужих" городов, если есть ребро?
+        - total_quantity: суммарный остаток этих товаров по всем складам
+          (товар, видимый по ребру, приносит остатки складов других городов)
+        Все города считаются одним запросом (CityStats).
         """
-        cities = self.get_queryset()
-
-        # Собираем аннотированный результат в формате city_id -> {...}
-        city_stats = {}
-        # Чтобы оптимизировать работу с товарами, возьмём базовый общий QuerySet:
-        base_products_qs = ProductsQueryFactory.get_all_details()
-
-        for city in cities:
-            city_name = str(city.name_city)
-            # 1) Все товары, доступные в этом городе
-            visible_qs = ProductsViewSet_v2().filter_by_city_and_edges(
-                base_products_qs, city_name
-            )
-            # 2) Аннотируем (на уровне Product) сумму остатков. Важно: физический склад лежит
-            #    в "warehouse__city"? Но какие города считаем?
-            #    - Обычно, если товар виден "по ребру", значит склад в другом городе, но всё равно товар "доступен".
-            #    - Тогда sum_quantity — это сумма всех складов у этого товара.
-            #      (Если хотите считать только "физические" остатки, нужно аккуратнее.)
-            visible_qs = visible_qs.annotate(product_quantity=Sum("stocks__quantity"))
-
-            total_products = visible_qs.count()  # кол-во уникальных товаров
-            # Суммарная quantity всех видимых товаров (физ. остатки складов, где бы они ни были)
-            total_quantity = 0
-            for prod in visible_qs:
-                total_quantity += prod.product_quantity or 0
-
-            city_stats[city.id] = {
-                "total_products": total_products,
-                "total_quantity": total_quantity,
-            }
-
-        # Теперь сериализуем города
-        serializer = self.get_serializer(cities, many=True)
-        data = serializer.data
-
-        # Подмешиваем цифры из city_stats
-        for item in data:
-            c_id = item["id"]
-            stats = city_stats.get(c_id, {"total_products": 0, "total_quantity": 0})
-            item["total_products"] = stats["total_products"]
-            item["total_quantity"] = stats["total_quantity"]
-
+        cities = CityStats.get_cities()
+        data = self.get_serializer(cities, many=True).data
+        for item, city in zip(data, cities):
+            item["total_quantity"] = city.total_quantity
         return Response(data)
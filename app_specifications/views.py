@@ -1,10 +1,10 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
 
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 
 from app_specifications.models import Specifications
-from app_category.models import Category
+from app_category.CategoryTree import CategoryTree
 from app_specifications.serializers import SpecificationsSerializer
 
 
@@ -20,16 +20,14 @@ class SpecificationsViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
     def filter_specif_by_category(self, **category_filter):
-        # Получаем категорию по заданному фильтру (id или slug)
-        category = get_object_or_404(Category, **category_filter)
-        # Находим все подкатегории
-        descendant_categories = category.get_descendants(include_self=True).values_list(
-            "id", flat=True
-        )
+        # Категория и все её подкатегории — из дерева в памяти
+        category = CategoryTree.get().find(**category_filter)
+        if category is None:
+            raise Http404
         # Фильтруем характеристики по этим категориям
         brands = (
             Specifications.objects.filter(
-                product__category__id__in=descendant_categories
+                product__category__id__in=category.descendant_ids
             )
             .distinct()
             .order_by("name_specification")
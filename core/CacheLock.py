@@ -0,0 +1,49 @@
+import uuid
+
+from django.core.cache import cache
+
+
+class CacheLock:
+    """
+    Блокировка в общем кеше (SET NX в Redis) с токеном владельца.
+
+    Снимает блокировку только тот, кто её взял: если она истекла по
+    timeout и её уже взял другой процесс, release() её не тронет.
+    В Redis проверка и удаление — один Lua-скрипт; в других бэкендах
+    кеша (тесты) — get + delete.
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, key, timeout):
+        self.key = key
+        self.timeout = timeout
+        self.token = None
+
+    def acquire(self):
+        token = uuid.uuid4().hex
+        if not cache.add(self.key, token, self.timeout):
+            return False
+        self.token = token
+        return True
+
+    def release(self):
+        token, self.token = self.token, None
+        if token is None:
+            return
+        client = getattr(cache, "client", None)
+        if hasattr(client, "get_client"):
+            # django_redis: ключ и значение в том виде, в каком их пишет cache.add
+            client.get_client(write=True).eval(
+                self.RELEASE_SCRIPT,
+                1,
+                client.make_key(self.key),
+                client.encode(token),
+            )
+        elif cache.get(self.key) == token:
+            cache.delete(self.key)
@@ -0,0 +1,350 @@
+import time
+import logging
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from core.CacheLock import CacheLock
+
+logger = logging.getLogger(__name__)
+
+# Записи инвалидируются по тегам, жёсткий TTL — лишь страховка;
+# после мягкого TTL запись обновляется в фоне
+RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+RESPONSE_CACHE_SOFT_TIMEOUT = 60 * 15
+
+
+class CacheTags:
+    """
+    Теги кеша ответов с версиями.
+
+    У каждого тега (product:42, category:7, city:Алматы …) в кеше хранится
+    счётчик версии. Запись кеша ответа помнит версии своих тегов на момент
+    сохранения и считается устаревшей, как только версия любого тега
+    изменилась. Инвалидация — увеличение счётчика после коммита транзакции,
+    сами записи не ищутся и не удаляются.
+    """
+
+    KEY_PREFIX = "cache_tag:"
+    # Состав видимых товаров (карточки появились / пропали из выдачи)
+    PRODUCTS = "products"
+    # Набор «Популярные товары»
+    POPULAR_SET = "popular_set"
+    # Структура дерева категорий (app_category.CategoryTree)
+    CATEGORY_TREE = "category_tree"
+    # Остатки на складах и список городов (app_sales_points.CityStats)
+    CITY_STATS = "city_stats"
+    # Категории, бренды и теги в подсказках поиска (app_products.SuggestIndex)
+    SEARCH_DICTIONARIES = "search_dictionaries"
+    # Названия категорий, брендов, характеристик и городов в фасетах
+    # (app_products.FacetIndex)
+    FACET_DICTIONARIES = "facet_dictionaries"
+
+    _collector = ContextVar("cache_tags_collector", default=None)
+
+    @staticmethod
+    def product(pk):
+        return f"product:{pk}"
+
+    @staticmethod
+    def category(pk):
+        return f"category:{pk}"
+
+    @staticmethod
+    def brand(pk):
+        return f"brand:{pk}"
+
+    @staticmethod
+    def city(name):
+        return f"city:{name}"
+
+    @classmethod
+    def for_products(cls, products):
+        """Теги товаров, а также их категорий и брендов."""
+        tags = set()
+        for product in products:
+            tags.add(cls.product(product.pk))
+            if product.category_id:
+                tags.add(cls.category(product.category_id))
+            if product.brand_id:
+                tags.add(cls.brand(product.brand_id))
+        return tags
+
+    # ------------------------------------------------------------------ #
+    # Сбор тегов во время обработки запроса
+    # ------------------------------------------------------------------ #
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        """
+        Всё, что передано в add() внутри блока, попадает в словарь
+        {тег: версия}. Версия читается при первом add() тега — до того,
+        как сдвинется инвалидацией данных, прочитанных после него.
+        """
+        tags = {}
+        token = cls._collector.set(tags)
+        try:
+            yield tags
+        finally:
+            cls._collector.reset(token)
+
+    @classmethod
+    def is_collecting(cls):
+        return cls._collector.get() is not None
+
+    @classmethod
+    def add(cls, *tags):
+        collector = cls._collector.get()
+        if collector is not None:
+            new = {tag for tag in tags if tag and tag not in collector}
+            if new:
+                collector.update(cls.versions(new))
+
+    @classmethod
+    def add_products(cls, products):
+        if cls.is_collecting():
+            cls.add(*cls.for_products(products))
+
+    # ------------------------------------------------------------------ #
+    # Версии
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def versions(cls, tags):
+        """{тег: версия}; отсутствующим тегам назначается новая версия."""
+        keys = {cls.KEY_PREFIX + tag: tag for tag in tags}
+        found = cache.get_many(list(keys))
+        for key in keys.keys() - found.keys():
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        return {tag: found[key] for key, tag in keys.items()}
+
+    @classmethod
+    def invalidate(cls, tags):
+        """Сдвигает версии тегов после коммита текущей транзакции."""
+        tags = {tag for tag in tags if tag}
+        if tags:
+            transaction.on_commit(lambda: cls._bump(tags))
+
+    @classmethod
+    def _bump(cls, tags):
+        for tag in tags:
+            key = cls.KEY_PREFIX + tag
+            try:
+                cache.incr(key)
+            except ValueError:
+                # тега ещё нет (или он вытеснен) — любая новая версия подходит
+                cache.set(key, time.time_ns(), None)
+
+
+class TaggedResponseCache:
+    """
+    Кеш ответов представления с тегами, мягким и жёстким TTL.
+
+    - Свежая запись отдаётся сразу.
+    - Запись старше soft_timeout тоже отдаётся сразу, а пересчитывает её
+      в фоновом потоке один процесс (остальные продолжают отдавать старую).
+    - Запись, инвалидированная тегами, пересчитывает и сохраняет один
+      процесс; остальные не ждут его и строят ответ сами, без записи
+      (инвалидированная запись не отдаётся никогда).
+    Единственность пересчёта обеспечивает CacheLock (SET NX в Redis) —
+    общая для всех воркеров uvicorn.
+
+    Ответы несут ETag (хеш содержимого) и Last-Modified (когда содержимое
+    последний раз изменилось). Условный запрос к актуальной записи
+    получает 304 без построения queryset.
+    """
+
+    KEY_PREFIX = "tagged_response:"
+    # Заголовки, которые пишутся заново при каждой отдаче из кеша
+    SKIP_HEADERS = {"content-type", "content-length", "etag", "last-modified", "date"}
+    LOCK_PREFIX = "tagged_response_lock:"
+    # Блокировка снимается после пересчёта; TTL — на случай падения процесса
+    LOCK_TIMEOUT = 60
+
+    def __init__(self, view_func, timeout, soft_timeout):
+        self.view_func = view_func
+        self.timeout = timeout
+        self.soft_timeout = soft_timeout
+
+    def __call__(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return self.view_func(request, *args, **kwargs)
+
+        key = self.get_key(request)
+        entry = self.get_entry(key)
+        if entry is not None and self.is_valid(entry):
+            if self.is_soft_expired(entry):
+                lock = self.acquire(key)
+                if lock is not None:
+                    self.refresh_in_background(key, lock, request, args, kwargs)
+            return self.to_response(entry, request)
+
+        lock = self.acquire(key)
+        if lock is None:
+            # Пересчитывает другой процесс: не ждём его и не блокируем поток
+            return self.view_func(request, *args, **kwargs)
+        return self.compute(key, lock, request, args, kwargs)
+
+    # ------------------------------------------------------------------ #
+    # Записи
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def get_key(cls, request):
+        # Как и cache_page: URL + заголовок Accept (DRF выбирает рендерер по нему)
+        raw = f"{request.build_absolute_uri()}|{request.META.get('HTTP_ACCEPT', '')}"
+        return cls.KEY_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+    @staticmethod
+    def get_entry(key):
+        """Запись кеша; записи прежнего формата (без ETag) — промах."""
+        entry = cache.get(key)
+        if not isinstance(entry, dict) or entry.get("etag") is None:
+            return None
+        return entry
+
+    @staticmethod
+    def is_valid(entry):
+        return CacheTags.versions(entry["tags"]) == entry["tags"]
+
+    def is_soft_expired(self, entry):
+        return time.time() - entry["stored_at"] > self.soft_timeout
+
+    @staticmethod
+    def to_response(entry, request):
+        """
+        Ответ из записи кеша с заголовками представления (Vary, Allow …);
+        на If-None-Match / If-Modified-Since отвечает 304 — актуальность
+        записи уже проверена по версиям тегов.
+        """
+        response = HttpResponse(entry["content"], content_type=entry["content_type"])
+        for name, value in entry.get("headers", ()):
+            response[name] = value
+        # Ключ записи зависит от Accept — downstream-кеши должны это знать
+        patch_vary_headers(response, ["Accept"])
+        response["ETag"] = entry["etag"]
+        response["Last-Modified"] = http_date(entry["last_modified"])
+        return get_conditional_response(
+            request, entry["etag"], entry["last_modified"], response
+        )
+
+    def compute(self, key, lock, request, args, kwargs):
+        """
+        Строит ответ, сохраняет его после рендера и снимает блокировку
+        lock — её должен держать вызывающий. На условный запрос,
+        совпавший с построенным ответом, отвечает 304.
+        """
+        try:
+            with CacheTags.collect() as tags:
+                response = self.view_func(request, *args, **kwargs)
+        except Exception:
+            lock.release()
+            raise
+
+        if response.status_code != 200 or response.streaming:
+            lock.release()
+            return response
+        versions = dict(tags)
+
+        def store(response):
+            try:
+                etag = quote_etag(hashlib.md5(response.content).hexdigest())
+                previous = self.get_entry(key)
+                # Last-Modified сдвигается, только если изменилось содержимое
+                if previous is not None and previous["etag"] == etag:
+                    last_modified = previous["last_modified"]
+                else:
+                    last_modified = int(time.time())
+                response["ETag"] = etag
+                response["Last-Modified"] = http_date(last_modified)
+                # Тег инвалидирован, пока строился ответ: данные могли
+                # прочитаться до коммита — не сохраняем
+                if CacheTags.versions(versions) == versions:
+                    cache.set(
+                        key,
+                        {
+                            "tags": versions,
+                            "content": response.content,
+                            "content_type": response["Content-Type"],
+                            # Vary, Allow и прочие заголовки представления
+                            "headers": [
+                                (name, value)
+                                for name, value in response.items()
+                                if name.lower() not in self.SKIP_HEADERS
+                            ],
+                            "etag": etag,
+                            "last_modified": last_modified,
+                            "stored_at": time.time(),
+                        },
+                        self.timeout,
+                    )
+            finally:
+                lock.release()
+            return get_conditional_response(request, etag, last_modified, response)
+
+        if hasattr(response, "render") and not response.is_rendered:
+            # ответ, возвращённый callback, заменяет отрендеренный
+            response.add_post_render_callback(store)
+            return response
+        return store(response)
+
+    def refresh_in_background(self, key, lock, request, args, kwargs):
+        clone = self.clone_request(request)
+
+        def run():
+            try:
+                response = self.compute(key, lock, clone, args, kwargs)
+                if hasattr(response, "render") and not response.is_rendered:
+                    response.render()
+            except Exception:
+                logger.exception("Фоновый пересчёт кеша %s не удался", key)
+            finally:
+                # у потока свои соединения с БД — закрываем их
+                connections.close_all()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    @staticmethod
+    def clone_request(request):
+        """Копия GET-запроса, не связанная с уже отданным ответом."""
+        clone = HttpRequest()
+        clone.method = "GET"
+        clone.path = request.path
+        clone.path_info = request.path_info
+        clone.META = request.META.copy()
+        clone.GET = request.GET.copy()
+        clone.COOKIES = dict(request.COOKIES)
+        clone.resolver_match = request.resolver_match
+        return clone
+
+    # ------------------------------------------------------------------ #
+    # Блокировка пересчёта
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def acquire(cls, key):
+        """CacheLock пересчёта записи key или None, если её уже держат."""
+        lock = CacheLock(cls.LOCK_PREFIX + key, cls.LOCK_TIMEOUT)
+        return lock if lock.acquire() else None
+
+
+def cache_tagged(
+    timeout=RESPONSE_CACHE_TIMEOUT, soft_timeout=RESPONSE_CACHE_SOFT_TIMEOUT
+):
+    """
+    Замена cache_page: ответ кешируется вместе с версиями тегов,
+    собранных во время его построения (CacheTags.add / add_products).
+    Запись действует до истечения timeout или до инвалидации любого тега;
+    после soft_timeout она обновляется в фоне (см. TaggedResponseCache).
+    """
+
+    def decorator(view_func):
+        return wraps(view_func)(TaggedResponseCache(view_func, timeout, soft_timeout))
+
+    return decorator
@@ -0,0 +1,102 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+class ChangeFeed:
+    """
+    Лента изменений поверх общего кеша (Redis): пронумерованные пачки id
+    изменённых объектов. Нужна индексам в памяти процесса, которые
+    обновляются по изменениям, а не перестраиваются целиком.
+
+    Писатель после коммита увеличивает номер и кладёт пачку под этим номером.
+    Читатель помнит последний применённый номер и забирает пачки после него.
+    Если пачки уже вытеснены, номер сбросился (очистка кеша) или в ленту
+    записан сброс (reset) — читатель получает None и перестраивает
+    индекс полностью.
+    """
+
+    KEY_PREFIX = "change_feed:"
+    # Сколько живут пачки; отставший дольше процесс перестроит индекс
+    TIMEOUT = 60 * 60
+    # Больше пачек за раз не читаем — дешевле перестроить индекс
+    MAX_LAG = 1000
+    # Номер уже выдан, а пачка ещё не записана: столько ждём её
+    GRACE = 5.0
+    RESET = "*"
+
+    def __init__(self, name):
+        self.name = name
+        self.seq_key = f"{self.KEY_PREFIX}{name}:seq"
+        self.missing_since = None
+
+    def entry_key(self, seq):
+        return f"{self.KEY_PREFIX}{self.name}:{seq}"
+
+    # ------------------------------------------------------------------ #
+    # Запись
+    # ------------------------------------------------------------------ #
+    def publish(self, ids):
+        """Добавляет пачку id после коммита текущей транзакции."""
+        ids = sorted({pk for pk in ids if pk})
+        if ids:
+            transaction.on_commit(lambda: self._append(ids))
+
+    def reset(self):
+        """Просит читателей перестроить индекс полностью."""
+        transaction.on_commit(lambda: self._append(self.RESET))
+
+    def _append(self, entry):
+        cache.add(self.seq_key, 0, None)
+        try:
+            seq = cache.incr(self.seq_key)
+        except ValueError:
+            # ключ вытеснен между add и incr — читатели увидят разрыв
+            cache.set(self.seq_key, 1, None)
+            seq = 1
+        cache.set(self.entry_key(seq), entry, self.TIMEOUT)
+
+    # ------------------------------------------------------------------ #
+    # Чтение
+    # ------------------------------------------------------------------ #
+    def current(self):
+        return cache.get(self.seq_key) or 0
+
+    def read(self, since):
+        """
+        Изменения после номера since: (номер, множество id).
+        (номер, None) — индекс нужно перестроить полностью.
+        """
+        seq = self.current()
+        if seq == since:
+            return since, set()
+        if seq < since or seq - since > self.MAX_LAG:
+            return seq, None
+
+        entries = cache.get_many([self.entry_key(n) for n in range(since + 1, seq + 1)])
+        ids = set()
+        applied = since
+        for n in range(since + 1, seq + 1):
+            entry = entries.get(self.entry_key(n))
+            if entry is None:
+                return self._on_missing(n, applied, ids, seq)
+            if entry == self.RESET:
+                return seq, None
+            ids.update(entry)
+            applied = n
+        self.missing_since = None
+        return applied, ids
+
+    def _on_missing(self, n, applied, ids, seq):
+        """
+        Пачки n нет: она либо ещё пишется (номер выдан раньше записи),
+        либо вытеснена. Первые GRACE секунд считаем, что пишется.
+        """
+        now = time.monotonic()
+        if self.missing_since is None or self.missing_since[0] != n:
+            self.missing_since = (n, now)
+        if now - self.missing_since[1] > self.GRACE:
+            self.missing_since = None
+            return seq, None
+        return applied, ids
@@ -1,6 +1,15 @@
 import json
 from django.apps import apps
+from django.db import transaction
 
+from app_brands.models import Brands
+from app_category.models import Category
+from app_products.models import Products
+from app_products.SearchVectorUpdater import SearchVectorUpdater
+from app_sales_points.models import City
+from app_specifications.models import NameSpecifications, ValueSpecifications
+
+from core.CacheTags import CacheTags
 from core.RabbitMQRepository import RabbitMQRepository
 
 
@@ -46,13 +55,38 @@ class TranslationUpdateService:
         if isinstance(target_data, dict):
             target_data[target_lang] = translated_text
             # Обновляем поле без вызова save() для предотвращения зацикливания
-            model.objects.filter(id=instance_id).update(**{target_field: target_data})
+            with transaction.atomic():
+                model.objects.filter(id=instance_id).update(
+                    **{target_field: target_data}
+                )
+                self.translation_updated(model, instance, target_field)
             print(f"✅ Обновлено: {instance}")
         else:
             print(f"❌ Поле '{target_field}' не является JSONField")
 
         channel.basic_ack(delivery_tag=method.delivery_tag)
 
+    @staticmethod
+    def translation_updated(model, instance, target_field):
+        """
+        update() не шлёт post_save: пересчитываем то, что сигналы модели
+        обновили бы при сохранении перевода, — вектор поиска и кеш ответов.
+        """
+        if model in SearchVectorUpdater.SOURCE_FIELDS:
+            SearchVectorUpdater.schedule(model, [instance.pk], [target_field])
+        tags = []
+        if isinstance(instance, Products):
+            tags.extend(CacheTags.for_products([instance]))
+        elif isinstance(instance, Category):
+            tags += [CacheTags.category(instance.pk), CacheTags.FACET_DICTIONARIES]
+        elif isinstance(instance, Brands):
+            tags += [CacheTags.brand(instance.pk), CacheTags.FACET_DICTIONARIES]
+        elif isinstance(instance, (NameSpecifications, ValueSpecifications)):
+            tags.append(CacheTags.FACET_DICTIONARIES)
+        elif isinstance(instance, City):
+            tags += [CacheTags.city(instance.name_city), CacheTags.CITY_STATS]
+        CacheTags.invalidate(tags)
+
     def start_consumer(self):
         channel = self.rabbitmq_repo.connect()
         channel.basic_consume(
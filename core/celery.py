@@ -21,6 +21,31 @@ app.conf.update(
 
 app.autodiscover_tasks()
 
+# DatabaseScheduler переносит эти записи в django_celery_beat при старте beat
+app.conf.beat_schedule = {
+    "refresh-discount-windows": {
+        "task": "Пересчитать скидки на границах периодов действия",
+        "schedule": 60.0,  # скидки включаются/выключаются с точностью до минуты
+    },
+    "refresh-expired-edges": {
+        "task": "Пересчитать видимость товаров по истёкшим маршрутам",
+        # срок действия маршрута — дата; вскоре после полуночи истёкшие
+        # маршруты пропадают из цен, фрагментов товаров и ответов
+        "schedule": 60.0 * 10,
+    },
+    "warm-search-cache": {
+        "task": "Прогреть кеш частых поисковых запросов",
+        # чаще половины SearchResultCache.TIMEOUT: записи частых запросов
+        # пересчитываются раньше, чем устареют у пользователя
+        "schedule": 60.0 * 5,
+    },
+    "sync-elastic-indexes": {
+        "task": "Синхронизировать индексы Elasticsearch",
+        # изменения остатков и цен попадают в поиск за секунды
+        "schedule": 5.0,
+    },
+}
+
 # celery -A core.celery worker -l info -c 2 -P eventlet
 # celery -A core beat -l info
 # celery -A core flower
@@ -82,3 +82,56 @@ class CustomAdminFileWidget(AdminFileWidget):
             )
         result.append(super().render(name, value, attrs, renderer))
         return format_html("".join(result))
+
+
+class SparseFieldsetsMixin:
+    """
+    Миксин сериализатора: выбор полей через ?fields=a,b,c и/или ?omit=x,y.
+    Неизвестные имена полей игнорируются (если в ?fields= нет ни одного
+    известного — как без параметра), порядок полей берётся из Meta.fields.
+    context["default_fields"] задаёт набор полей, если параметры не переданы.
+    Поля из Meta.opt_in_fields выводятся, только если их запросили
+    в ?fields= или они есть в default_fields.
+    """
+
+    fields_query_param = "fields"
+    omit_query_param = "omit"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.get_requested_fields(
+            self.context.get("request"), self.context.get("default_fields")
+        )
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_requested_fields(cls, request, default=None):
+        """
+        Итоговый список полей по параметрам запроса, иначе default
+        (None — выбор полей не задан, выводятся все).
+        """
+        fields, omit = set(), set()
+        if request is not None:
+            params = getattr(request, "query_params", request.GET)
+            fields = cls._split_param(params.get(cls.fields_query_param))
+            fields &= set(cls.Meta.fields)
+            omit = cls._split_param(params.get(cls.omit_query_param))
+        if not fields and default is not None:
+            fields = set(default)
+        opt_in = set(getattr(cls.Meta, "opt_in_fields", ()))
+        if not fields and not omit and not opt_in:
+            return None
+        selected = [
+            name
+            for name in cls.Meta.fields
+            if (name in fields if fields else name not in opt_in)
+        ]
+        return [name for name in selected if name not in omit]
+
+    @staticmethod
+    def _split_param(value):
+        if not value:
+            return set()
+        return {name.strip() for name in value.split(",") if name.strip()}
@@ -0,0 +1,128 @@
+import re
+
+import orjson
+
+from django.http import StreamingHttpResponse
+
+from rest_framework.renderers import JSONRenderer
+
+
+class JSONFragment:
+    """Готовый кусок JSON (bytes), который рендерер вставляет как есть."""
+
+    __slots__ = ("content",)
+
+    def __init__(self, content):
+        self.content = content
+
+    def __repr__(self):
+        return f"<JSONFragment {self.content[:40]!r}>"
+
+
+class FragmentJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, понимающий JSONFragment: фрагмент заменяется меткой
+    при кодировании, а затем метка — байтами фрагмента (одним проходом).
+    Для данных без фрагментов вывод совпадает с JSONRenderer.
+    """
+
+    MARK = "\x00json_fragment:"
+    MARK_RE = re.compile(rb'"\\u0000json_fragment:(\d+)\\u0000"')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        fragments = []
+        mark = self.MARK
+
+        class FragmentEncoder(self.encoder_class):
+            def default(self, obj):
+                if isinstance(obj, JSONFragment):
+                    fragments.append(obj.content)
+                    return f"{mark}{len(fragments) - 1}\x00"
+                return super().default(obj)
+
+        # Рендерер создаётся на каждый ответ — подмена энкодера локальна
+        self.encoder_class = FragmentEncoder
+        try:
+            content = super().render(data, accepted_media_type, renderer_context)
+        finally:
+            del self.encoder_class
+        if not fragments:
+            return content
+        return self.MARK_RE.sub(lambda m: fragments[int(m.group(1))], content)
+
+
+class ORJSONRenderer(FragmentJSONRenderer):
+    """
+    Рендерер по умолчанию: компактный JSON через orjson.
+
+    Типы, которых orjson не знает (Decimal, lazy-строки, QuerySet …),
+    и даты приводятся энкодером DRF, поэтому после разбора вывод равен
+    выводу JSONRenderer. Побайтно отличается запись некоторых float:
+    orjson пишет 1e16 и 0.00001, стандартный json — 1e+16 и 1e-05.
+    С отступами (?indent=, Browsable API) и без UNICODE_JSON рендерит
+    родитель.
+    """
+
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        fragments = []
+        fallback = self.encoder_class().default
+
+        def default(obj):
+            if isinstance(obj, JSONFragment):
+                fragments.append(obj.content)
+                return f"{self.MARK}{len(fragments) - 1}\x00"
+            return fallback(obj)
+
+        try:
+            content = orjson.dumps(data, default=default, option=self.OPTIONS)
+        except orjson.JSONEncodeError:
+            # например, int за пределами 64 бит — стандартный энкодер справится
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как JSONRenderer: U+2028 / U+2029 недопустимы в JavaScript-строках
+        if b"\xe2\x80\xa8" in content or b"\xe2\x80\xa9" in content:
+            content = content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        if not fragments:
+            return content
+        return self.MARK_RE.sub(lambda m: fragments[int(m.group(1))], content)
+
+
+class StreamingJSONArrayResponse(StreamingHttpResponse):
+    """
+    JSON-массив, который отдаётся по частям по мере чтения из базы.
+
+    Принимает QuerySet'ы (обычно values_list(..., flat=True)); они
+    читаются через aiterator() — серверным курсором, пачками по
+    chunk_size, — и идут в ответ подряд, как один массив. Память
+    процесса не зависит от размера выборки (под ASGI; WSGI-сервер
+    соберёт асинхронный поток целиком).
+    """
+
+    def __init__(self, *querysets, chunk_size=2000, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(self.stream(querysets, chunk_size), **kwargs)
+
+    @staticmethod
+    async def stream(querysets, chunk_size):
+        yield b"["
+        separator = b""
+        buffer = []
+        for queryset in querysets:
+            async for item in queryset.aiterator(chunk_size=chunk_size):
+                buffer.append(orjson.dumps(item, option=ORJSONRenderer.OPTIONS))
+                if len(buffer) >= chunk_size:
+                    yield separator + b",".join(buffer)
+                    separator = b","
+                    buffer.clear()
+        if buffer:
+            yield separator + b",".join(buffer)
+        yield b"]"
@@ -61,7 +61,7 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt",
     "django_celery_results",
     "django_celery_beat",
-    # "django_elasticsearch_dsl",
+    "django_elasticsearch_dsl",
     "autocompletefilter",
     "silk",
     "django.contrib.postgres",
@@ -80,7 +80,7 @@ INSTALLED_APPS = [
     "app_discounts",
     "app_services",
     "app_kaspi",  # приложение без регистрации в админке
-    # "app_elastic",  # приложение без регистрации в админке
+    "app_elastic",  # приложение без регистрации в админке
     "app_orders",
     "app_external_products",
     # для работы с изображениями
@@ -226,6 +226,11 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    # orjson + вставка готовых JSON-фрагментов товаров
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
 SIMPLE_JWT = {
@@ -244,16 +249,21 @@ CACHES = {
     },
 }
 
-# ELASTICSEARCH_DSL = {
-#     "default": {
-#         "hosts": os.getenv("HOST"),
-#         "timeout": 30,  # Увеличьте время ожидания, например, до 30 секунд
-#         "retry_on_timeout": True,  # Включите повторную попытку при тайм-ауте
-#         "max_retries": 3,  # Установите количество повторных попыток
-#         # "http_auth": ("elastic", "YOUR_PASSWORD"),
-#         # "ca_certs": "PATH_TO_http_ca.crt",
-#     }
-# }
+ELASTICSEARCH_DSL = {
+    "default": {
+        "hosts": os.getenv("HOST"),
+        "timeout": 30,  # Увеличьте время ожидания, например, до 30 секунд
+        "retry_on_timeout": True,  # Включите повторную попытку при тайм-ауте
+        "max_retries": 3,  # Установите количество повторных попыток
+        # "http_auth": ("elastic", "YOUR_PASSWORD"),
+        # "ca_certs": "PATH_TO_http_ca.crt",
+    }
+}
+# Индекс обновляет Celery пачками (app_elastic.ElasticIndexer),
+# а не каждый save() синхронным запросом к ES
+ELASTICSEARCH_DSL_AUTOSYNC = False
+ELASTICSEARCH_DSL_AUTO_REFRESH = False
+ELASTICSEARCH_DSL_PARALLEL = True
 
 
 BASE_URL_ETL_1C = os.getenv("BASE_URL_ETL_1C")
@@ -0,0 +1,327 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import engines
+from django.template.response import SimpleTemplateResponse
+import json
+
+from django.test import SimpleTestCase, TestCase, RequestFactory
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from app_brands.models import Brands
+from app_products.SearchVectorUpdater import SearchVectorUpdater
+
+from core.CacheLock import CacheLock
+from core.ChangeFeed import ChangeFeed
+from core.TranslationUpdateService import TranslationUpdateService
+from core.CacheTags import CacheTags, TaggedResponseCache
+from core.renderers import ORJSONRenderer
+
+
+class CacheLockTest(SimpleTestCase):
+    """Блокировку снимает только её владелец."""
+
+    KEY = "test:cache_lock"
+
+    def setUp(self):
+        cache.delete(self.KEY)
+
+    def test_single_owner(self):
+        first, second = CacheLock(self.KEY, 60), CacheLock(self.KEY, 60)
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        # не взявший блокировку её не снимает
+        second.release()
+        self.assertFalse(second.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+
+    def test_expired_lock_is_not_released_by_previous_owner(self):
+        first, second = CacheLock(self.KEY, 60), CacheLock(self.KEY, 60)
+        self.assertTrue(first.acquire())
+        cache.delete(self.KEY)  # истекла по timeout
+        self.assertTrue(second.acquire())
+        first.release()
+        self.assertIsNotNone(cache.get(self.KEY))
+
+
+class TaggedResponseCacheTest(SimpleTestCase):
+    """Запись кеша ответов и версии её тегов."""
+
+    TAG = "test:tagged_response"
+
+    def setUp(self):
+        self.request = RequestFactory().get("/api/v2/test/tagged/")
+        self.key = TaggedResponseCache.get_key(self.request)
+        cache.delete_many([self.key, TaggedResponseCache.LOCK_PREFIX + self.key])
+        self.calls = 0
+
+    def view(self, request, bump=False):
+        self.calls += 1
+        CacheTags.add(self.TAG)
+        if bump:
+            # инвалидация, закоммиченная, пока строился ответ
+            CacheTags._bump({self.TAG})
+        return HttpResponse(b"ok", content_type="text/plain")
+
+    def test_stores_and_serves(self):
+        cached = TaggedResponseCache(self.view, 60, 60)
+        self.assertEqual(cached(self.request).content, b"ok")
+        self.assertEqual(cached(self.request).content, b"ok")
+        self.assertEqual(self.calls, 1)
+
+        CacheTags._bump({self.TAG})
+        cached(self.request)
+        self.assertEqual(self.calls, 2)
+
+    def test_skips_store_when_tag_changed_during_view(self):
+        cached = TaggedResponseCache(
+            lambda request: self.view(request, bump=True), 60, 60
+        )
+        self.assertEqual(cached(self.request).content, b"ok")
+        self.assertIsNone(cache.get(self.key))
+        # блокировка снята — следующий запрос снова строит ответ
+        cached(self.request)
+        self.assertEqual(self.calls, 2)
+
+    def test_lock_miss_does_not_wait(self):
+        cached = TaggedResponseCache(self.view, 60, 60)
+        cached(self.request)
+        CacheTags._bump({self.TAG})
+        lock = TaggedResponseCache.acquire(self.key)
+        try:
+            # пересчитывает другой процесс — инвалидированную запись
+            # не отдаём, строим ответ сами и не ждём
+            with mock.patch("time.sleep") as sleep:
+                self.assertEqual(cached(self.request).content, b"ok")
+            sleep.assert_not_called()
+            self.assertEqual(self.calls, 2)
+            self.assertFalse(TaggedResponseCache.is_valid(cache.get(self.key)))
+
+            # записи нет — так же, без записи
+            cache.delete(self.key)
+            self.assertEqual(cached(self.request).content, b"ok")
+            self.assertEqual(self.calls, 3)
+            self.assertIsNone(cache.get(self.key))
+        finally:
+            lock.release()
+
+    def test_replays_view_headers(self):
+        def view(request):
+            response = self.view(request)
+            response["Vary"] = "Accept, Cookie"
+            response["Allow"] = "GET, HEAD"
+            return response
+
+        cached = TaggedResponseCache(view, 60, 60)
+        cached(self.request)
+        response = cached(self.request)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response["Vary"], "Accept, Cookie")
+        self.assertEqual(response["Allow"], "GET, HEAD")
+        self.assertEqual(response["Content-Type"], "text/plain")
+
+    def test_old_entry_varies_on_accept(self):
+        cached = TaggedResponseCache(self.view, 60, 60)
+        cached(self.request)
+        entry = cache.get(self.key)
+        del entry["headers"]
+        cache.set(self.key, entry, 60)
+        self.assertEqual(cached(self.request)["Vary"], "Accept")
+        self.assertEqual(self.calls, 1)
+
+    def test_soft_expired_valid_entry_is_served(self):
+        cached = TaggedResponseCache(self.view, 60, 0)
+        cached(self.request)
+        lock = TaggedResponseCache.acquire(self.key)
+        try:
+            # фон уже пересчитывает другой процесс — отдаём актуальную запись
+            self.assertEqual(cached(self.request).content, b"ok")
+            self.assertEqual(self.calls, 1)
+        finally:
+            lock.release()
+
+    def test_old_format_entry_is_miss(self):
+        """Запись прежнего формата (без ETag) пересчитывается, а не роняет ответ."""
+        cache.set(self.key, {"tags": {}, "content": b"old"}, 60)
+        cached = TaggedResponseCache(self.view, 60, 60)
+        lock = TaggedResponseCache.acquire(self.key)
+        try:
+            self.assertEqual(cached(self.request).content, b"ok")
+        finally:
+            lock.release()
+        self.assertEqual(cached(self.request).content, b"ok")
+        self.assertEqual(self.calls, 2)
+        self.assertIn("etag", cache.get(self.key))
+
+    def test_conditional_request_on_cold_miss(self):
+        cached = TaggedResponseCache(self.view, 60, 60)
+        etag = cached(self.request)["ETag"]
+        cache.delete(self.key)
+
+        request = RequestFactory().get(self.request.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached(request).status_code, 304)
+        self.assertEqual(self.calls, 2)
+        # ответ сохранён целиком, не 304
+        self.assertEqual(cache.get(self.key)["content"], b"ok")
+        self.assertEqual(cached(request).status_code, 304)
+        self.assertEqual(self.calls, 2)
+
+    def test_conditional_request_on_rendered_response(self):
+        def view(request):
+            self.calls += 1
+            CacheTags.add(self.TAG)
+            return SimpleTemplateResponse(engines["django"].from_string("ok"))
+
+        cached = TaggedResponseCache(view, 60, 60)
+        etag = cached(self.request).render()["ETag"]
+        cache.delete(self.key)
+
+        request = RequestFactory().get(self.request.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached(request).render().status_code, 304)
+        self.assertEqual(cache.get(self.key)["content"], b"ok")
+
+
+class ChangeFeedTest(TestCase):
+    """Чтение ленты: пачки после номера, сброс, разрывы и отставание."""
+
+    def setUp(self):
+        self.feed = ChangeFeed("test_feed")
+        cache.delete_many(
+            [self.feed.seq_key, *(self.feed.entry_key(n) for n in range(1, 5))]
+        )
+
+    def publish(self, ids):
+        # запись в ленту — после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            self.feed.publish(ids)
+
+    def reset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.feed.reset()
+
+    def test_read_batches(self):
+        self.assertEqual(self.feed.read(0), (0, set()))
+        self.publish([3, 1, None])
+        self.publish([2, 3])
+        self.publish([])  # пустая пачка номер не занимает
+        self.assertEqual(self.feed.current(), 2)
+        self.assertEqual(self.feed.read(0), (2, {1, 2, 3}))
+        self.assertEqual(self.feed.read(1), (2, {2, 3}))
+        self.assertEqual(self.feed.read(2), (2, set()))
+
+    def test_reset(self):
+        self.publish([1])
+        self.reset()
+        self.publish([2])
+        self.assertEqual(self.feed.read(0), (3, None))
+        # после перестройки читатель продолжает с номера сброса
+        self.assertEqual(self.feed.read(3), (3, set()))
+
+    def test_counter_lost(self):
+        # номер читателя больше текущего — кеш очищали
+        self.publish([1])
+        self.assertEqual(self.feed.read(5), (1, None))
+
+    def test_max_lag(self):
+        for pk in (1, 2, 3):
+            self.publish([pk])
+        with mock.patch.object(ChangeFeed, "MAX_LAG", 2):
+            self.assertEqual(self.feed.read(0), (3, None))
+            self.assertEqual(self.feed.read(1), (3, {2, 3}))
+
+    def test_gap_waits_grace_then_rebuilds(self):
+        for pk in (1, 2, 3):
+            self.publish([pk])
+        cache.delete(self.feed.entry_key(2))
+        with mock.patch("core.ChangeFeed.time.monotonic") as monotonic:
+            # пачка 2 могла ещё не записаться — применяем то, что до неё
+            monotonic.return_value = 100.0
+            self.assertEqual(self.feed.read(0), (1, {1}))
+            monotonic.return_value = 100.0 + ChangeFeed.GRACE / 2
+            self.assertEqual(self.feed.read(1), (1, set()))
+            # дописалась — читаем дальше
+            cache.set(self.feed.entry_key(2), [2])
+            self.assertEqual(self.feed.read(1), (3, {2, 3}))
+
+            cache.delete(self.feed.entry_key(3))
+            self.publish([4])
+            self.assertEqual(self.feed.read(2), (2, set()))
+            # не появилась за GRACE — вытеснена, перестраиваем
+            monotonic.return_value = 101.0 + ChangeFeed.GRACE * 2
+            self.assertEqual(self.feed.read(2), (4, None))
+            self.assertIsNone(self.feed.missing_since)
+
+
+class TranslationUpdateServiceTest(TestCase):
+    """Перевод пишется через update(), но вектор поиска и кеш обновляются."""
+
+    def setUp(self):
+        # пачку могли оставить откатившиеся транзакции других тестов
+        SearchVectorUpdater._local.batch = None
+
+    def test_translation_refreshes_search_and_cache(self):
+        brand = Brands.objects.create(name_brand="Диваны и кресла")
+        tag = CacheTags.brand(brand.pk)
+        before = CacheTags.versions([tag])[tag]
+        channel, method = mock.Mock(), mock.Mock()
+        body = json.dumps(
+            {
+                "model_name": "app_brands.Brands",
+                "instance_id": brand.pk,
+                "target_field": "additional_data",
+                "text": "Sofas and armchairs",
+                "target_lang": "en",
+            }
+        ).encode()
+
+        service = TranslationUpdateService(mock.Mock())
+        with mock.patch.object(SearchVectorUpdater, "refresh") as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                service.process_translation_update(channel, method, None, body)
+
+        brand.refresh_from_db()
+        self.assertEqual(brand.additional_data["en"], "Sofas and armchairs")
+        refresh.assert_called_once_with(Brands, {brand.pk})
+        self.assertNotEqual(CacheTags.versions([tag])[tag], before)
+        channel.basic_ack.assert_called_once_with(delivery_tag=method.delivery_tag)
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """Вывод ORJSONRenderer и JSONRenderer: равен по значению, float — нет."""
+
+    def render(self, renderer, data):
+        return renderer.render(data, "application/json", {})
+
+    def test_same_value_as_json_renderer(self):
+        data = {
+            "price": Decimal("199.90"),
+            "date": datetime.date(2024, 5, 1),
+            "created": datetime.datetime(2024, 5, 1, 12, 30),
+            "name": gettext_lazy("Диван"),
+            "text": "строка\u2028с разделителем",
+            "ids": [1, 2, 3],
+            5: None,
+        }
+        orjson_content = self.render(ORJSONRenderer(), data)
+        json_content = self.render(JSONRenderer(), data)
+        self.assertEqual(json.loads(orjson_content), json.loads(json_content))
+        self.assertIn(b"\\u2028", orjson_content)
+
+    def test_float_notation_differs(self):
+        """Закреплённые отличия: для клиентов это те же числа."""
+        cases = {
+            1e16: (b"1e16", b"1e+16"),
+            1e-5: (b"0.00001", b"1e-05"),
+            0.1: (b"0.1", b"0.1"),
+            100.0: (b"100.0", b"100.0"),
+        }
+        for value, (orjson_content, json_content) in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(self.render(ORJSONRenderer(), value), orjson_content)
+                self.assertEqual(self.render(JSONRenderer(), value), json_content)
+                self.assertEqual(json.loads(orjson_content), json.loads(json_content))
@@ -26,7 +26,7 @@ urlpatterns = (
         path("api/v2/", include(urlpatterns_products_v2)),
         path("api/orders/", include(url_orders_api)),
         path("api/offers/", include(urlpatterns_external_prod)),
-        # path("search/", include("app_elastic.urls")),
+        path("search/", include("app_elastic.urls")),
         path("silk/", include("silk.urls", namespace="silk")),
     ]
     + urlpatterns_products_suff
@@ -1,6 +1,11 @@
 #!/bin/sh
 python manage.py makemigrations
 python manage.py migrate
+python manage.py rebuild_review_aggregates
+# пересчитывает и карточки ProductCard, и видимость и цены по городам
+# (rebuild_product_cards / rebuild_city_visibility отдельно не нужны)
+python manage.py rebuild_effective_discounts
+python manage.py rebuild_search_vectors
 python manage.py collectstatic --no-input
 
 python -m celery -A core.celery worker -l info -c 2 -P eventlet &
@@ -13,7 +18,8 @@ python -m celery -A core flower --port=8001 --basic_auth=admin:admin &
 # запуск потрибителя для готовых переводов
 python manage.py start_consumer &
 
-# python manage.py search_index --rebuild -f
+# индексы Elasticsearch строит и обновляет задача Celery; вручную:
+# python manage.py rebuild_elastic_index
 
 # gunicorn --bind 0.0.0.0:8000 core.asgi -w 4 -k uvicorn.workers.UvicornWorker # с возможностью указания количества воркеров
 uvicorn core.asgi:application --host 0.0.0.0 --port 8888
\ No newline at end of file